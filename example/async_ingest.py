@@ -0,0 +1,324 @@
+"""asyncio ingest for the VideoJockey.
+
+`ingest_server.IngestServer` spends a thread per fan connection, which
+stops scaling once fan counts reach the thousands. `AsyncIngestServer`
+speaks the same framed protocol (so `IngestClient` is unchanged) but
+serves every connection from one event loop:
+
+    - Connections are coroutines; asyncio's stream buffer limit pauses
+      reading from a fan that sends faster than we can store, which is
+      the per-connection backpressure.
+    - Payload chunks are written and hashed by a small thread pool
+      (`config.ASYNC_INGEST_WRITERS`), with at most twice that many
+      writes in flight, so slow disks hold back the readers rather
+      than piling up memory.
+    - The collection state (shards accepted so far and their digests,
+      how many are wanted, completion) lives in the loop. `collect(total)`
+      blocks the VJ until the loop has accepted that many distinct
+      shards; content already accepted is acked `ACK_DUPLICATE`, and
+      frames after completion `ACK_DONE`, and both are dropped.
+
+The loop runs on a background thread started by `start()`. Select it for
+the "socket" backend with `config.VJ_INGEST_MODE = "asyncio"`.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+
+import config
+import video
+from config import logger
+from ingest_server import (
+    ACK_BAD_CHECKSUM,
+    ACK_DONE,
+    ACK_DUPLICATE,
+    ACK_OK,
+    FAMILIES,
+    HEADER,
+    MAGIC,
+    VERSION,
+    default_address,
+)
+
+
+def _write_chunk(fh, m, chunk):
+    fh.write(chunk)
+    video.shake256_update(m, chunk)
+
+
+def _remove(path):
+    with suppress(OSError):
+        os.remove(path)
+
+
+class AsyncIngestServer(object):
+    """
+    single event loop ingest server for many concurrent fans
+    """
+
+    # optional flow_control.CreditGate shared with fans on this host
+    credits = None
+    # duplicate content never reaches the VJ
+    dedups = True
+
+    def __init__(self, address=None, family=None, tmp_dir=None, writers=None):
+        if family is None:
+            family = getattr(config, "INGEST_FAMILY", "tcp")
+        if family not in FAMILIES:
+            raise ValueError(f"unknown ingest family {family!r}")
+        if address is None:
+            address = default_address(family)
+        if tmp_dir is None:
+            tmp_dir = config.TEMP_DIR
+        if writers is None:
+            writers = getattr(config, "ASYNC_INGEST_WRITERS", 4)
+        self.__family = family
+        self.__address = address
+        self.__tmp_dir = str(tmp_dir)
+        self.__chunk_size = getattr(config, "HASH_CHUNK_SIZE", 1024 * 1024)
+        self.__backlog = getattr(config, "INGEST_BACKLOG", 1024)
+        self.__writers = max(1, int(writers))
+        self.__pool = ThreadPoolExecutor(
+            max_workers=self.__writers, thread_name_prefix="ingest-writer"
+        )
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = None
+        self.__server = None
+        self.__streams = set()
+        # loop-owned state, created on the loop in __start
+        self.__write_slots = None
+        self.__complete = None
+        self.__collected = []
+        self.__digests = set()
+        self.__wanted = None
+        self.__done = False
+        self.__stats = {
+            "connections": 0,
+            "frames": 0,
+            "bytes": 0,
+            "checksum_failures": 0,
+            "dropped": 0,
+            "duplicate_shards": 0,
+            "duplicate_bytes": 0,
+        }
+        os.makedirs(self.__tmp_dir, exist_ok=True)
+
+    def family(self):
+        return self.__family
+
+    def address(self):
+        """The bound address (the real port when 0 was requested)."""
+        return self.__server.sockets[0].getsockname()
+
+    def start(self):
+        """Run the loop on a background thread and start listening."""
+        self.__thread = threading.Thread(
+            target=self.__loop.run_forever, name="ingest-loop", daemon=True
+        )
+        self.__thread.start()
+        self.__call(self.__start())
+        return self
+
+    def __call(self, coro, timeout=None):
+        future = asyncio.run_coroutine_threadsafe(coro, self.__loop)
+        return future.result(timeout)
+
+    async def __start(self):
+        self.__write_slots = asyncio.Semaphore(2 * self.__writers)
+        self.__complete = asyncio.Event()
+        if self.__family == "unix":
+            # a stale socket file from an earlier run blocks bind()
+            _remove(self.__address)
+            self.__server = await asyncio.start_unix_server(
+                self.__serve_connection,
+                self.__address,
+                backlog=self.__backlog,
+            )
+        else:
+            host, port = self.__address
+            self.__server = await asyncio.start_server(
+                self.__serve_connection,
+                host,
+                port,
+                backlog=self.__backlog,
+                reuse_address=True,
+            )
+
+    def stats(self):
+        return self.__call(self.__get_stats())
+
+    async def __get_stats(self):
+        return dict(self.__stats)
+
+    # -- VJ side --
+
+    def collect(self, total_shards, timeout=None):
+        """
+        Block until `total_shards` shards have been received; returns
+        their (sender_name, temp_path) entries in arrival order.
+        """
+        return self.__call(self.__collect(total_shards), timeout)
+
+    async def __collect(self, total_shards):
+        self.__wanted = total_shards
+        self.__grant_credits()
+        self.__check_complete()
+        await self.__complete.wait()
+        collected = self.__collected[:total_shards]
+        # shards that arrived before we knew how many were wanted
+        for _, path in self.__collected[total_shards:]:
+            _remove(path)
+        self.__collected = collected
+        return list(collected)
+
+    def set_all_shards_collected(self):
+        """Drop anything still arriving; `collect` has already done
+        this once it returns."""
+        self.__call(self.__finish())
+
+    async def __finish(self):
+        self.__done = True
+        self.__complete.set()
+
+    def all_shards_collected(self):
+        return self.__done
+
+    def __grant_credits(self):
+        gate = self.credits
+        if gate is not None and self.__wanted is not None:
+            gate.replenish(self.__wanted - len(self.__collected))
+
+    def __check_complete(self):
+        wanted = self.__wanted
+        if wanted is not None and len(self.__collected) >= wanted:
+            self.__done = True
+            self.__complete.set()
+
+    # -- connection handling --
+
+    async def __serve_connection(self, reader, writer):
+        self.__stats["connections"] += 1
+        self.__streams.add(writer)
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError as e:
+                    if e.partial:
+                        raise ConnectionError("connection closed mid-frame")
+                    break
+                magic, version, name_len, digest, size = HEADER.unpack(
+                    header
+                )
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"bad frame header {magic!r} v{version}")
+                name = (await reader.readexactly(name_len)).decode("utf-8")
+                ack = await self.__receive(reader, name, digest, size)
+                writer.write(ack)
+                await writer.drain()
+        except (
+            asyncio.IncompleteReadError,
+            ConnectionError,
+            OSError,
+            ValueError,
+        ) as e:
+            logger.warning("ingest connection dropped: %s", e)
+        finally:
+            self.__streams.discard(writer)
+            writer.close()
+
+    async def __receive(self, reader, name, digest, size):
+        """Store one payload and decide its ack."""
+        loop = asyncio.get_running_loop()
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.__tmp_dir, prefix="ingest_", suffix=".mp4"
+        )
+        m = hashlib.shake_256()
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                remaining = size
+                while remaining:
+                    chunk = await reader.read(
+                        min(remaining, self.__chunk_size)
+                    )
+                    if not chunk:
+                        raise ConnectionError("connection closed mid-frame")
+                    remaining -= len(chunk)
+                    async with self.__write_slots:
+                        await loop.run_in_executor(
+                            self.__pool, _write_chunk, fh, m, chunk
+                        )
+        except BaseException:
+            _remove(tmp_name)
+            raise
+        self.__stats["frames"] += 1
+        self.__stats["bytes"] += size
+
+        actual = m.hexdigest(8)
+        if actual != digest.decode("ascii", "replace"):
+            logger.warning(
+                "ingest: checksum mismatch from %s (%s != %s)",
+                name,
+                actual,
+                digest,
+            )
+            self.__stats["checksum_failures"] += 1
+            _remove(tmp_name)
+            return ACK_BAD_CHECKSUM
+        if self.__done:
+            self.__stats["dropped"] += 1
+            _remove(tmp_name)
+            return ACK_DONE
+        if self.credits is not None:
+            self.credits.consumed(1)
+        if actual in self.__digests:
+            self.__stats["duplicate_shards"] += 1
+            self.__stats["duplicate_bytes"] += size
+            logger.info("ingest: dropped duplicate %s from %s", actual, name)
+            _remove(tmp_name)
+            ack = ACK_DUPLICATE
+        else:
+            self.__digests.add(actual)
+            self.__collected.append((name, tmp_name))
+            ack = ACK_OK
+        self.__grant_credits()
+        self.__check_complete()
+        return ack
+
+    # -- shutdown --
+
+    def close(self):
+        """Stop the loop; remove shards nobody collected."""
+        if self.__thread is None:
+            self.__pool.shutdown()
+            self.__loop.close()
+            return
+        self.__call(self.__stop())
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__thread = None
+        self.__pool.shutdown()
+        self.__loop.close()
+        if self.__family == "unix":
+            _remove(self.__address)
+
+    async def __stop(self):
+        self.__done = True
+        self.__server.close()
+        for writer in list(self.__streams):
+            writer.close()
+        current = asyncio.current_task()
+        tasks = [t for t in asyncio.all_tasks() if t is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.__wanted is None:
+            for _, path in self.__collected:
+                _remove(path)
+            self.__collected = []
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Compare the thread-per-connection and asyncio ingest servers.
+Usage:
+    python async_ingest_bench.py --fans 100 1000 10000 --size-kb 16 \
+        --servers threads asyncio
+
+For each fan count a client process opens that many connections at
+once from one event loop (a simulated fan each), sends one shard per
+fan in the ingest frame format and waits for its ack. The VJ side runs
+in this process and collects every shard. Reported per server and fan
+count:
+    - wall time until the VJ has every shard, shards/s and MB/s
+    - p50/p99 send latency: connect -> ack, as seen by a fan
+    - peak threads in the VJ process and its CPU seconds (user+sys)
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import video
+from async_ingest import AsyncIngestServer
+from ingest_server import HEADER, MAGIC, VERSION, IngestServer
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def _fan(address, fan_id, payload, header, start):
+    await start.wait()
+    t0 = time.perf_counter()
+    for attempt in range(50):
+        try:
+            reader, writer = await asyncio.open_connection(*address)
+            break
+        except OSError:
+            # listen backlog overflow; back off like a real client would
+            await asyncio.sleep(0.05 * (attempt + 1))
+    else:
+        return None
+    name = f"fan {fan_id}".encode("utf-8")
+    writer.write(header(len(name)) + name + payload)
+    await writer.drain()
+    await reader.readexactly(1)
+    writer.close()
+    return time.perf_counter() - t0
+
+
+async def _fans(address, fans, size):
+    payload = os.urandom(size)
+    m = hashlib.shake_256()
+    video.shake256_update(m, payload)
+    digest = m.hexdigest(8).encode("ascii")
+
+    def header(name_len):
+        return HEADER.pack(MAGIC, VERSION, name_len, digest, size)
+
+    start = asyncio.Event()
+    tasks = [
+        asyncio.create_task(_fan(address, i, payload, header, start))
+        for i in range(fans)
+    ]
+    start.set()
+    return await asyncio.gather(*tasks)
+
+
+def _client(address, fans, size, results):
+    _raise_fd_limit()
+    latencies = asyncio.run(_fans(address, fans, size))
+    results.put(latencies)
+
+
+def _peak_threads(stop, peak):
+    while not stop.is_set():
+        peak[0] = max(peak[0], threading.active_count())
+        stop.wait(0.01)
+
+
+def run(mode, fans, size):
+    tmp_dir = tempfile.mkdtemp()
+    if mode == "asyncio":
+        server = AsyncIngestServer(("127.0.0.1", 0), "tcp", tmp_dir=tmp_dir)
+    else:
+        server = IngestServer(
+            ("127.0.0.1", 0), "tcp", capacity=fans, tmp_dir=tmp_dir
+        )
+    server.start()
+    address = server.address()
+    results = multiprocessing.Queue()
+    stop = threading.Event()
+    peak = [threading.active_count()]
+    sampler = threading.Thread(target=_peak_threads, args=(stop, peak))
+    sampler.start()
+    cpu0 = _cpu_seconds()
+    try:
+        client = multiprocessing.Process(
+            target=_client, args=(address, fans, size, results)
+        )
+        t0 = time.perf_counter()
+        client.start()
+        if mode == "asyncio":
+            collected = server.collect(fans)
+        else:
+            collected = []
+            while len(collected) < fans:
+                item = server.get_shard(timeout=1.0)
+                if item is not None:
+                    collected.append(item)
+        elapsed = time.perf_counter() - t0
+        cpu = _cpu_seconds() - cpu0
+        latencies = results.get()
+        client.join()
+    finally:
+        stop.set()
+        sampler.join()
+        server.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    sent = sorted(x for x in latencies if x is not None)
+    return {
+        "seconds": elapsed,
+        "shards_s": len(collected) / elapsed,
+        "mb_s": len(collected) * size / 2**20 / elapsed,
+        "p50": sent[len(sent) // 2],
+        "p99": sent[min(len(sent) - 1, int(len(sent) * 0.99))],
+        "threads": peak[0],
+        "cpu": cpu,
+        "failed": len(latencies) - len(sent),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark VJ ingest servers with many fans"
+    )
+    parser.add_argument(
+        "--fans", type=int, nargs="+", default=[100, 1000, 10000]
+    )
+    parser.add_argument("--size-kb", type=int, default=16)
+    parser.add_argument(
+        "--servers",
+        nargs="+",
+        choices=("threads", "asyncio"),
+        default=["threads", "asyncio"],
+    )
+    args = parser.parse_args()
+
+    _raise_fd_limit()
+    size = args.size_kb * 1024
+    print(f"one {args.size_kb} KiB shard per fan")
+    print(
+        f"{'server':<8} {'fans':>6} {'secs':>7} {'shards/s':>9}"
+        f" {'MB/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'threads':>7}"
+        f" {'cpu s':>6} {'failed':>6}"
+    )
+    for fans in args.fans:
+        for mode in args.servers:
+            r = run(mode, fans, size)
+            print(
+                f"{mode:<8} {fans:>6} {r['seconds']:>7.2f}"
+                f" {r['shards_s']:>9.0f} {r['mb_s']:>7.1f}"
+                f" {r['p50'] * 1e3:>8.1f} {r['p99'] * 1e3:>8.1f}"
+                f" {r['threads']:>7} {r['cpu']:>6.2f} {r['failed']:>6}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
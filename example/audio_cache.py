@@ -0,0 +1,235 @@
+"""Pre-rendered soundtracks for composition.
+
+Without a prepared track every composition decodes the source audio from
+`config.AUDIO_OFFSET_SECONDS`, runs the afade/areverse/afade/areverse
+chain (areverse holds the whole decoded stream in memory for the
+fade-out) and encodes AAC again. `soundtrack(duration)` instead renders
+the faded AAC track once and keeps it in `config.AUDIO_CACHE_DIR`, so the
+final mux copies both streams (`video.soundtrack_*_args(track)`).
+
+Key behaviors:
+    - Tracks are keyed by (source hash, offset, fade-in, fade-out,
+      bitrate, target duration); any change renders a new track.
+    - With the target duration known, the fade-out is a plain
+      `afade=t=out` ending at the video's end; no areverse is needed.
+    - The directory is bounded by `config.AUDIO_CACHE_MAX_BYTES`; the
+      least recently used tracks are evicted first.
+    - Tracks are written to a temp file and renamed into place, so
+      concurrent renders of the same key are harmless.
+    - Any failure returns None and the caller falls back to encoding
+      from the source.
+
+Usage:
+    python audio_cache.py --clear   # drop every cached track
+"""
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from contextlib import suppress
+
+import config
+import video
+from config import logger
+
+_SUFFIX = ".m4a"
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def enabled():
+    return bool(getattr(config, "AUDIO_CACHE_ENABLED", True))
+
+
+def cache_dir():
+    directory = getattr(config, "AUDIO_CACHE_DIR", None)
+    if directory is None:
+        return os.path.join(str(config.TEMP_DIR), "audio_cache")
+    return str(directory)
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def _count(key, n=1):
+    with _lock:
+        _stats[key] += n
+
+
+def _params(duration):
+    return (
+        float(getattr(config, "AUDIO_OFFSET_SECONDS", 78)),
+        float(getattr(config, "AUDIO_FADE_IN_SECONDS", 0.2)),
+        float(getattr(config, "AUDIO_FADE_OUT_SECONDS", 1.2)),
+        str(getattr(config, "AUDIO_BITRATE", "192k")),
+        round(float(duration), 3),
+    )
+
+
+def cache_key(source_hash, offset, fade_in, fade_out, bitrate, duration):
+    """File name stem of the track rendered with these settings."""
+    fields = (source_hash, offset, fade_in, fade_out, bitrate, duration)
+    return hashlib.shake_256(repr(fields).encode("utf-8")).hexdigest(16)
+
+
+def available(source=None):
+    """True if tracks can be prepared from `source` (the source audio)."""
+    if source is None:
+        source = config.SOURCE_AUDIO_FILE_PATH
+    return enabled() and os.path.isfile(source)
+
+
+def soundtrack(duration, source=None):
+    """
+    Path of the faded AAC soundtrack for a video of `duration` seconds,
+    rendered on a miss; None if it cannot be prepared.
+    """
+    if source is None:
+        source = config.SOURCE_AUDIO_FILE_PATH
+    if not duration or duration <= 0 or not available(source):
+        return None
+    params = _params(duration)
+    key = cache_key(video.file_hash(source), *params)
+    directory = cache_dir()
+    path = os.path.join(directory, key + _SUFFIX)
+    try:
+        # a hit refreshes the mtime the eviction order goes by
+        os.utime(path)
+    except OSError:
+        pass
+    else:
+        _count("hits")
+        logger.debug("audio cache hit %s", path)
+        return path
+
+    _count("misses")
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        logger.warning("Audio cache directory unusable: %s", e)
+        return None
+    if not _render(str(source), path, *params):
+        return None
+    evict(keep=path)
+    return path
+
+
+def _render(source, path, offset, fade_in, fade_out, bitrate, duration):
+    fade_filter = (
+        f"afade=t=in:d={fade_in},"
+        f"afade=t=out:st={max(duration - fade_out, 0.0):.3f}:d={fade_out}"
+    )
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix="render_", suffix=".tmp"
+    )
+    os.close(fd)
+    cmd = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-ss",
+        str(offset),
+        "-t",
+        f"{duration:.3f}",
+        "-i",
+        source,
+        "-vn",
+        "-af",
+        fade_filter,
+        "-c:a",
+        "aac",
+        "-b:a",
+        bitrate,
+        "-f",
+        "mp4",
+        "-y",
+        tmp_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    except OSError as e:
+        logger.warning("Failed to start ffmpeg for the soundtrack: %s", e)
+        proc = None
+    if proc is None or proc.returncode != 0:
+        if proc is not None:
+            logger.warning(
+                "Soundtrack render failed with return code %d:\n%s",
+                proc.returncode,
+                proc.stderr,
+            )
+        with suppress(OSError):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    logger.info("Rendered %.2fs soundtrack -> %s", duration, path)
+    return True
+
+
+def _entries(directory):
+    """(mtime, size, path) of every cached track."""
+    entries = []
+    with suppress(OSError):
+        for name in os.listdir(directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            with suppress(OSError):
+                st = os.stat(path)
+                entries.append((st.st_mtime_ns, st.st_size, path))
+    return entries
+
+
+def evict(max_bytes=None, keep=None):
+    """
+    Remove least recently used tracks until the cache fits in
+    `max_bytes` (`config.AUDIO_CACHE_MAX_BYTES`), never `keep`. Returns
+    the number of tracks removed.
+    """
+    if max_bytes is None:
+        max_bytes = int(getattr(config, "AUDIO_CACHE_MAX_BYTES", 256 << 20))
+    entries = sorted(_entries(cache_dir()))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        _count("evictions", removed)
+        logger.debug("audio cache evicted %d track(s)", removed)
+    return removed
+
+
+def clear():
+    """Drop every cached track; returns the number removed."""
+    return evict(max_bytes=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the audio cache")
+    parser.add_argument(
+        "--clear", action="store_true", help="drop every cached track"
+    )
+    args = parser.parse_args()
+    if args.clear:
+        print(f"removed {clear()} track(s) from {cache_dir()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
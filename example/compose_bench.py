@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Time from the last shard's arrival to the final file, batch vs
+incremental composition.
+Usage:
+    python compose_bench.py --shards 32 --seconds 2 --interval 0.25 \
+        --size 640x360 [--audio-cache]
+
+Synthetic H.264 shards and a soundtrack are generated with ffmpeg into a
+scratch directory. Shards then "arrive" every `--interval` seconds:
+    - batch: nothing happens until the last one; then the VJ's concat +
+      audio job runs (VideoJockey.__write_video).
+    - incremental: each arrival is appended to the running
+      IncrementalComposer; after the last one only finish() is left.
+With `--audio-cache` the soundtrack is pre-rendered (audio_cache) before
+the runs, so both modes mux it with a stream copy; without it each run
+encodes it from the source with the fade filters.
+Reported per mode: seconds from last arrival to final file, and the
+whole run including the arrivals.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import audio_cache
+import config
+import video
+import video_jockey
+from incremental_composer import IncrementalComposer
+
+
+def _ffmpeg(*args):
+    subprocess.run(["ffmpeg", "-v", "error", "-y", *args], check=True)
+
+
+def make_inputs(work_dir, shards, seconds, size):
+    paths = []
+    for i in range(shards):
+        path = os.path.join(work_dir, f"shard_{i:04d}.mp4")
+        _ffmpeg(
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=size={size}:rate=25:duration={seconds}",
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            "-g",
+            "25",
+            path,
+        )
+        paths.append(path)
+    audio = os.path.join(work_dir, "song.m4a")
+    total = shards * seconds + 5
+    _ffmpeg(
+        "-f", "lavfi", "-i", f"sine=duration={total}", "-c:a", "aac", audio
+    )
+    return paths, audio
+
+
+def _arrive(paths, interval, on_arrival, run_dir):
+    """Copy each shard into the run dir as its temp file, paced."""
+    arrived = []
+    for i, path in enumerate(paths):
+        if i:
+            time.sleep(interval)
+        temp = os.path.join(run_dir, os.path.basename(path))
+        shutil.copyfile(path, temp)
+        arrived.append(temp)
+        on_arrival(temp)
+    return arrived
+
+
+def run_batch(paths, interval, run_dir):
+    vj = video_jockey.VideoJockey()
+    t0 = time.perf_counter()
+    arrived = _arrive(paths, interval, lambda p: None, run_dir)
+    t_last = time.perf_counter()
+    vj._VideoJockey__shards = arrived
+    out = vj._VideoJockey__write_video()
+    t_end = time.perf_counter()
+    return out, t_end - t_last, t_end - t0
+
+
+def run_incremental(paths, interval, run_dir):
+    vj = video_jockey.VideoJockey()
+    composer = IncrementalComposer(run_dir)
+    t0 = time.perf_counter()
+    if not composer.start():
+        return None, 0.0, 0.0
+    _arrive(paths, interval, composer.append, run_dir)
+    t_last = time.perf_counter()
+    out = composer.finish(
+        os.path.join(run_dir, "final_collage.mp4"),
+        vj._VideoJockey__soundtrack,
+    )
+    t_end = time.perf_counter()
+    return out, t_end - t_last, t_end - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Batch vs incremental composition latency"
+    )
+    parser.add_argument("--shards", type=int, default=32)
+    parser.add_argument(
+        "--seconds", type=float, default=2.0, help="Length of each shard"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.25,
+        help="Seconds between shard arrivals",
+    )
+    parser.add_argument("--size", default="640x360")
+    parser.add_argument(
+        "--audio-cache",
+        action="store_true",
+        help="Mux a pre-rendered soundtrack instead of encoding it",
+    )
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        paths, audio = make_inputs(
+            work_dir, args.shards, args.seconds, args.size
+        )
+        config.SOURCE_AUDIO_FILE_PATH = audio
+        config.AUDIO_OFFSET_SECONDS = 0
+        config.AUDIO_CACHE_ENABLED = args.audio_cache
+        config.AUDIO_CACHE_DIR = os.path.join(work_dir, "audio_cache")
+        if args.audio_cache:
+            # warm the cache; the runs only look the track up
+            audio_cache.soundtrack(sum(video.duration(p) for p in paths))
+        print(
+            f"{args.shards} shards x {args.seconds:g}s at {args.size},"
+            f" one every {args.interval:g}s"
+        )
+        print(f"{'mode':<12} {'last->final s':>13} {'total s':>8}  output")
+        for mode, fn in (
+            ("batch", run_batch),
+            ("incremental", run_incremental),
+        ):
+            run_dir = os.path.join(work_dir, mode)
+            os.makedirs(run_dir)
+            config.TEMP_DIR = run_dir
+            out, tail, total = fn(paths, args.interval, run_dir)
+            print(
+                f"{mode:<12} {tail:>13.2f} {total:>8.2f}"
+                f"  {'ok' if out else 'FAILED'}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Wall time of one flat concat vs a tree concat over many shards.
+Usage:
+    python concat_bench.py --shards 128 1000 10000 --fan-in 32 64 \
+        --workers 1 4 8
+
+One short H.264 shard is encoded with ffmpeg and hard-linked `--shards`
+times into a scratch directory (the concat demuxer opens every entry, so
+the copies cost what distinct shards would). Each configuration then
+stream-copies them into one output:
+    - flat: a single concat-demuxer run over the whole list, as
+      `VideoJockey.__write_video` and `video.concat` do without the tree
+    - tree: `video.tree_concat` with the given fan-in and worker count
+Reported: wall time per configuration and speedup over flat.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import video
+
+
+def make_shards(work_dir, count, seconds, size):
+    src = os.path.join(work_dir, "src.mp4")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=size={size}:rate=25:duration={seconds}",
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            src,
+        ],
+        check=True,
+    )
+    shard_dir = os.path.join(work_dir, f"shards_{count}")
+    os.makedirs(shard_dir)
+    paths = []
+    for i in range(count):
+        path = os.path.join(shard_dir, f"shard_{i:05d}.mp4")
+        os.link(src, path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flat vs tree concat")
+    parser.add_argument(
+        "--shards", type=int, nargs="+", default=[128, 1000, 10000]
+    )
+    parser.add_argument("--fan-in", type=int, nargs="+", default=[32, 64])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument(
+        "--seconds", type=float, default=0.5, help="Length of each shard"
+    )
+    parser.add_argument("--size", default="320x240")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        print(
+            f"{'shards':>6} {'mode':<5} {'fan-in':>6} {'workers':>7}"
+            f" {'wall s':>8} {'speedup':>7}"
+        )
+        for count in args.shards:
+            paths = make_shards(work_dir, count, args.seconds, args.size)
+            out_path = os.path.join(work_dir, "out.mp4")
+            t0 = time.perf_counter()
+            ok = video.concat_copy(paths, out_path)
+            flat = time.perf_counter() - t0
+            print(
+                f"{count:>6} {'flat':<5} {'-':>6} {'-':>7} {flat:>8.2f}"
+                f" {'1.00' if ok else 'FAILED':>7}"
+            )
+            for fan_in in args.fan_in:
+                for workers in args.workers:
+                    t0 = time.perf_counter()
+                    ok = video.tree_concat(paths, out_path, fan_in, workers)
+                    wall = time.perf_counter() - t0
+                    speedup = f"{flat / wall:.2f}" if ok else "FAILED"
+                    print(
+                        f"{count:>6} {'tree':<5} {fan_in:>6} {workers:>7}"
+                        f" {wall:>8.2f} {speedup:>7}"
+                    )
+            shutil.rmtree(os.path.dirname(paths[0]))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -41,9 +41,95 @@ logger.setLevel(logging.INFO)
 # buffer parameters
 FAN_BUFFER_SIZE = 16
 SHARED_BUFFER_SIZE = 4
+# max entries carried by one put_many batch (one queue item); the
+# buffer still holds at most SHARED_BUFFER_SIZE entries
+SHARED_BUFFER_BATCH_SIZE = 16
+
+# credit-based flow control (see flow_control.py): fans wait for a send
+# credit before any shard I/O; the VJ keeps at most CREDIT_WINDOW credits
+# outstanding
+FLOW_CONTROL_ENABLED = True
+CREDIT_WINDOW = SHARED_BUFFER_SIZE
+
+# how long a fan waits for the VJ to ack its shard as new or duplicate
+DELIVERY_ACK_TIMEOUT = 1.0
+
+# share a bitmap of received shard ids so fans that pick shard ids
+# themselves pick missing ones rather than random ones (see
+# shard_coverage.py; run_simulation hands each fan its shard instead)
+COVERAGE_SELECTION_ENABLED = True
+
+# shared buffer backend used by run_simulation: "manager" (manager.Queue
+# of temp file paths), "shm" (shared-memory ring carrying shard bytes),
+# "pipe" (one multiprocessing.Pipe per fan) or "socket" (fans stream
+# shards to the VJ's ingest server)
+SHARED_BUFFER_BACKEND = "manager"
+# shared-memory ring geometry: entries span as many slots as they need
+SHM_RING_SLOTS = 64
+SHM_SLOT_SIZE = 256 * 1024
+# entries in flight per fan channel for the "pipe" backend
+PIPE_CHANNEL_CAPACITY = 4
+
+# socket ingest (see ingest_server.py), used by the "socket" backend so
+# fans can run on other hosts: "tcp" (INGEST_HOST:INGEST_PORT) or "unix"
+# (INGEST_UNIX_PATH, same host only)
+INGEST_FAMILY = "tcp"
+INGEST_HOST = "127.0.0.1"
+INGEST_PORT = 50007
+# shards received but not yet read by the VJ before senders stall
+INGEST_QUEUE_SIZE = SHARED_BUFFER_SIZE
+# how long a fan keeps retrying to reach the VJ's server
+INGEST_CONNECT_TIMEOUT = 30.0
+# pending connections the ingest server's listen socket accepts
+INGEST_BACKLOG = 1024
+# VJ side of the "socket" backend: "threads" (a thread per connection,
+# ingest_server.py) or "asyncio" (one event loop, async_ingest.py)
+VJ_INGEST_MODE = "threads"
+# threads writing and hashing received chunks in "asyncio" mode
+ASYNC_INGEST_WRITERS = 4
+
+# chunk size (bytes) used when streaming files through the hasher
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# how fans place shard files in TEMP_DIR, cheapest first (see handoff.py)
+SHARD_HANDOFF_MODES = (
+    "hardlink",
+    "reflink",
+    "copy_file_range",
+    "sendfile",
+    "copy",
+)
+
+# worker threads used to verify shard hashes in parallel
+VERIFY_WORKERS = 8
+
+# how the VJ composes the final video: "batch" (one concat + audio job
+# after the last shard) or "incremental" (shards are appended to a
+# running ffmpeg as they arrive, see incremental_composer.py)
+VJ_COMPOSE_MODE = "batch"
+
+# what the VJ writes: "mp4" (final_collage.mp4) or "hls" (a live HLS
+# playlist that grows as shards arrive, see hls_output.py)
+VJ_OUTPUT_MODE = "mp4"
+
+# compose shards in manifest shard id order rather than arrival order;
+# shards without a manifest id are appended after the ordered ones
+VJ_ORDER_BY_SHARD_ID = True
+
+# MPEG-TS service name written into the VJ's TS output
+TS_SERVICE_NAME = "VideoSphere VJ"
+# workaround for the johnvansickle.com static ffmpeg 7.0.2 build, which
+# ships without iconv/gconv modules and segfaults reading back a TS whose
+# service name uses the default charset: tag the name as UTF-8 (0x15
+# selector) instead. Set to False with any other ffmpeg build.
+TS_SERVICE_NAME_UTF8 = True
 
 # temporary directory for videos
 TEMP_DIR = PROJECT_DIR / "temp"
+INGEST_UNIX_PATH = TEMP_DIR / "ingest.sock"
+# HLS output mode: segments and playlist
+HLS_DIR = TEMP_DIR / "hls"
+HLS_PLAYLIST_NAME = "index.m3u8"
 
 # url
 URL = (
@@ -62,6 +148,35 @@ TIME_EPSILON = 0.0000001
 # shards json file
 SHARDS_DIR = PROJECT_DIR / "video_shards"
 SHARDS_JSON_FILE_PATH = SHARDS_DIR / "shards.json"
+# the segmenter rewrites the manifest every this many shards (and once at
+# the end) instead of after each one
+MANIFEST_FLUSH_EVERY = 64
+
+# persistent cache of file hashes keyed by (path, size, mtime_ns, inode)
+HASH_CACHE_ENABLED = True
+HASH_CACHE_PATH = SHARDS_DIR / "hash_cache.sqlite3"
+
+# ffprobe results: in-process LRU size and optional persistent layer
+PROBE_CACHE_SIZE = 1024
+PROBE_CACHE_PERSIST = True
+PROBE_CACHE_PATH = SHARDS_DIR / "probe_cache.sqlite3"
+# concurrent ffprobe processes used by video.probe_many
+PROBE_WORKERS = 8
+
+# concatenate more than CONCAT_TREE_FAN_IN shards as a tree: groups of
+# that many are concatenated by up to CONCAT_WORKERS ffmpeg processes at
+# once (None: one per CPU), then the results again, level by level. With
+# a single worker the tree only adds copies, so it is skipped. Off until
+# a multi-core run of concat_bench.py shows the tree beating a flat concat
+CONCAT_TREE_ENABLED = False
+CONCAT_TREE_FAN_IN = 64
+CONCAT_WORKERS = None
+
+# pre-rendered, faded AAC soundtracks reused across compositions (see
+# audio_cache.py); least recently used tracks are evicted past the limit
+AUDIO_CACHE_ENABLED = True
+AUDIO_CACHE_DIR = SHARDS_DIR / "audio_cache"
+AUDIO_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
 # configure log output format
 FORMAT = "[%(asctime)s:%(levelname)-8s] %(message)s"
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Simulate sends-to-completion for random vs coverage-aware shard choice.
+Usage:
+    python coverage_bench.py --shards 128 1024 --fans 1 16 64 --trials 20
+
+Each of `--fans` fans always has one send in flight. A fan picks its shard
+when it starts a send; sends land one at a time in the order they were
+started, the VJ marks the shard received, and that fan picks again. So a
+fan's choice is made against a bitmap that is `--fans - 1` sends stale,
+the way concurrent fans see it. Strategies:
+    - random:  uniform over all shard ids (`Fan` without a coverage map)
+    - missing: a random id missing from the `CoverageMap`
+Reported: mean total sends until every shard is received, sends per
+shard, and the coupon-collector expectation N * H(N) for reference.
+"""
+import argparse
+import collections
+import random
+import sys
+
+from shard_coverage import CoverageMap
+
+
+def sends_to_completion(num_shards, fans, strategy, rng):
+    coverage = CoverageMap(num_shards)
+
+    def pick():
+        if strategy == "missing":
+            shard_id = coverage.random_missing(rng)
+            if shard_id is not None:
+                return shard_id
+        return rng.randrange(num_shards)
+
+    in_flight = collections.deque(pick() for _ in range(fans))
+    sends = fans
+    while True:
+        coverage.mark(in_flight.popleft())
+        if coverage.complete():
+            return sends
+        in_flight.append(pick())
+        sends += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sends needed to collect every shard"
+    )
+    parser.add_argument("--shards", type=int, nargs="+", default=[128, 1024])
+    parser.add_argument("--fans", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(
+        f"{'shards':>6} {'fans':>5} {'strategy':<8} {'sends':>9}"
+        f" {'per shard':>9} {'N*H(N)':>8}"
+    )
+    for num_shards in args.shards:
+        coupon = num_shards * sum(1.0 / k for k in range(1, num_shards + 1))
+        for fans in args.fans:
+            for strategy in ("random", "missing"):
+                total = sum(
+                    sends_to_completion(num_shards, fans, strategy, rng)
+                    for _ in range(args.trials)
+                )
+                mean = total / args.trials
+                print(
+                    f"{num_shards:>6} {fans:>5} {strategy:<8} {mean:>9.1f}"
+                    f" {mean / num_shards:>9.2f} {coupon:>8.0f}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,21 @@
 """Fan producer: reads or generates a shard, writes to a temp
-file and enqueues its path.
+file and enqueues its path (or, for buffers that carry payloads, the
+shard bytes themselves; socket transports stream the shard file).
 
 Key behaviors:
     - Optionally uses a provided shard path (for tests) or picks a
-      random shard id.
-    - Writes shard bytes to a temp file under `config.TEMP_DIR`.
+      random shard id, resolved through the shard manifest index when
+      one exists. With a coverage map on the transport
+      (`shared_buffer.coverage`) the id is a random one the VJ is still
+      missing.
+    - Places the shard in a temp file under `config.TEMP_DIR`, via
+      `handoff` (hardlink, reflink or in-kernel copy) for real shard
+      files and a plain write for dummy payloads.
+    - With credit-based flow control (`shared_buffer.credits`), waits
+      for a send credit before any shard I/O.
     - Retries enqueueing with backpressure logging.
+    - Logs the VJ's ack (new or duplicate shard) when the transport
+      passes acks back.
     - Registers failed temp files for cleanup worker if enqueueing
       ultimately fails.
 """
@@ -14,6 +24,7 @@ import os
 import random
 import tempfile
 import time
+import uuid
 
 from contextlib import suppress
 
@@ -24,6 +35,9 @@ except ImportError:
     Faker = None  # type: ignore
 
 import config
+import handoff
+import manifest
+import transport
 from config import logger
 
 if Faker is not None:
@@ -64,6 +78,14 @@ class Fan(object):
         # control whether this fan emits INFO logs (else, downgrade to
         # DEBUG)
         self.__verbose = verbose
+        # the VJ's ack for our last shard (transport.ACK_*), if any
+        self.__delivery = None
+        # True between taking a send credit and putting the shard
+        self.__holds_credit = False
+        # sender field of the current delivery; the VJ acks by it
+        self.__sender = self.__name
+        # shard_coverage.CoverageMap of the transport we send on, if any
+        self.__coverage = None
 
     def id(self):
         return self.__id
@@ -74,18 +96,58 @@ class Fan(object):
     def buffer(self):
         return self.__buffer
 
-    def read_random_shard(self):
+    def delivery(self):
+        return self.__delivery
+
+    def __dummy_shard(self):
+        dummy = f"dummy-shard-{self.__id}-{random.randint(0, 9999)}"
+        return bytes(dummy, "utf-8")
+
+    def __shard_file_path(self, shard_id, verify=True):
         """
-        Read a random shard from disk, returns the byte data.
+        Resolve a shard id to a file path via the manifest index, falling
+        back to the conventional file name when there is no manifest.
+        Returns None if the indexed shard fails verification; with
+        verify=False the shard is not hashed.
+        """
+        index = manifest.default_index()
+        shard = index.get(shard_id) if index is not None else None
+        if shard is None:
+            padded = str(shard_id).zfill(4)
+            # SHARDS_DIR may be a Path; construct path safely
+            return config.SHARDS_DIR / f"shard_{padded}.mp4"
+        try:
+            # lazy shards are verified on first use
+            return shard.file_path(verify=verify)
+        except (Exception, SystemExit) as e:
+            logger.error(
+                "shard %s failed verification exception=%s; using dummy shard",
+                shard_id,
+                type(e).__name__,
+            )
+            return None
+
+    def __pick_shard_file(self, verify=True):
+        """
+        The shard file this fan sends: the provided shard_path, or a
+        random shard id resolved via the manifest. None means the dummy
+        payload should be used.
         """
         # If a specific shard path was provided, use it.
         if getattr(self, "_Fan__shard_path", None):
-            file_path = self.__shard_path
-        else:
+            return self.__shard_path
+        shard_id = None
+        coverage = getattr(self, "_Fan__coverage", None)
+        if coverage is not None:
+            # a random missing id: concurrent fans rarely collide
+            shard_id = coverage.random_missing()
+        if shard_id is None:
             shard_id = random.randint(0, config.NUM_SHARDS - 1)
-            padded = str(shard_id).zfill(4)
-            # SHARDS_DIR may be a Path; construct path safely
-            file_path = config.SHARDS_DIR / f"shard_{padded}.mp4"
+        return self.__shard_file_path(shard_id, verify=verify)
+
+    def __read_shard(self, file_path):
+        if file_path is None:
+            return self.__dummy_shard()
 
         try:
             with open(str(file_path), "rb") as file:
@@ -97,41 +159,97 @@ class Fan(object):
                 file_path,
                 type(e).__name__,
             )
-            dummy = f"dummy-shard-{self.__id}-{random.randint(0, 9999)}"
-            return bytes(dummy, "utf-8")
+            return self.__dummy_shard()
+
+    def read_random_shard(self):
+        """
+        Read a random shard from disk, returns the byte data.
+        """
+        return self.__read_shard(self.__pick_shard_file())
 
-        # Should not reach here due to returns in try/except
-        # but keep a defensive return of empty bytes
-        return b""
+    def __write_temp(self, tmp_dir):
+        """
+        Place this fan's shard in `tmp_dir` and return the temp path.
+        Real shard files go through handoff (hardlink/reflink/in-kernel
+        copy); dummy payloads are written out as before.
+        """
+        file_path = self.__pick_shard_file()
+        if file_path is not None and os.path.isfile(str(file_path)):
+            try:
+                tmp_name, mode = handoff.handoff(file_path, tmp_dir)
+                logger.debug(
+                    "fan %s handed off %s via %s", self.name(), file_path, mode
+                )
+                return tmp_name
+            except OSError as e:
+                logger.debug("handoff of %s failed: %s", file_path, e)
+
+        # write a temporary file then publish its path
+        tmp = tempfile.NamedTemporaryFile(delete=False, dir=str(tmp_dir))
+        payload = self.__read_shard(file_path)
+        tmp.write(payload)
+        tmp.flush()
+        tmp_name = tmp.name
+        tmp.close()
+        return tmp_name
 
     def send_shard(self, shared_buffer):
         """
         Example code to send a shard to shared buffer element 0.
         """
-        # Write our shard to a temp file and publish its path to the
-        # bounded queue.
+        self.__coverage = getattr(shared_buffer, "coverage", None)
+        # with flow control, no shard I/O happens before we hold a credit
+        gate = getattr(shared_buffer, "credits", None)
+        if gate is not None and not self.__wait_for_credit(
+            shared_buffer, gate
+        ):
+            return
+        self.__holds_credit = gate is not None
+        self.__sender = transport.sender_tag(
+            self.__name, self.__id, uuid.uuid4().hex[:12]
+        )
+        try:
+            self.__send(shared_buffer)
+        finally:
+            # whatever kept the shard out of the buffer, the VJ must be
+            # able to grant its credit again
+            self.__refund(shared_buffer)
+
+    def __send(self, shared_buffer):
+        if getattr(shared_buffer, "carries_payload", False):
+            # the buffer holds shard bytes itself; no temp file needed
+            self.__send_payload(shared_buffer)
+            return
+
+        if getattr(shared_buffer, "sends_files", False):
+            # the transport streams the shard file itself (e.g. over a
+            # socket to a VJ on another host); only dummies go as bytes
+            file_path = self.__pick_shard_file()
+            if file_path is not None and os.path.isfile(str(file_path)):
+                self.__send_payload(shared_buffer, str(file_path))
+            else:
+                self.__send_payload(
+                    shared_buffer, self.__read_shard(file_path)
+                )
+            return
+
+        self.__send_temp_file(shared_buffer)
+
+    def __send_temp_file(self, shared_buffer):
+        """
+        Place the shard in a temp file and publish its path to the
+        bounded queue.
+        """
         try:
             # ensure temp dir exists
             tmp_dir = config.TEMP_DIR
             os.makedirs(tmp_dir, exist_ok=True)
 
-            # write a temporary file then publish its path
-            tmp = tempfile.NamedTemporaryFile(delete=False, dir=str(tmp_dir))
-            payload = self.read_random_shard()
-            tmp.write(payload)
-            tmp.flush()
-            tmp_name = tmp.name
-            tmp.close()
+            tmp_name = self.__write_temp(tmp_dir)
 
             # If the VideoJockey has already claimed all shards, stop and
             # remove our temp file to avoid unnecessary work.
-            vj_flag = getattr(shared_buffer, "vj_has_all_shards", None)
-            has_all = (
-                bool(getattr(vj_flag, "value", False))
-                if vj_flag is not None
-                else False
-            )
-            if has_all:
+            if self.__vj_has_all_shards(shared_buffer):
                 log_fn = logger.info if self.__verbose else logger.debug
                 log_fn(
                     "fan %s detected DJ has capacity/full; removing temp and exiting -> %s",
@@ -144,26 +262,22 @@ class Fan(object):
 
             # Try to put into the bounded shared buffer with retries/backoff.
             max_attempts = 5
-            attempt = 0
-            put_ok = False
-            while attempt < max_attempts and not put_ok:
-                # block up to 2 seconds to allow DJ to consume
-                put_ok = shared_buffer.put_shard(
-                    self.__name, tmp_name, timeout=2.0
-                )
-                if not put_ok:
-                    logger.debug(
-                        "fan %s backpressure: buffer full, retrying (%d/%d)",
-                        self.name(),
-                        attempt + 1,
-                        max_attempts,
-                    )
-                    time.sleep(0.2 * (attempt + 1))
-                attempt += 1
-
+            put_ok = self.__put_with_retries(
+                shared_buffer, tmp_name, max_attempts
+            )
             if put_ok:
-                log_fn = logger.info if self.__verbose else logger.debug
-                log_fn("The fan %s sent shard -> shared buffer", self.name())
+                self.__log_delivery(shared_buffer)
+                return
+            self.__refund(shared_buffer)
+            if self.__vj_has_all_shards(shared_buffer):
+                # the DJ finished while we were backing off
+                logger.debug(
+                    "fan %s: DJ has all shards; removing temp %s",
+                    self.name(),
+                    tmp_name,
+                )
+                with suppress(FileNotFoundError, PermissionError, OSError):
+                    os.remove(tmp_name)
             else:
                 logger.error(
                     "fan %s failed to enqueue shard after %d attempts; registering shard for later cleanup %s",
@@ -195,6 +309,151 @@ class Fan(object):
 
         except (OSError, IOError) as e:
             logger.error("fan %s failed to write shard: %s", self.name(), e)
+            self.__refund(shared_buffer)
+
+    def __vj_has_all_shards(self, shared_buffer):
+        # an Event check is local; the manager Value costs a round trip
+        collected = getattr(shared_buffer, "all_shards_collected", None)
+        if callable(collected):
+            return collected()
+        vj_flag = getattr(shared_buffer, "vj_has_all_shards", None)
+        return (
+            bool(getattr(vj_flag, "value", False))
+            if vj_flag is not None
+            else False
+        )
+
+    def __put_with_retries(self, shared_buffer, item, max_attempts):
+        attempt = 0
+        put_ok = False
+        while attempt < max_attempts and not put_ok:
+            # block up to 2 seconds to allow DJ to consume
+            put_ok = shared_buffer.put_shard(
+                self.__sender, item, timeout=2.0
+            )
+            if put_ok:
+                # the VJ returns the credit when it consumes the shard
+                self.__holds_credit = False
+            else:
+                logger.debug(
+                    "fan %s backpressure: buffer full, retrying (%d/%d)",
+                    self.name(),
+                    attempt + 1,
+                    max_attempts,
+                )
+                # back off, but wake up early if the VJ finishes
+                wait_done = getattr(
+                    shared_buffer, "wait_all_shards_collected", None
+                )
+                if callable(wait_done):
+                    if wait_done(0.2 * (attempt + 1)):
+                        break
+                else:
+                    time.sleep(0.2 * (attempt + 1))
+            attempt += 1
+        return put_ok
+
+    def __log_delivery(self, shared_buffer):
+        """
+        Log a sent shard with the VJ's ack (new or duplicate) when the
+        transport passes acks back.
+        """
+        status = None
+        delivery_status = getattr(shared_buffer, "delivery_status", None)
+        if callable(delivery_status):
+            status = delivery_status(
+                self.__sender,
+                timeout=getattr(config, "DELIVERY_ACK_TIMEOUT", 1.0),
+            )
+        self.__delivery = status
+        log_fn = logger.info if self.__verbose else logger.debug
+        if status is None:
+            log_fn("The fan %s sent shard -> shared buffer", self.name())
+        else:
+            log_fn(
+                "The fan %s sent shard -> shared buffer (%s)",
+                self.name(),
+                status,
+            )
+
+    def __refund(self, shared_buffer):
+        """
+        Give back the send credit of a shard that was not delivered;
+        a no-op once it has been refunded or the shard was put.
+        """
+        if not self.__holds_credit:
+            return
+        self.__holds_credit = False
+        handed_over = getattr(shared_buffer, "handed_over", None)
+        if callable(handed_over) and handed_over(self.__sender):
+            # only its ack timed out: the VJ still consumes the shard
+            return
+        gate = getattr(shared_buffer, "credits", None)
+        if gate is not None:
+            gate.refund()
+
+    def __wait_for_credit(self, shared_buffer, gate):
+        """
+        Block until the VJ grants a send credit. Returns False, after
+        recording the shard bytes we did not have to move, if the VJ
+        finishes first.
+        """
+        while not gate.acquire(timeout=1.0):
+            if gate.closed() or self.__vj_has_all_shards(shared_buffer):
+                # only the size is needed; hashing the shard here would be
+                # the very I/O the credit saved
+                file_path = self.__pick_shard_file(verify=False)
+                try:
+                    nbytes = os.path.getsize(str(file_path))
+                except (OSError, TypeError):
+                    nbytes = 0
+                gate.record_avoided(nbytes)
+                log_fn = logger.info if self.__verbose else logger.debug
+                log_fn(
+                    "fan %s: DJ has all shards; skipped sending %d bytes",
+                    self.name(),
+                    nbytes,
+                )
+                return False
+        return True
+
+    def __send_payload(self, shared_buffer, payload=None):
+        """
+        Put the shard bytes straight into a payload-carrying buffer
+        (e.g. shm_buffer.ShmRingBuffer), or hand `payload` to a transport
+        that sends it itself.
+        """
+        log_fn = logger.info if self.__verbose else logger.debug
+        if self.__vj_has_all_shards(shared_buffer):
+            log_fn("fan %s detected DJ has all shards; exiting", self.name())
+            return
+        max_attempts = 5
+        if payload is None:
+            payload = self.read_random_shard()
+        try:
+            put_ok = self.__put_with_retries(
+                shared_buffer, payload, max_attempts
+            )
+        except ValueError as e:
+            # larger than the buffer can ever hold: retrying cannot help,
+            # but a temp file path fits
+            logger.warning(
+                "fan %s: %s; sending a temp file instead", self.name(), e
+            )
+            self.__send_temp_file(shared_buffer)
+            return
+        if put_ok:
+            self.__log_delivery(shared_buffer)
+            return
+        self.__refund(shared_buffer)
+        if self.__vj_has_all_shards(shared_buffer):
+            log_fn("fan %s detected DJ has all shards; exiting", self.name())
+        else:
+            logger.error(
+                "fan %s failed to enqueue shard after %d attempts",
+                self.name(),
+                max_attempts,
+            )
 
     def start(self, shared_buffer):
         self.send_shard(shared_buffer)
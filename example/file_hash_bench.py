@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark the legacy whole-file hash against the streaming `file_hash`.
+Usage:
+    python file_hash_bench.py --size-mb 512
+    python file_hash_bench.py --file /path/to/source.mp4
+
+Each path runs in a fresh process so the reported peak RSS belongs to
+that path alone. Prints MB/s and peak RSS growth for both paths and
+checks that the digests match.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import video
+
+
+def legacy_file_hash(file_path):
+    """The original implementation: read, decode, re-encode, hash."""
+    with open(file_path, "rb") as file:
+        byte_data = file.read()
+    s = byte_data.decode("latin-1")
+    return video.shake256_hash(s)
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run(mode, file_path, results):
+    before = _peak_rss_bytes()
+    t0 = time.perf_counter()
+    if mode == "legacy":
+        digest = legacy_file_hash(file_path)
+    else:
+        digest = video.file_hash(file_path, use_cache=False)
+    elapsed = time.perf_counter() - t0
+    results.put((mode, digest, elapsed, _peak_rss_bytes() - before))
+
+
+def _make_sample(size_mb):
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".bin")
+    block = os.urandom(1024 * 1024)
+    for _ in range(size_mb):
+        tmp.write(block)
+    tmp.close()
+    return tmp.name
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare legacy and streaming file_hash"
+    )
+    parser.add_argument(
+        "--file", default=None, help="File to hash (default: random sample)"
+    )
+    parser.add_argument(
+        "--size-mb",
+        type=int,
+        default=256,
+        help="Size of the random sample file when --file is not given",
+    )
+    args = parser.parse_args()
+
+    file_path = args.file or _make_sample(args.size_mb)
+    size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        rows = []
+        for mode in ("legacy", "streaming"):
+            p = ctx.Process(target=_run, args=(mode, file_path, results))
+            p.start()
+            rows.append(results.get())
+            p.join()
+    finally:
+        if args.file is None:
+            os.remove(file_path)
+
+    print(f"file size: {size_mb:.1f} MB")
+    print(f"{'mode':<10} {'digest':<18} {'MB/s':>10} {'peak RSS +MB':>14}")
+    for mode, digest, elapsed, rss in rows:
+        rate = size_mb / elapsed if elapsed > 0 else float("inf")
+        print(
+            f"{mode:<10} {digest:<18} {rate:>10.1f} {rss / 2**20:>14.1f}"
+        )
+
+    if rows[0][1] != rows[1][1]:
+        print("digest mismatch", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Credit-based flow control between the VideoJockey and fans.
+
+Without it a fan reads and writes its shard first and only then finds out
+whether the buffer has room, retrying with sleeps and, if it gives up,
+leaving a temp file for the cleanup worker. With a `CreditGate` attached
+to the transport (`transport.credits`) a fan waits for a send credit
+before doing any shard I/O, and the VJ hands out credits:
+
+    - never more outstanding (granted but not yet received) than the
+      buffer can hold (`config.CREDIT_WINDOW`),
+    - never more than the shards it still needs.
+
+A credit only comes back when the VJ consumes a shard, so credits are
+issued at the VJ's consumption rate and the buffer can never overflow.
+
+When the VJ is done it closes the gate; fans still waiting give up
+without touching their shard and count the bytes they did not move.
+`metrics()` reports credit waits and those avoided bytes.
+"""
+
+import multiprocessing
+import time
+
+import config
+
+
+class CreditGate(object):
+    """
+    send credits shared between the VJ and fan processes
+    """
+
+    def __init__(self, window=None):
+        if window is None:
+            window = getattr(
+                config, "CREDIT_WINDOW", config.SHARED_BUFFER_SIZE
+            )
+        self.__window = max(1, int(window))
+        self.__credits = multiprocessing.Semaphore(0)
+        self.__lock = multiprocessing.Lock()
+        self.__closed = multiprocessing.Value("b", False, lock=False)
+        self.__waiters = multiprocessing.Value("i", 0, lock=False)
+        self.__granted = multiprocessing.Value("q", 0, lock=False)
+        self.__consumed = multiprocessing.Value("q", 0, lock=False)
+        self.__waits = multiprocessing.Value("q", 0, lock=False)
+        self.__wait_seconds = multiprocessing.Value("d", 0.0, lock=False)
+        self.__avoided_shards = multiprocessing.Value("q", 0, lock=False)
+        self.__avoided_bytes = multiprocessing.Value("q", 0, lock=False)
+
+    # -- fan side --
+
+    def acquire(self, timeout=None):
+        """
+        Wait up to `timeout` seconds for a send credit. Returns True with
+        a credit, False on timeout or once the gate is closed.
+        """
+        if self.__credits.acquire(block=False):
+            if not self.closed():
+                return True
+            return False
+        with self.__lock:
+            if self.__closed.value:
+                return False
+            self.__waiters.value += 1
+        t0 = time.monotonic()
+        got = self.__credits.acquire(timeout=timeout)
+        waited = time.monotonic() - t0
+        with self.__lock:
+            self.__waiters.value -= 1
+            self.__waits.value += 1
+            self.__wait_seconds.value += waited
+            return got and not self.__closed.value
+
+    def refund(self):
+        """Hand back a credit whose shard never made it into the
+        buffer, so the VJ can grant it again."""
+        with self.__lock:
+            self.__granted.value -= 1
+
+    def record_avoided(self, nbytes):
+        """A fan gave up before any I/O on a shard of `nbytes`."""
+        with self.__lock:
+            self.__avoided_shards.value += 1
+            self.__avoided_bytes.value += max(0, int(nbytes))
+
+    # -- VJ side --
+
+    def grant(self, n):
+        with self.__lock:
+            if self.__closed.value:
+                return
+            self.__granted.value += n
+        for _ in range(n):
+            self.__credits.release()
+
+    def consumed(self, n=1):
+        """The VJ received `n` shards sent under a credit."""
+        with self.__lock:
+            self.__consumed.value += n
+
+    def outstanding(self):
+        """Credits granted but not yet received as shards."""
+        with self.__lock:
+            return self.__granted.value - self.__consumed.value
+
+    def replenish(self, remaining):
+        """
+        Top credits up for a VJ that still needs `remaining` shards.
+        Returns the number of credits granted.
+        """
+        n = min(self.__window, remaining) - self.outstanding()
+        if n > 0:
+            self.grant(n)
+            return n
+        return 0
+
+    def close(self):
+        """No more credits; wake every fan still waiting for one."""
+        with self.__lock:
+            self.__closed.value = True
+            waiters = self.__waiters.value
+        for _ in range(waiters):
+            self.__credits.release()
+
+    def closed(self):
+        return bool(self.__closed.value)
+
+    def metrics(self):
+        with self.__lock:
+            return {
+                "granted": self.__granted.value,
+                "consumed": self.__consumed.value,
+                "credit_waits": self.__waits.value,
+                "credit_wait_seconds": self.__wait_seconds.value,
+                "avoided_shards": self.__avoided_shards.value,
+                "avoided_bytes": self.__avoided_bytes.value,
+            }
@@ -0,0 +1,127 @@
+"""Zero-copy handoff of shard files into the temp directory.
+
+Fans used to read a whole shard into memory and write it back out to a
+temp file. `handoff()` instead places a copy of the shard in the temp
+directory with the cheapest mechanism the filesystem supports, trying in
+order:
+
+    - hardlink: no data is copied at all (same filesystem only). The VJ
+      only reads and removes temp files, so sharing the inode with the
+      shard store is safe.
+    - reflink: copy-on-write clone via the Linux FICLONE ioctl
+      (btrfs, xfs, ...).
+    - copy_file_range: in-kernel copy, no user-space buffers.
+    - sendfile: in-kernel copy between file descriptors.
+    - copy: buffered read/write fallback.
+
+Any mode that fails with an OSError (unsupported, cross-device, ...) is
+skipped and the next one is tried. `config.SHARD_HANDOFF_MODES` selects
+which modes are attempted.
+"""
+
+import errno
+import os
+import shutil
+import uuid
+
+import config
+from config import logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MODES = ("hardlink", "reflink", "copy_file_range", "sendfile", "copy")
+
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError(errno.ENOTSUP, "reflink needs fcntl")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_file_range(src, dst):
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "os.copy_file_range unavailable")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if n == 0:
+                break
+            remaining -= n
+
+
+def _sendfile(src, dst):
+    if not hasattr(os, "sendfile"):
+        raise OSError(errno.ENOSYS, "os.sendfile unavailable")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        while offset < size:
+            n = os.sendfile(
+                fdst.fileno(), fsrc.fileno(), offset, size - offset
+            )
+            if n == 0:
+                break
+            offset += n
+
+
+def _copy(src, dst):
+    chunk_size = getattr(config, "HASH_CHUNK_SIZE", 1024 * 1024)
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst, chunk_size)
+
+
+_HANDLERS = {
+    "hardlink": _hardlink,
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _sendfile,
+    "copy": _copy,
+}
+
+
+def temp_name(dst_dir):
+    """A fresh, not yet existing path in `dst_dir`."""
+    return os.path.join(str(dst_dir), f"tmp{uuid.uuid4().hex}")
+
+
+def handoff(src, dst_dir=None, modes=None):
+    """
+    Place a copy of `src` in `dst_dir` (default `config.TEMP_DIR`) and
+    return (path, mode). Raises OSError if `src` cannot be read or every
+    mode fails.
+    """
+    if dst_dir is None:
+        dst_dir = config.TEMP_DIR
+    if modes is None:
+        modes = getattr(config, "SHARD_HANDOFF_MODES", MODES)
+    os.makedirs(str(dst_dir), exist_ok=True)
+    # fail fast on a missing source rather than once per mode
+    os.stat(str(src))
+
+    last_error = None
+    for mode in modes:
+        dst = temp_name(dst_dir)
+        try:
+            _HANDLERS[mode](str(src), dst)
+        except OSError as e:
+            last_error = e
+            logger.debug("handoff %s failed for %s: %s", mode, src, e)
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            continue
+        return dst, mode
+    raise OSError(f"no handoff mode worked for {src}: {last_error}")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Measure the throughput of each shard handoff mode on this machine.
+Usage:
+    python handoff_bench.py --size-mb 256
+    python handoff_bench.py --file /path/to/shard.mp4 --dest /path/to/temp
+
+Runs `handoff.handoff` restricted to one mode at a time, plus the old
+read-into-memory-then-write path, and prints MB/s per mode (or why the
+mode is unsupported between the two directories).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import handoff
+
+
+def legacy_copy(src, dst_dir):
+    """The original fan path: read the whole shard, write a temp file."""
+    with open(src, "rb") as fh:
+        payload = fh.read()
+    tmp = tempfile.NamedTemporaryFile(delete=False, dir=dst_dir)
+    tmp.write(payload)
+    tmp.close()
+    return tmp.name
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        path = fn()
+        best = min(best, time.perf_counter() - t0)
+        os.remove(path)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report per-mode shard handoff throughput"
+    )
+    parser.add_argument(
+        "--file", default=None, help="Shard to copy (default: random sample)"
+    )
+    parser.add_argument(
+        "--size-mb",
+        type=int,
+        default=128,
+        help="Size of the random sample file when --file is not given",
+    )
+    parser.add_argument(
+        "--dest", default=None, help="Destination dir (default: a temp dir)"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dest = args.dest or tempfile.mkdtemp()
+    src = args.file
+    if src is None:
+        # sample lives next to the destination so hardlinks can work
+        fd, src = tempfile.mkstemp(dir=dest, suffix=".bin")
+        with os.fdopen(fd, "wb") as fh:
+            for _ in range(args.size_mb):
+                fh.write(os.urandom(1024 * 1024))
+    size_mb = os.path.getsize(src) / (1024 * 1024)
+
+    print(f"file size: {size_mb:.1f} MB -> {dest}")
+    print(f"{'mode':<16} {'MB/s':>12}")
+    try:
+        elapsed = _time(lambda: legacy_copy(src, dest), args.repeat)
+        print(f"{'read+write':<16} {size_mb / elapsed:>12.1f}")
+        for mode in handoff.MODES:
+            try:
+                elapsed = _time(
+                    lambda: handoff.handoff(src, dest, modes=(mode,))[0],
+                    args.repeat,
+                )
+            except OSError as e:
+                print(f"{mode:<16} {'unsupported':>12}  ({e})")
+                continue
+            rate = size_mb / elapsed if elapsed > 0 else float("inf")
+            print(f"{mode:<16} {rate:>12.1f}")
+    finally:
+        if args.file is None:
+            os.remove(src)
+        if args.dest is None:
+            os.rmdir(dest)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
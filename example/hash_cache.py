@@ -0,0 +1,203 @@
+"""Persistent on-disk cache of file hashes.
+
+Digests are stored in a SQLite database (`config.HASH_CACHE_PATH`, under
+`config.SHARDS_DIR` by default) keyed by file identity: absolute path,
+size, mtime_ns and inode. A lookup only hits when all four still match,
+so an edited or replaced file is rehashed automatically.
+
+Key behaviors:
+    - Safe to use from many processes at once: WAL journaling plus a
+      busy timeout, and one connection per process and thread.
+    - Any cache failure (unwritable directory, locked or corrupt
+      database) is logged at DEBUG and treated as a miss; hashing never
+      fails because of the cache.
+    - `invalidate()` drops one path or the whole cache to force a
+      recheck; `video.file_hash(..., refresh=True)` bypasses lookups.
+    - Per-run temp files (under `config.TEMP_DIR`) are never looked up
+      or stored, so they do not pile up in the database.
+
+Usage:
+    python hash_cache.py --prune   # drop rows for files that are gone
+    python hash_cache.py --clear   # drop everything
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import config
+from config import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL
+)
+"""
+
+# per-thread connections; the pid guards against reusing a connection
+# inherited through fork
+_local = threading.local()
+
+_SETUP_ATTEMPTS = 10
+
+
+def enabled():
+    return bool(getattr(config, "HASH_CACHE_ENABLED", True))
+
+
+def transient(path):
+    """True if `path` (absolute) is under `config.TEMP_DIR`."""
+    temp_dir = getattr(config, "TEMP_DIR", None)
+    if temp_dir is None:
+        return False
+    temp_dir = os.path.abspath(str(temp_dir))
+    return path == temp_dir or path.startswith(temp_dir + os.sep)
+
+
+def file_identity(file_path):
+    """Return (abs_path, size, mtime_ns, inode) or None if not a file."""
+    try:
+        st = os.stat(file_path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (
+        os.path.abspath(str(file_path)),
+        st.st_size,
+        st.st_mtime_ns,
+        st.st_ino,
+    )
+
+
+def connect(db_path, schema):
+    """
+    Return this thread's connection to the SQLite database at `db_path`,
+    creating it (WAL mode, busy timeout, `schema` applied) on first use.
+    Shared with other on-disk caches keyed by file identity.
+    """
+    db_path = str(db_path)
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.pid != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(db_path)
+    if conn is not None:
+        return conn
+
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+    # switching a new database to WAL can fail with "database is locked"
+    # without waiting on the busy timeout while another process does the
+    # same, so retry the setup briefly
+    for attempt in range(_SETUP_ATTEMPTS):
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(schema)
+            break
+        except sqlite3.OperationalError:
+            if attempt == _SETUP_ATTEMPTS - 1:
+                conn.close()
+                raise
+            time.sleep(0.05 * (attempt + 1))
+    conns[db_path] = conn
+    return conn
+
+
+def _connect():
+    return connect(config.HASH_CACHE_PATH, _SCHEMA)
+
+
+def lookup(identity):
+    """Return the cached digest for `identity`, or None on a miss."""
+    if identity is None or not enabled() or transient(identity[0]):
+        return None
+    path, size, mtime_ns, inode = identity
+    try:
+        row = (
+            _connect()
+            .execute(
+                "SELECT digest FROM file_hashes WHERE path = ? AND size = ?"
+                " AND mtime_ns = ? AND inode = ?",
+                (path, size, mtime_ns, inode),
+            )
+            .fetchone()
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.debug("hash cache lookup failed for %s: %s", path, e)
+        return None
+    return row[0] if row else None
+
+
+def store(identity, digest):
+    """Remember `digest` for `identity` (taken before the file was read)."""
+    if identity is None or not enabled() or transient(identity[0]):
+        return
+    try:
+        _connect().execute(
+            "INSERT OR REPLACE INTO file_hashes"
+            " (path, size, mtime_ns, inode, digest) VALUES (?, ?, ?, ?, ?)",
+            (*identity, digest),
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.debug("hash cache store failed for %s: %s", identity[0], e)
+
+
+def invalidate(file_path=None):
+    """Forget one file, or every cached digest when no path is given."""
+    try:
+        conn = _connect()
+        if file_path is None:
+            conn.execute("DELETE FROM file_hashes")
+        else:
+            conn.execute(
+                "DELETE FROM file_hashes WHERE path = ?",
+                (os.path.abspath(str(file_path)),),
+            )
+    except (sqlite3.Error, OSError) as e:
+        logger.debug("hash cache invalidate failed: %s", e)
+
+
+def prune():
+    """Drop rows for files that no longer exist; returns rows removed."""
+    try:
+        conn = _connect()
+        paths = [r[0] for r in conn.execute("SELECT path FROM file_hashes")]
+        gone = [(p,) for p in paths if not os.path.exists(p)]
+        conn.executemany("DELETE FROM file_hashes WHERE path = ?", gone)
+    except (sqlite3.Error, OSError) as e:
+        logger.debug("hash cache prune failed: %s", e)
+        return 0
+    return len(gone)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the hash cache")
+    parser.add_argument(
+        "--clear", action="store_true", help="Remove every cached digest"
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Remove digests for files that no longer exist",
+    )
+    args = parser.parse_args()
+
+    if args.clear:
+        invalidate()
+        print(f"Cleared {config.HASH_CACHE_PATH}")
+    elif args.prune:
+        print(f"Pruned {prune()} stale entries from {config.HASH_CACHE_PATH}")
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
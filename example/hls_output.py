@@ -0,0 +1,199 @@
+"""Progressive HLS output: a live playlist that grows as shards arrive.
+
+With `config.VJ_OUTPUT_MODE = "hls"` the VJ writes an HLS event playlist
+instead of `final_collage.mp4`, so playback can start as soon as the
+first shards are in:
+
+    - `append(path)` queues a shard; a worker thread remuxes it into the
+      next MPEG-TS segment (video stream copy) together with the matching
+      slice of the soundtrack, then adds an #EXTINF entry to the playlist.
+      Shards are appended in the order they are queued, which the VJ
+      keeps to the ready prefix of shard ids.
+    - Segments carry continuous timestamps (`-output_ts_offset`), so the
+      playlist plays as one timeline without discontinuities.
+    - The playlist is rewritten whole and swapped in with os.replace on
+      every segment, so players polling it never see a partial file.
+    - `finish()` appends #EXT-X-ENDLIST once collection completes.
+
+A shard that fails to remux is skipped, as in incremental_composer.
+The soundtrack fades in on the first segment; the fade-out is left out
+because the last segment is not known until collection stops.
+
+Check a run locally with:
+    ffprobe -v error -show_entries format=duration <HLS_DIR>/index.m3u8
+"""
+
+import math
+import os
+import queue
+import subprocess
+import threading
+
+from contextlib import suppress
+
+import config
+import video
+from config import logger
+
+
+class HlsWriter(object):
+    """
+    writes shards as HLS segments to a live event playlist
+    """
+
+    def __init__(self, out_dir=None, playlist_name=None):
+        if out_dir is None:
+            out_dir = getattr(config, "HLS_DIR", None) or os.path.join(
+                str(config.TEMP_DIR), "hls"
+            )
+        if playlist_name is None:
+            playlist_name = getattr(
+                config, "HLS_PLAYLIST_NAME", "index.m3u8"
+            )
+        self.__out_dir = str(out_dir)
+        self.__playlist = os.path.join(self.__out_dir, playlist_name)
+        # (segment file name, duration) in playlist order
+        self.__segments = []
+        self.__skipped = []
+        self.__elapsed = 0.0
+        self.__ended = False
+        self.__queue = queue.Queue()
+        self.__worker = None
+
+    def playlist(self):
+        return self.__playlist
+
+    def segments(self):
+        """(segment file name, duration) written so far, in order."""
+        return list(self.__segments)
+
+    def skipped(self):
+        """Shards that could not be remuxed and were left out."""
+        return list(self.__skipped)
+
+    def start(self):
+        """Write an empty live playlist and start the segment worker."""
+        os.makedirs(self.__out_dir, exist_ok=True)
+        for name in os.listdir(self.__out_dir):
+            # segments of an earlier run would be served with the new ones
+            if name.startswith("segment_") and name.endswith(".ts"):
+                os.remove(os.path.join(self.__out_dir, name))
+        self.__write_playlist()
+        self.__worker = threading.Thread(
+            target=self.__run, name="hls-writer", daemon=True
+        )
+        self.__worker.start()
+        logger.info("HLS playlist -> %s", self.__playlist)
+
+    def append(self, shard_path):
+        """Queue a shard to become the segment after those queued before."""
+        self.__queue.put(str(shard_path))
+
+    def __run(self):
+        while True:
+            path = self.__queue.get()
+            if path is None:
+                return
+            self.__append_now(path)
+
+    def __append_now(self, path):
+        name = f"segment_{len(self.__segments):05d}.ts"
+        seg_path = os.path.join(self.__out_dir, name)
+        offset = float(getattr(config, "AUDIO_OFFSET_SECONDS", 78))
+        audio_filter = []
+        if not self.__segments:
+            fade_in = getattr(config, "AUDIO_FADE_IN_SECONDS", 0.2)
+            audio_filter = ["-af", f"afade=t=in:d={fade_in}"]
+        cmd = [
+            "ffmpeg",
+            "-hide_banner",
+            "-i",
+            path,
+            "-ss",
+            f"{offset + self.__elapsed:.3f}",
+            "-i",
+            str(config.SOURCE_AUDIO_FILE_PATH),
+            "-map",
+            "0:v:0",
+            "-map",
+            "1:a:0",
+            "-c:v",
+            "copy",
+            "-c:a",
+            "aac",
+            "-b:a",
+            str(getattr(config, "AUDIO_BITRATE", "192k")),
+            *audio_filter,
+            "-shortest",
+            "-output_ts_offset",
+            f"{self.__elapsed:.3f}",
+            *video.ts_service_metadata(),
+            "-f",
+            "mpegts",
+            "-y",
+            seg_path,
+        ]
+        proc = subprocess.run(cmd, capture_output=True, check=False)
+        duration = video.parse_duration(proc.stderr)
+        if proc.returncode != 0 or not duration:
+            logger.warning(
+                "Shard failed to remux to HLS, skipping %s: %s",
+                path,
+                proc.stderr.decode("utf-8", "replace").strip()[-500:],
+            )
+            with suppress(OSError):
+                os.remove(seg_path)
+            self.__skipped.append(path)
+            return
+        self.__segments.append((name, duration))
+        self.__elapsed += duration
+        self.__write_playlist()
+        logger.debug("HLS segment %s (%.2fs) from %s", name, duration, path)
+
+    def __write_playlist(self):
+        target = max([1] + [math.ceil(d) for _, d in self.__segments])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for name, duration in self.__segments:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(name)
+        if self.__ended:
+            lines.append("#EXT-X-ENDLIST")
+        tmp_path = self.__playlist + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.__playlist)
+
+    def __stop(self):
+        if self.__worker is not None:
+            self.__queue.put(None)
+            self.__worker.join()
+            self.__worker = None
+
+    def finish(self):
+        """
+        Wait for queued shards, then end the playlist. Returns the
+        playlist path, or None if no segment was written.
+        """
+        self.__stop()
+        if not self.__segments:
+            logger.error("No HLS segments written to %s", self.__out_dir)
+            return None
+        self.__ended = True
+        self.__write_playlist()
+        logger.info(
+            "HLS playlist complete: %d segments, %.2fs -> %s",
+            len(self.__segments),
+            self.__elapsed,
+            self.__playlist,
+        )
+        return self.__playlist
+
+    def abort(self):
+        """Stop after the queued shards, leaving the playlist open."""
+        self.__stop()
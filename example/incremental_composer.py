@@ -0,0 +1,236 @@
+"""Incremental composition: mux shards while they are still arriving.
+
+In batch mode the VJ waits for every shard and then runs one ffmpeg
+concat + audio job, so all of the muxing happens after the last shard
+lands. An `IncrementalComposer` instead keeps one ffmpeg process running
+for the whole collection, reading MPEG-TS on its stdin and appending it
+to an intermediate file:
+
+    - `append(path)` queues a shard; a worker thread remuxes it to
+      MPEG-TS (stream copy) and writes it to the long-running ffmpeg.
+      Shards are appended in the order they are queued.
+    - MPEG-TS can be concatenated byte for byte; ffmpeg shifts each
+      shard's timestamps past the previous one as it reads them.
+    - A shard that fails to remux is skipped, as batch mode's probe
+      pre-validation would drop it.
+    - `finish(out_path)` closes the stream, which leaves only the tail
+      of the intermediate and the audio mux (`video.soundtrack_*_args`)
+      on the critical path; with a pre-rendered track from audio_cache
+      that mux is a stream copy.
+
+Enable it with `config.VJ_COMPOSE_MODE = "incremental"`.
+"""
+
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+
+from contextlib import suppress
+
+import config
+import video
+from config import logger
+
+
+class IncrementalComposer(object):
+    """
+    appends shards to a growing MPEG-TS intermediate as they arrive
+    """
+
+    def __init__(self, work_dir=None):
+        if work_dir is None:
+            work_dir = config.TEMP_DIR
+        self.__work_dir = str(work_dir)
+        self.__proc = None
+        self.__log = None
+        self.__intermediate = None
+        self.__queue = queue.Queue()
+        self.__worker = None
+        self.__appended = []
+        self.__skipped = []
+        self.__broken = False
+
+    def intermediate(self):
+        return self.__intermediate
+
+    def appended(self):
+        """Shards written to the intermediate so far, in order."""
+        return list(self.__appended)
+
+    def skipped(self):
+        """Shards that could not be remuxed and were left out."""
+        return list(self.__skipped)
+
+    def start(self):
+        """
+        Start the long-running ffmpeg; False if it cannot be started, in
+        which case the caller should compose in batch mode instead.
+        """
+        os.makedirs(self.__work_dir, exist_ok=True)
+        fd, self.__intermediate = tempfile.mkstemp(
+            dir=self.__work_dir, prefix="incremental_", suffix=".ts"
+        )
+        os.close(fd)
+        self.__log = tempfile.TemporaryFile(dir=self.__work_dir)
+        cmd = [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-f",
+            "mpegts",
+            "-i",
+            "pipe:0",
+            "-c",
+            "copy",
+            *video.ts_service_metadata(),
+            "-f",
+            "mpegts",
+            "-y",
+            self.__intermediate,
+        ]
+        try:
+            self.__proc = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stderr=self.__log
+            )
+        except (FileNotFoundError, OSError) as e:
+            logger.error("Failed to start incremental ffmpeg: %s", e)
+            self.__cleanup()
+            return False
+        self.__worker = threading.Thread(
+            target=self.__run, name="incremental-composer", daemon=True
+        )
+        self.__worker.start()
+        return True
+
+    def append(self, shard_path):
+        """Queue a shard to be appended after those queued before it."""
+        self.__queue.put(str(shard_path))
+
+    def __run(self):
+        while True:
+            path = self.__queue.get()
+            if path is None:
+                return
+            if self.__broken:
+                self.__skipped.append(path)
+                continue
+            self.__append_now(path)
+
+    def __append_now(self, path):
+        cmd = [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-i",
+            path,
+            "-c",
+            "copy",
+            *video.ts_service_metadata(),
+            "-f",
+            "mpegts",
+            "pipe:1",
+        ]
+        # remux into memory so a shard that fails half way never leaves
+        # a partial packet stream in the intermediate
+        proc = subprocess.run(cmd, capture_output=True, check=False)
+        if proc.returncode != 0 or not proc.stdout:
+            logger.warning(
+                "Shard failed to remux, skipping %s: %s",
+                path,
+                proc.stderr.decode("utf-8", "replace").strip(),
+            )
+            self.__skipped.append(path)
+            return
+        try:
+            self.__proc.stdin.write(proc.stdout)
+            self.__proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            logger.error("incremental ffmpeg stopped reading: %s", e)
+            self.__broken = True
+            self.__skipped.append(path)
+            return
+        self.__appended.append(path)
+        logger.debug("appended %s to %s", path, self.__intermediate)
+
+    def finish(self, out_path, prepare_soundtrack=None):
+        """
+        Close the stream and mux the intermediate with the soundtrack
+        into `out_path`. `prepare_soundtrack(appended_paths)` may return
+        a pre-rendered track to copy instead of encoding the source
+        audio. Returns out_path, or None on failure.
+        """
+        self.__queue.put(None)
+        self.__worker.join()
+        with suppress(BrokenPipeError, OSError):
+            self.__proc.stdin.close()
+        returncode = self.__proc.wait()
+        if returncode != 0 or self.__broken or not self.__appended:
+            logger.error(
+                "incremental ffmpeg failed with return code %d:\n%s",
+                returncode,
+                self.__read_log(),
+            )
+            self.__cleanup()
+            return None
+
+        track = None
+        if prepare_soundtrack is not None:
+            track = prepare_soundtrack(self.appended())
+        cmd = [
+            "ffmpeg",
+            "-i",
+            self.__intermediate,
+            *video.soundtrack_input_args(track),
+            "-c:v",
+            "copy",
+            *video.soundtrack_output_args(track),
+            "-shortest",
+            "-movflags",
+            "+faststart",
+            "-y",
+            str(out_path),
+        ]
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        self.__cleanup()
+        if proc.returncode != 0:
+            logger.error(
+                "ffmpeg audio mux failed with return code %d:\n%s",
+                proc.returncode,
+                proc.stderr,
+            )
+            return None
+        logger.info(
+            "incremental composition muxed audio in %.2fs -> %s",
+            time.perf_counter() - t0,
+            out_path,
+        )
+        return str(out_path)
+
+    def abort(self):
+        """Stop without producing output."""
+        if self.__worker is not None:
+            self.__queue.put(None)
+            self.__worker.join()
+        if self.__proc is not None:
+            with suppress(OSError):
+                self.__proc.kill()
+            self.__proc.wait()
+        self.__cleanup()
+
+    def __read_log(self):
+        if self.__log is None:
+            return ""
+        self.__log.seek(0)
+        return self.__log.read().decode("utf-8", "replace")
+
+    def __cleanup(self):
+        if self.__log is not None:
+            self.__log.close()
+            self.__log = None
+        if self.__intermediate is not None:
+            with suppress(OSError):
+                os.remove(self.__intermediate)
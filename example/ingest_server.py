@@ -0,0 +1,523 @@
+"""Socket-based shard ingest, so fans can run on other hosts.
+
+The VJ runs an `IngestServer` (TCP, or AF_UNIX on one host) and fans
+send through an `IngestClient`, which streams the shard file itself with
+`socket.sendfile` instead of handing over a local temp path. Each shard
+is one frame:
+
+    header  "!4sBH16sQ": magic b"SHRD", version, sender name length,
+            16-char shake256 digest (`video.file_hash`), payload length
+    name    sender name, UTF-8
+    payload shard bytes
+
+and the server answers every frame with a one-byte ack (see `ACK_*`).
+
+    - Connections are served on their own threads, so many fans can send
+      at once.
+    - Backpressure is per connection: a handler does not ack a frame,
+      or read the next one, until the shard is in the VJ's bounded queue.
+      Meanwhile TCP flow control stalls that sender's sendfile.
+    - The payload is hashed while it is written to a temp file in
+      `config.TEMP_DIR`; a digest mismatch is rejected and the temp file
+      removed, and the fan may resend.
+    - The verified digest doubles as the content key: a shard the server
+      has already accepted is dropped and acked `ACK_DUPLICATE`.
+
+The server is a `Transport`, so the VJ drains it like any other buffer.
+The client is one too (`sends_files`), so `Fan.send_shard` works
+unchanged; `make_transport("socket")` builds a client for the configured
+address.
+"""
+
+import hashlib
+import os
+import queue
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+
+from contextlib import suppress
+
+import config
+import transport
+import video
+from config import logger
+from transport import Transport
+
+MAGIC = b"SHRD"
+VERSION = 1
+HEADER = struct.Struct("!4sBH16sQ")
+
+# frame accepted and queued for the VJ
+ACK_OK = b"K"
+# payload digest did not match the header; nothing was kept
+ACK_BAD_CHECKSUM = b"C"
+# the VJ already has all its shards; the frame was dropped
+ACK_DONE = b"D"
+# the VJ already has this content (same digest); the frame was dropped
+ACK_DUPLICATE = b"U"
+
+FAMILIES = ("tcp", "unix")
+
+
+def default_address(family=None):
+    """The configured ingest address for `family` ("tcp" or "unix")."""
+    if family is None:
+        family = getattr(config, "INGEST_FAMILY", "tcp")
+    if family == "unix":
+        return str(
+            getattr(config, "INGEST_UNIX_PATH", config.TEMP_DIR / "ingest")
+        )
+    if family == "tcp":
+        return (
+            getattr(config, "INGEST_HOST", "127.0.0.1"),
+            getattr(config, "INGEST_PORT", 50007),
+        )
+    raise ValueError(f"unknown ingest family {family!r}")
+
+
+def _recv_exact(sock, n):
+    """Read exactly `n` bytes; None on a clean EOF before the first."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:])
+        if k == 0:
+            if got == 0:
+                return None
+            raise ConnectionError("connection closed mid-frame")
+        got += k
+    return bytes(buf)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.ingest._serve_connection(self.request)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    block_on_close = False
+    request_queue_size = getattr(config, "INGEST_BACKLOG", 1024)
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        block_on_close = False
+        request_queue_size = getattr(config, "INGEST_BACKLOG", 1024)
+
+else:  # pragma: no cover - no AF_UNIX on this platform
+    _UnixServer = None
+
+
+class IngestServer(Transport):
+    """
+    VJ-side ingest server; a Transport the VJ reads shards from
+    """
+
+    dedups = True
+
+    def __init__(
+        self, address=None, family=None, capacity=None, tmp_dir=None
+    ):
+        super().__init__()
+        if family is None:
+            family = getattr(config, "INGEST_FAMILY", "tcp")
+        if family not in FAMILIES:
+            raise ValueError(f"unknown ingest family {family!r}")
+        if address is None:
+            address = default_address(family)
+        if capacity is None:
+            capacity = getattr(
+                config, "INGEST_QUEUE_SIZE", config.SHARED_BUFFER_SIZE
+            )
+        if tmp_dir is None:
+            tmp_dir = config.TEMP_DIR
+        self.__family = family
+        self.__tmp_dir = str(tmp_dir)
+        self.__chunk_size = getattr(config, "HASH_CHUNK_SIZE", 1024 * 1024)
+        self.__queue = queue.Queue(maxsize=max(1, int(capacity)))
+        self.__closing = threading.Event()
+        self.__lock = threading.Lock()
+        self.__connections = set()
+        # digests of every shard accepted so far
+        self.__digests = set()
+        self.__stats = {
+            "connections": 0,
+            "frames": 0,
+            "bytes": 0,
+            "checksum_failures": 0,
+            "dropped": 0,
+            "duplicate_shards": 0,
+            "duplicate_bytes": 0,
+        }
+        os.makedirs(self.__tmp_dir, exist_ok=True)
+        if family == "unix":
+            if _UnixServer is None:
+                raise OSError("AF_UNIX sockets are not available")
+            # a stale socket file from an earlier run blocks bind()
+            with suppress(FileNotFoundError):
+                os.remove(address)
+            self.__server = _UnixServer(address, _Handler)
+        else:
+            self.__server = _TCPServer(tuple(address), _Handler)
+        self.__server.ingest = self
+        self.__thread = None
+
+    def family(self):
+        return self.__family
+
+    def address(self):
+        """The bound address (the real port when 0 was requested)."""
+        return self.__server.server_address
+
+    def start(self):
+        """Accept connections on a background thread."""
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever,
+            kwargs={"poll_interval": 0.1},
+            name="ingest-server",
+            daemon=True,
+        )
+        self.__thread.start()
+        return self
+
+    def stats(self):
+        with self.__lock:
+            return dict(self.__stats)
+
+    def __count(self, key, n=1):
+        with self.__lock:
+            self.__stats[key] += n
+
+    # -- Transport, VJ side --
+
+    def put_shard(self, sender_name, payload, timeout=5.0):
+        """Queue a received shard's temp path for the VJ."""
+        try:
+            self.__queue.put((sender_name, payload), timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def get_shard(self, timeout=0.1):
+        try:
+            if not timeout or timeout <= 0:
+                return self.__queue.get_nowait()
+            return self.__queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self.__queue.qsize()
+
+    def close(self):
+        """Stop accepting, drop open connections and any unread shards."""
+        self.__closing.set()
+        if self.__thread is not None:
+            self.__server.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.__server.server_close()
+        with self.__lock:
+            connections = list(self.__connections)
+        for conn in connections:
+            with suppress(OSError):
+                conn.shutdown(socket.SHUT_RDWR)
+        if self.__family == "unix":
+            with suppress(OSError):
+                os.remove(self.__server.server_address)
+        while True:
+            item = self.get_shard(timeout=0)
+            if item is None:
+                break
+            with suppress(OSError):
+                os.remove(item[1])
+
+    # -- connection handling --
+
+    def _serve_connection(self, conn):
+        with self.__lock:
+            self.__connections.add(conn)
+            self.__stats["connections"] += 1
+        try:
+            while not self.__closing.is_set():
+                if not self.__serve_frame(conn):
+                    break
+        except (ConnectionError, OSError, ValueError) as e:
+            if not self.__closing.is_set():
+                logger.warning("ingest connection dropped: %s", e)
+        finally:
+            with self.__lock:
+                self.__connections.discard(conn)
+
+    def __serve_frame(self, conn):
+        """Receive, verify and queue one frame; False on clean EOF."""
+        header = _recv_exact(conn, HEADER.size)
+        if header is None:
+            return False
+        magic, version, name_len, digest, size = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"bad frame header {magic!r} v{version}")
+        name = (_recv_exact(conn, name_len) or b"").decode("utf-8")
+
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.__tmp_dir, prefix="ingest_", suffix=".mp4"
+        )
+        try:
+            with os.fdopen(fd, "wb") as out:
+                actual = self.__receive_payload(conn, out, size)
+        except BaseException:
+            with suppress(OSError):
+                os.remove(tmp_name)
+            raise
+        self.__count("frames")
+        self.__count("bytes", size)
+
+        if actual != digest.decode("ascii", "replace"):
+            logger.warning(
+                "ingest: checksum mismatch from %s (%s != %s)",
+                name,
+                actual,
+                digest,
+            )
+            self.__count("checksum_failures")
+            os.remove(tmp_name)
+            conn.sendall(ACK_BAD_CHECKSUM)
+            return True
+
+        with self.__lock:
+            duplicate = actual in self.__digests
+            if duplicate:
+                self.__stats["duplicate_shards"] += 1
+                self.__stats["duplicate_bytes"] += size
+            else:
+                self.__digests.add(actual)
+        if duplicate:
+            # the VJ never sees this frame, so its credit is returned here
+            if self.credits is not None:
+                self.credits.consumed(1)
+            logger.info("ingest: dropped duplicate %s from %s", actual, name)
+            os.remove(tmp_name)
+            conn.sendall(ACK_DUPLICATE)
+            return True
+
+        # hold the ack until the VJ has room: this is the backpressure
+        # the sender sees
+        while not self.put_shard(name, tmp_name, timeout=0.2):
+            if self.all_shards_collected() or self.__closing.is_set():
+                self.__count("dropped")
+                os.remove(tmp_name)
+                conn.sendall(ACK_DONE)
+                return True
+        conn.sendall(ACK_OK)
+        return True
+
+    def __receive_payload(self, conn, out, size):
+        """Stream `size` bytes to `out`, returning their digest."""
+        m = hashlib.shake_256()
+        buf = bytearray(min(self.__chunk_size, max(1, size)))
+        view = memoryview(buf)
+        remaining = size
+        while remaining:
+            n = conn.recv_into(view[: min(remaining, len(buf))])
+            if n == 0:
+                raise ConnectionError("connection closed mid-frame")
+            chunk = view[:n]
+            out.write(chunk)
+            video.shake256_update(m, bytes(chunk))
+            remaining -= n
+        return m.hexdigest(8)
+
+
+class IngestClient(Transport):
+    """
+    fan-side sender for an IngestServer
+    """
+
+    # put_shard takes the shard file itself (or bytes), not a temp copy
+    sends_files = True
+
+    def __init__(self, address=None, family=None, connect_timeout=None):
+        super().__init__()
+        if family is None:
+            family = getattr(config, "INGEST_FAMILY", "tcp")
+        if family not in FAMILIES:
+            raise ValueError(f"unknown ingest family {family!r}")
+        if address is None:
+            address = default_address(family)
+        if connect_timeout is None:
+            connect_timeout = getattr(config, "INGEST_CONNECT_TIMEOUT", 30.0)
+        self.__family = family
+        self.__address = address
+        self.__connect_timeout = connect_timeout
+        self.__sock = None
+        # a frame was sent but its ack did not arrive in time
+        self.__awaiting_ack = False
+        # sender tag -> ACK_NEW / ACK_DUPLICATE from the server's acks
+        self.__statuses = {}
+        # sender tag of the last frame sent in full and not refused
+        self.__handed_over = None
+
+    def __getstate__(self):
+        # each process opens its own connection
+        state = self.__dict__.copy()
+        state["_IngestClient__sock"] = None
+        return state
+
+    def serve(self):
+        """
+        Start the matching server in the VJ process: an IngestServer, or
+        an async_ingest.AsyncIngestServer when `config.VJ_INGEST_MODE`
+        is "asyncio".
+        """
+        if getattr(config, "VJ_INGEST_MODE", "threads") == "asyncio":
+            # imported here since async_ingest imports this module
+            from async_ingest import AsyncIngestServer
+
+            server = AsyncIngestServer(self.__address, self.__family)
+        else:
+            server = IngestServer(self.__address, self.__family)
+        server.credits = self.credits
+        return server.start()
+
+    def __connect(self):
+        if self.__sock is not None:
+            return self.__sock
+        # the VJ may still be starting its server
+        deadline = time.monotonic() + self.__connect_timeout
+        while True:
+            if self.__family == "unix":
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            else:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.connect(
+                    self.__address
+                    if self.__family == "unix"
+                    else tuple(self.__address)
+                )
+            except OSError:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+                continue
+            self.__sock = sock
+            return sock
+
+    def put_shard(self, sender_name, payload, timeout=5.0):
+        """
+        Send one shard, a file path or bytes, and wait up to `timeout`
+        seconds for the server's ack. True once the VJ has it, as a new
+        shard or a duplicate (see `delivery_status`).
+
+        A shard that was sent but not acked in time is still pending on
+        the server; the next call waits for that ack instead of sending
+        again, so callers should retry with the same shard (as `Fan`
+        does).
+        """
+        if self.all_shards_collected():
+            return False
+        if self.__awaiting_ack:
+            return self.__wait_ack(sender_name, timeout)
+        name = sender_name.encode("utf-8")
+        try:
+            sock = self.__connect()
+            sock.settimeout(timeout)
+            if isinstance(payload, (bytes, bytearray)):
+                m = hashlib.shake_256()
+                video.shake256_update(m, bytes(payload))
+                header = HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    len(name),
+                    m.hexdigest(8).encode("ascii"),
+                    len(payload),
+                )
+                sock.sendall(header + name + payload)
+            else:
+                with open(str(payload), "rb") as fh:
+                    size = os.fstat(fh.fileno()).st_size
+                    digest = video.file_hash(str(payload))
+                    header = HEADER.pack(
+                        MAGIC,
+                        VERSION,
+                        len(name),
+                        digest.encode("ascii"),
+                        size,
+                    )
+                    sock.sendall(header + name)
+                    sock.sendfile(fh)
+        except socket.timeout:
+            # the frame may be half sent; start over on a new connection
+            logger.debug("ingest: send stalled for %.1fs", timeout)
+            self.close()
+            return False
+        except OSError as e:
+            logger.warning("ingest: send to %s failed: %s", self.__address, e)
+            self.close()
+            return False
+        self.__awaiting_ack = True
+        self.__handed_over = sender_name
+        return self.__wait_ack(sender_name, timeout)
+
+    def __wait_ack(self, sender_name, timeout):
+        try:
+            self.__sock.settimeout(timeout)
+            ack = _recv_exact(self.__sock, 1)
+        except socket.timeout:
+            # the server is holding the ack until the VJ has room
+            logger.debug("ingest: no ack within %.1fs", timeout)
+            return False
+        except OSError as e:
+            logger.warning(
+                "ingest: lost connection to %s: %s", self.__address, e
+            )
+            self.close()
+            return False
+        self.__awaiting_ack = False
+        if ack == ACK_OK:
+            self.__statuses[sender_name] = transport.ACK_NEW
+            return True
+        if ack == ACK_DUPLICATE:
+            self.__statuses[sender_name] = transport.ACK_DUPLICATE
+            return True
+        self.__handed_over = None
+        if ack == ACK_DONE:
+            self._all_collected.set()
+        elif ack == ACK_BAD_CHECKSUM:
+            logger.warning("ingest: server rejected shard checksum")
+        else:
+            self.close()
+        return False
+
+    def delivery_status(self, sender_name, timeout=0.0):
+        # the server's ack already said whether the shard was new
+        return self.__statuses.pop(sender_name, None)
+
+    def handed_over(self, sender_name):
+        """
+        True if the frame sent as `sender_name` reached the server and
+        was not refused, even if its ack has not arrived: the server
+        queues it for the VJ, which consumes its credit.
+        """
+        return sender_name is not None and sender_name == self.__handed_over
+
+    def qsize(self):
+        # the queue lives in the VJ process
+        return 0
+
+    def close(self):
+        if self.__sock is not None:
+            with suppress(OSError):
+                self.__sock.close()
+            self.__sock = None
+        self.__awaiting_ack = False
@@ -0,0 +1,165 @@
+"""Keyframe index for source videos.
+
+Stream-copy cuts can only start on keyframes, so shard boundaries that
+ignore them drift. The keyframe timestamps of a video are extracted once
+with an ffprobe packet scan and stored in a JSON sidecar next to the
+video (`<video>.keyframes.json`), keyed by file identity (size, mtime_ns,
+inode). Later lookups snap times with a binary search instead of probing
+the media again.
+
+Key behaviors:
+    - `load()` reuses the sidecar when the identity matches, otherwise
+      rescans and rewrites it; results are also memoized per process.
+    - `KeyframeIndex.snap()` moves a time to the nearest keyframe (or the
+      one at/before, or at/after it).
+    - `KeyframeIndex.plan()` spreads N shard boundaries evenly and snaps
+      them, for the segmenter and `video.create_shard`.
+"""
+
+import bisect
+import json
+import os
+import subprocess
+
+from config import logger
+
+SIDECAR_SUFFIX = ".keyframes.json"
+
+# per-process memo: abs path -> (identity, KeyframeIndex)
+_loaded = {}
+
+
+class KeyframeIndex(object):
+    """
+    sorted keyframe timestamps of one video
+    """
+
+    def __init__(self, times):
+        self.__times = sorted(float(t) for t in times)
+
+    def __len__(self):
+        return len(self.__times)
+
+    def times(self):
+        return list(self.__times)
+
+    def snap(self, t, mode="nearest"):
+        """
+        Return the keyframe time nearest to `t` ("nearest"), the last one
+        at or before it ("before") or the first one at or after it
+        ("after"). Times outside the index clamp to its ends.
+        """
+        times = self.__times
+        if not times:
+            return t
+        i = bisect.bisect_left(times, t)
+        if i < len(times) and times[i] == t:
+            return t
+        before = times[i - 1] if i > 0 else times[0]
+        after = times[i] if i < len(times) else times[-1]
+        if mode == "before":
+            return before
+        if mode == "after":
+            return after
+        return before if t - before <= after - t else after
+
+    def snap_range(self, start, end):
+        """
+        Snap a [start, end) range to keyframes. An end past the last
+        keyframe is kept, since the tail of a video needs no cut point.
+        """
+        times = self.__times
+        if times and end <= times[-1]:
+            end = self.snap(end)
+        return self.snap(start), end
+
+    def plan(self, num_shards, duration):
+        """
+        Split [0, duration] into up to `num_shards` ranges whose inner
+        boundaries sit on keyframes. Returns a list of (start, end).
+        """
+        bounds = [0.0]
+        for k in range(1, num_shards):
+            b = self.snap(duration * k / num_shards)
+            # boundaries that snap onto the same keyframe collapse
+            if bounds[-1] < b < duration:
+                bounds.append(b)
+        bounds.append(float(duration))
+        return list(zip(bounds[:-1], bounds[1:]))
+
+
+def sidecar_path(video_file_path):
+    return str(video_file_path) + SIDECAR_SUFFIX
+
+
+def _identity(video_file_path):
+    st = os.stat(video_file_path)
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+def scan(video_file_path):
+    """Return the keyframe times of the first video stream via ffprobe."""
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=print_section=0",
+        str(video_file_path),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {proc.stderr}")
+    times = []
+    for line in proc.stdout.splitlines():
+        fields = line.strip().split(",")
+        if len(fields) < 2 or not fields[1].startswith("K"):
+            continue
+        try:
+            times.append(float(fields[0]))
+        except ValueError:
+            # packets without a pts report "N/A"
+            continue
+    return times
+
+
+def load(video_file_path, rebuild=False):
+    """
+    Return the KeyframeIndex for a video, from memory, the sidecar, or a
+    fresh scan (in that order). `rebuild` forces a rescan.
+    """
+    key = os.path.abspath(str(video_file_path))
+    identity = _identity(video_file_path)
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == identity and not rebuild:
+        return cached[1]
+
+    side = sidecar_path(video_file_path)
+    times = None
+    if not rebuild:
+        try:
+            with open(side, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("identity") == identity:
+                times = data.get("keyframes")
+        except (OSError, ValueError, AttributeError):
+            times = None
+
+    if times is None:
+        logger.info("scanning keyframes of %s", video_file_path)
+        times = scan(video_file_path)
+        try:
+            tmp = side + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"identity": identity, "keyframes": times}, fh)
+            os.replace(tmp, side)
+        except OSError as e:
+            logger.warning("Unable to write keyframe index %s: %s", side, e)
+
+    index = KeyframeIndex(times)
+    _loaded[key] = (identity, index)
+    return index
@@ -11,6 +11,7 @@ import fan
 import shared_buffer as sb
 import video_jockey
 import video
+from shard_coverage import CoverageMap
 
 
 def main():
@@ -26,6 +27,9 @@ def main():
     # create the shared buffer which is a buffer of (lock, shard_id, byte_data)
     shared_buffer = sb.SharedBuffer(manager)
     # logger.debug(f'shared_buffer={shared_buffer}')
+    # these fans pick shard ids themselves: steer them to missing ones
+    if getattr(config, "COVERAGE_SELECTION_ENABLED", False):
+        shared_buffer.coverage = CoverageMap()
 
     # create the vj
     vj = video_jockey.VideoJockey()
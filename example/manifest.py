@@ -0,0 +1,204 @@
+"""Shard manifest (`config.SHARDS_JSON_FILE_PATH`) writer and indexed
+loader.
+
+The manifest is a JSON list of shard records with the same keys as
+`Shard.__str__`: id, start, end, file_path and hash. Paths inside the
+manifest's directory are stored relative to it so the shard directory
+can be moved as a whole.
+
+Key behaviors:
+    - `ManifestWriter` upserts one record per shard as it is created and
+      rewrites the file atomically after each change.
+    - `ShardIndex` holds lazy `Shard` objects with O(1) lookup by id and
+      bisect-based lookup of the shard covering time t or the shards
+      overlapping [t0, t1).
+    - `default_index()` caches the loaded index per process and reloads
+      it when the manifest changes on disk.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+
+import config
+from config import logger
+from shard import Shard
+
+
+def _manifest_path(path):
+    return str(config.SHARDS_JSON_FILE_PATH if path is None else path)
+
+
+class ManifestWriter(object):
+    """
+    records shards in the manifest as they are created
+    """
+
+    def __init__(self, path=None, autoflush=True, fresh=False):
+        self.__path = _manifest_path(path)
+        self.__base_dir = os.path.dirname(os.path.abspath(self.__path))
+        self.__autoflush = autoflush
+        # start from the existing records so re-runs update in place,
+        # unless the caller is regenerating the whole shard set
+        records = [] if fresh else read_records(self.__path)
+        self.__records = {r["id"]: r for r in records}
+
+    def path(self):
+        return self.__path
+
+    def records(self):
+        return [self.__records[k] for k in sorted(self.__records)]
+
+    def add(self, id, start, end, file_path, hash):
+        file_path = os.path.abspath(str(file_path))
+        if os.path.dirname(file_path) == self.__base_dir:
+            file_path = os.path.basename(file_path)
+        record = {
+            "id": id,
+            "start": start,
+            "end": end,
+            "file_path": file_path,
+            "hash": hash,
+        }
+        self.__records[id] = record
+        if self.__autoflush:
+            self.flush()
+        return record
+
+    def add_shard(self, shard):
+        self.add(
+            shard.id(),
+            shard.start(),
+            shard.end(),
+            shard.file_path(),
+            shard.hash(),
+        )
+
+    def flush(self):
+        """Atomically replace the manifest with the current records."""
+        os.makedirs(self.__base_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.__base_dir, prefix=".shards_", suffix=".json"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(self.records(), fh, indent=4)
+            os.replace(tmp_path, self.__path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+def read_records(path=None):
+    """Return the raw manifest records, or [] if there is no manifest."""
+    path = _manifest_path(path)
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            records = json.load(fh)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        logger.warning("Unable to read manifest %s: %s", path, e)
+        return []
+    if not isinstance(records, list):
+        logger.warning("Ignoring malformed manifest %s", path)
+        return []
+    return records
+
+
+class ShardIndex(object):
+    """
+    in-memory indexes over the shards of a manifest
+    """
+
+    def __init__(self, shards):
+        self.__by_id = {s.id(): s for s in shards}
+        self.__ordered = sorted(
+            self.__by_id.values(), key=lambda s: (s.start(), s.id())
+        )
+        self.__starts = [s.start() for s in self.__ordered]
+        # running maximum of end times; lets overlapping() bisect even
+        # when shards overlap and ends are not sorted
+        self.__max_ends = []
+        max_end = float("-inf")
+        for s in self.__ordered:
+            max_end = max(max_end, s.end())
+            self.__max_ends.append(max_end)
+
+    def __len__(self):
+        return len(self.__by_id)
+
+    def __iter__(self):
+        return iter(self.__ordered)
+
+    def __contains__(self, id):
+        return id in self.__by_id
+
+    def ids(self):
+        return sorted(self.__by_id)
+
+    def get(self, id):
+        return self.__by_id.get(id)
+
+    def covering(self, t):
+        """Return the shard with start <= t < end, or None."""
+        i = bisect.bisect_right(self.__starts, t)
+        # walk back from the latest start; stop once no earlier shard can
+        # still reach t
+        for j in range(i - 1, -1, -1):
+            s = self.__ordered[j]
+            if t < s.end():
+                return s
+            if j == 0 or self.__max_ends[j - 1] <= t:
+                break
+        return None
+
+    def overlapping(self, t0, t1):
+        """Return shards intersecting [t0, t1), ordered by start."""
+        lo = bisect.bisect_right(self.__max_ends, t0)
+        hi = bisect.bisect_left(self.__starts, t1)
+        return [s for s in self.__ordered[lo:hi] if s.end() > t0]
+
+
+def load_index(path=None, lazy=True):
+    """
+    Build a ShardIndex from the manifest; shards are lazy by default so
+    nothing is hashed until a shard's file is used.
+    """
+    path = _manifest_path(path)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    shards = []
+    for r in read_records(path):
+        file_path = r["file_path"]
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(base_dir, file_path)
+        shards.append(
+            Shard(r["id"], r["start"], r["end"], file_path, r["hash"], lazy)
+        )
+    return ShardIndex(shards)
+
+
+# per-process cache for default_index(): (path, stat key, index)
+_cached = None
+
+
+def default_index():
+    """
+    Return the index for `config.SHARDS_JSON_FILE_PATH`, or None if the
+    manifest does not exist. Reloaded when the file changes.
+    """
+    global _cached
+    path = _manifest_path(None)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    # the writer replaces the file, so the inode changes on every flush
+    key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    if _cached is None or _cached[:2] != (path, key):
+        _cached = (path, key, load_index(path))
+    return _cached[2]
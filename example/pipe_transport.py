@@ -0,0 +1,180 @@
+"""
+PipeTransport: one `multiprocessing.Pipe` per fan instead of a single
+Manager-hosted queue.
+
+Each channel is a one-way pipe from a fan to the VJ. The VJ multiplexes
+all of them with `multiprocessing.connection.wait`, so fans never contend
+on a shared server process and the VJ can see how much arrived on each
+channel. Backpressure is per channel: a semaphore bounds the entries in
+flight on a pipe to `config.PIPE_CHANNEL_CAPACITY`.
+
+API (the transport.Transport contract):
+    - bind(fan_id): a view of the transport whose puts use that fan's
+      channel (unbound puts pick a channel from the process id)
+    - put_shard(sender_name, file_path, timeout)
+    - get_shard(timeout) / get_many(max_items, timeout)
+    - qsize(), channel_counts()
+    - register_failed_temp(path) / get_and_clear_failed_temps()
+    - done signal and put_many: see transport.Transport
+"""
+
+import copy
+import multiprocessing
+import os
+import queue
+
+from multiprocessing import connection
+
+import config
+from config import logger
+from transport import Transport
+
+
+class PipeTransport(Transport):
+    """
+    per-fan pipes multiplexed by the VJ
+    """
+
+    def __init__(self, num_channels=None, capacity=None):
+        super().__init__()
+        if num_channels is None:
+            num_channels = getattr(config, "NUM_FANS", 4)
+        if capacity is None:
+            capacity = getattr(
+                config, "PIPE_CHANNEL_CAPACITY", config.SHARED_BUFFER_SIZE
+            )
+        num_channels = max(1, int(num_channels))
+        self.__readers = []
+        self.__writers = []
+        self.__slots = []
+        self.__send_locks = []
+        for _ in range(num_channels):
+            reader, writer = multiprocessing.Pipe(duplex=False)
+            self.__readers.append(reader)
+            self.__writers.append(writer)
+            self.__slots.append(multiprocessing.Semaphore(capacity))
+            # fans sharing a channel must not interleave their sends
+            self.__send_locks.append(multiprocessing.Lock())
+        self.__bound = None
+        # VJ side: channels still open, next channel to serve first,
+        # entries seen per channel
+        self.__open = list(self.__readers)
+        self.__next = 0
+        self.__counts = [0] * num_channels
+
+        self.__queued = multiprocessing.Value("i", 0)
+        # flag set by VideoJockey when it has collected all shards
+        self.vj_has_all_shards = multiprocessing.Value("b", False)
+        self.__failed_temps = multiprocessing.Queue()
+
+    def num_channels(self):
+        return len(self.__writers)
+
+    def bind(self, fan_id):
+        """Return a view of this transport that sends on fan_id's
+        channel."""
+        view = copy.copy(self)
+        view.__bound = fan_id % self.num_channels()
+        return view
+
+    def __channel(self):
+        if self.__bound is not None:
+            return self.__bound
+        return os.getpid() % self.num_channels()
+
+    def put_shard(self, sender_name, file_path, timeout=5.0):
+        """Send one entry on this fan's channel. Returns True on success,
+        False if the channel stays full for `timeout` seconds."""
+        ch = self.__channel()
+        if not self.__slots[ch].acquire(timeout=timeout):
+            return False
+        try:
+            with self.__send_locks[ch]:
+                self.__writers[ch].send((sender_name, file_path))
+        except (OSError, EOFError, ValueError) as e:
+            logger.debug("pipe send on channel %d failed: %s", ch, e)
+            self.__slots[ch].release()
+            return False
+        with self.__queued.get_lock():
+            self.__queued.value += 1
+        return True
+
+    def __receive(self, reader):
+        ch = self.__readers.index(reader)
+        item = reader.recv()
+        self.__slots[ch].release()
+        self.__counts[ch] += 1
+        with self.__queued.get_lock():
+            self.__queued.value -= 1
+        return item
+
+    def __ready(self, timeout):
+        """Readable channels, rotated so no fan is always served last."""
+        ready = connection.wait(self.__open, timeout)
+        n = len(self.__readers)
+        order = {
+            r: (i - self.__next) % n for i, r in enumerate(self.__readers)
+        }
+        ready.sort(key=order.get)
+        self.__next = (self.__next + 1) % n
+        return ready
+
+    def get_shard(self, timeout=0.1):
+        """Receive one entry from whichever channel is ready first.
+
+        Returns (sender_name, file_path) or None on timeout.
+        """
+        items = self.get_many(1, timeout=timeout)
+        return items[0] if items else None
+
+    def get_many(self, max_items, timeout=0.1):
+        """Receive up to `max_items` entries, waiting up to `timeout` for
+        the first one. A channel whose writer has closed is dropped."""
+        items = []
+        wait = timeout
+        while len(items) < max_items:
+            try:
+                ready = self.__ready(wait)
+            except OSError as e:
+                logger.debug("pipe wait failed: %s", e)
+                break
+            if not ready:
+                break
+            for reader in ready:
+                if len(items) >= max_items:
+                    break
+                try:
+                    items.append(self.__receive(reader))
+                except (EOFError, OSError) as e:
+                    # a closed channel stays readable; stop waiting on it
+                    logger.debug("pipe receive failed, closing: %s", e)
+                    self.__open.remove(reader)
+            # only the first wait blocks
+            wait = 0
+        return items
+
+    def qsize(self):
+        return self.__queued.value
+
+    def channel_counts(self):
+        """Entries received so far per channel (VJ process view)."""
+        return list(self.__counts)
+
+    def register_failed_temp(self, temp_path):
+        """Producers call this to register a temp file that couldn't
+        be enqueued; the cleanup worker removes it later."""
+        try:
+            self.__failed_temps.put(temp_path)
+        except (ValueError, OSError) as e:
+            logger.debug("register_failed_temp failed: %s", e)
+
+    def get_and_clear_failed_temps(self):
+        paths = []
+        while True:
+            try:
+                path = self.__failed_temps.get_nowait()
+            except (queue.Empty, ValueError, OSError):
+                break
+            if path not in paths:
+                paths.append(path)
+        return paths
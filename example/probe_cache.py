@@ -0,0 +1,159 @@
+"""Memoized ffprobe results.
+
+`video.probe_info` goes through this cache so repeated probes of the same
+file (e.g. `video.dimensions` after `video.probe`, or validating hundreds
+of shards) do not each spawn an ffprobe process.
+
+Key behaviors:
+    - An in-process LRU (`config.PROBE_CACHE_SIZE` entries) in front of an
+      optional SQLite layer (`config.PROBE_CACHE_PATH`) shared between
+      processes.
+    - Entries are keyed by file identity (path, size, mtime_ns, inode);
+      a changed file misses and its stale entry is replaced.
+    - Files under `config.TEMP_DIR` (received shards, intermediates) are
+      only kept in the LRU: they are deleted after the run, so rows for
+      them would just accumulate in the database.
+    - Only successful probes are cached; errors always propagate.
+    - `stats()` exposes hit/miss counters for this process.
+"""
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import config
+import hash_cache
+from config import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probe_info (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    info TEXT NOT NULL
+)
+"""
+
+
+class ProbeCache(object):
+    """
+    LRU of ffprobe results with an optional persistent layer
+    """
+
+    def __init__(self, maxsize=None):
+        if maxsize is None:
+            maxsize = getattr(config, "PROBE_CACHE_SIZE", 1024)
+        self.__maxsize = maxsize
+        # abs path -> (identity, info), most recently used last
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["size"] = len(self.__entries)
+        return stats
+
+    def get(self, file_path, loader):
+        """
+        Return the probe info for `file_path`, calling `loader(file_path)`
+        on a miss and caching its result.
+        """
+        identity = hash_cache.file_identity(file_path)
+        if identity is None:
+            # not a regular file we can key on; never cached
+            return loader(file_path)
+
+        with self.__lock:
+            entry = self.__entries.get(identity[0])
+            if entry is not None and entry[0] == identity:
+                self.__entries.move_to_end(identity[0])
+                self.__stats["hits"] += 1
+                return entry[1]
+
+        persist = self.__persist() and not hash_cache.transient(identity[0])
+        info = self.__disk_lookup(identity) if persist else None
+        if info is not None:
+            with self.__lock:
+                self.__stats["disk_hits"] += 1
+        else:
+            info = loader(file_path)
+            with self.__lock:
+                self.__stats["misses"] += 1
+            if persist:
+                self.__disk_store(identity, info)
+
+        self.__remember(identity, info)
+        return info
+
+    def invalidate(self, file_path=None):
+        """Forget one file, or everything when no path is given."""
+        with self.__lock:
+            if file_path is None:
+                self.__entries.clear()
+            else:
+                identity = hash_cache.file_identity(file_path)
+                if identity is not None:
+                    self.__entries.pop(identity[0], None)
+        if not self.__persist():
+            return
+        try:
+            conn = self.__connect()
+            if file_path is None:
+                conn.execute("DELETE FROM probe_info")
+            elif identity is not None:
+                conn.execute(
+                    "DELETE FROM probe_info WHERE path = ?", (identity[0],)
+                )
+        except (sqlite3.Error, OSError) as e:
+            logger.debug("probe cache invalidate failed: %s", e)
+
+    def __remember(self, identity, info):
+        with self.__lock:
+            self.__entries[identity[0]] = (identity, info)
+            self.__entries.move_to_end(identity[0])
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+
+    def __persist(self):
+        return bool(getattr(config, "PROBE_CACHE_PERSIST", True))
+
+    def __connect(self):
+        return hash_cache.connect(config.PROBE_CACHE_PATH, _SCHEMA)
+
+    def __disk_lookup(self, identity):
+        if not self.__persist():
+            return None
+        try:
+            row = (
+                self.__connect()
+                .execute(
+                    "SELECT info FROM probe_info WHERE path = ? AND size = ?"
+                    " AND mtime_ns = ? AND inode = ?",
+                    identity,
+                )
+                .fetchone()
+            )
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logger.debug("probe cache lookup failed: %s", e)
+            return None
+
+    def __disk_store(self, identity, info):
+        if not self.__persist():
+            return
+        try:
+            self.__connect().execute(
+                "INSERT OR REPLACE INTO probe_info"
+                " (path, size, mtime_ns, inode, info) VALUES (?, ?, ?, ?, ?)",
+                (*identity, json.dumps(info)),
+            )
+        except (sqlite3.Error, OSError, TypeError) as e:
+            logger.debug("probe cache store failed: %s", e)
+
+
+# shared per-process cache used by video.probe_info
+DEFAULT = ProbeCache()
@@ -0,0 +1,107 @@
+"""Ordered reassembly of shards that arrive out of order.
+
+Fans deliver shards in whatever order scheduling produces, but the collage
+is meant to follow the source: shard 0 first, then shard 1, and so on. A
+`ReorderBuffer` keeps received shards keyed by shard id, with a fixed-size
+bitmap of the ids seen so far, and tracks the contiguous prefix 0..k-1
+that is complete:
+
+    - `add(shard_id, item)` stores a shard; repeats are ignored.
+    - `pop_ready()` hands out the shards that joined the ready prefix since
+      the last call, in id order, so a downstream stage (the incremental
+      composer) can start on them while later ids are still missing;
+      `drain()` hands out everything left once collection stops.
+    - `gaps()` lists the ids missing below the highest id received, i.e.
+      what the prefix is waiting for; `missing()` lists every missing id.
+
+Unlike `shard_coverage.CoverageMap` this is private to the VJ process, so
+the bitmap is a plain bytearray.
+"""
+
+
+class ReorderBuffer(object):
+    """
+    shards keyed by shard id with a received-id bitmap and a ready prefix
+    """
+
+    def __init__(self, num_shards):
+        self.__size = int(num_shards)
+        self.__bits = bytearray((self.__size + 7) // 8)
+        self.__items = {}
+        # ids below __ready are all received; ids below __popped have
+        # been handed out by pop_ready
+        self.__ready = 0
+        self.__popped = 0
+        self.__highest = -1
+
+    def size(self):
+        return self.__size
+
+    def has(self, shard_id):
+        if not 0 <= shard_id < self.__size:
+            return False
+        byte, bit = divmod(shard_id, 8)
+        return bool(self.__bits[byte] & (1 << bit))
+
+    def add(self, shard_id, item):
+        """Store `item` as shard `shard_id`; False if already received."""
+        if not 0 <= shard_id < self.__size:
+            raise IndexError(f"shard id {shard_id} out of range")
+        if self.has(shard_id):
+            return False
+        byte, bit = divmod(shard_id, 8)
+        self.__bits[byte] |= 1 << bit
+        self.__items[shard_id] = item
+        self.__highest = max(self.__highest, shard_id)
+        while self.__ready < self.__size and self.has(self.__ready):
+            self.__ready += 1
+        return True
+
+    def count(self):
+        return len(self.__items)
+
+    def complete(self):
+        return self.__ready >= self.__size
+
+    def ready_count(self):
+        """Length of the contiguous prefix of received ids."""
+        return self.__ready
+
+    def ready(self):
+        """Items of the contiguous prefix, in id order."""
+        return [self.__items[i] for i in range(self.__ready)]
+
+    def pop_ready(self):
+        """Items that joined the ready prefix since the last call."""
+        start = self.__popped
+        self.__popped = max(start, self.__ready)
+        return [self.__items[i] for i in range(start, self.__ready)]
+
+    def drain(self):
+        """
+        Every received item not handed out by pop_ready yet, in id order,
+        gaps skipped. Nothing is handed out after this.
+        """
+        rest = [
+            self.__items[i]
+            for i in sorted(self.__items)
+            if i >= self.__popped
+        ]
+        self.__popped = self.__size
+        return rest
+
+    def gaps(self):
+        """Missing ids between the ready prefix and the highest received."""
+        return [
+            i
+            for i in range(self.__ready, self.__highest + 1)
+            if not self.has(i)
+        ]
+
+    def missing(self):
+        """Every id not received yet, in order."""
+        return [i for i in range(self.__ready, self.__size) if not self.has(i)]
+
+    def items(self):
+        """All received items in id order, gaps skipped."""
+        return [self.__items[i] for i in sorted(self.__items)]
@@ -2,7 +2,8 @@
 and the video jockey.
 
 Primary responsibilities:
-    - Randomly select shard files from `config.SHARDS_DIR`.
+    - Randomly select shards from the shard manifest index (falling back
+      to scanning `config.SHARDS_DIR` when there is no manifest).
     - Spawn one process per selected shard to publish temps into the
       shared buffer.
     - Spawn the VideoJockey process to compose the final video.
@@ -17,7 +18,10 @@ import random
 import sys
 
 import config
-from shared_buffer import SharedBuffer
+import manifest
+import shard_verifier
+import transport
+from flow_control import CreditGate
 from fan import Fan
 from video_jockey import VideoJockey
 
@@ -62,17 +66,100 @@ def producer_worker(fan_id, shared_buf, shard_path, verbose):
     Producer worker that reads a single shard from disk (shard_path) and
     writes it to the shared buffer.
     """
+    # per-fan transports hand each fan its own channel
+    bind = getattr(shared_buf, "bind", None)
+    if callable(bind):
+        shared_buf = bind(fan_id)
     f = Fan(fan_id, shard_path=shard_path, verbose=verbose)
     # single send per fan (we spawn exactly as many fans as selected shards)
     f.send_shard(shared_buf)
 
 
-def dj_worker(shared_buf, total_shards):
+def dj_worker(shared_buf, total_shards, shard_ids=None):
+    # network transports: the VJ reads from its own ingest server
+    serve = getattr(shared_buf, "serve", None)
+    if callable(serve):
+        shared_buf = serve()
     vj = VideoJockey()
-    vj.start(shared_buf, total_shards)
+    try:
+        vj.start(shared_buf, total_shards, shard_ids)
+    finally:
+        if callable(serve):
+            shared_buf.close()
+
+
+def _scan_shard_dir(shards_dir):
+    candidates = []
+    if os.path.isdir(str(shards_dir)):
+        for fn in sorted(os.listdir(str(shards_dir))):
+            if fn.startswith("shard_") and fn.endswith(".mp4"):
+                candidates.append(os.path.join(str(shards_dir), fn))
+    return candidates
+
+
+def select_shard_paths(num_fans):
+    """
+    Pick `num_fans` random shard files. Shards come from the manifest
+    index (only the chosen ones are verified, in parallel); without a
+    manifest the shard directory is scanned as before. Returns None if
+    not enough usable shards are available.
+    """
+    logger = logging.getLogger(__name__)
+    shards_dir = config.SHARDS_DIR
+    index = manifest.default_index()
+    if index is not None and len(index) > 0:
+        found = len(index)
+        if found >= num_fans:
+            chosen = random.sample(list(index), k=num_fans)
+            results = shard_verifier.verify_shards(chosen)
+            bad = shard_verifier.failed(results)
+            if not bad:
+                return [s.file_path() for s in chosen]
+            logger.error(
+                "%d selected shard(s) failed verification: %s",
+                len(bad),
+                [r.shard.id() for r in bad],
+            )
+            return None
+    else:
+        logger.warning(
+            "No shard manifest at %s; scanning %s instead",
+            config.SHARDS_JSON_FILE_PATH,
+            shards_dir,
+        )
+        candidates = _scan_shard_dir(shards_dir)
+        found = len(candidates)
+        if found >= num_fans:
+            # choose exactly num_fans unique random shards
+            return random.sample(candidates, k=num_fans)
+
+    logger.error(
+        "Not enough shard files present in %s: found %d, need %d.\n"
+        "Run the shard generator or place the shard files under "
+        "that directory and try again.",
+        shards_dir,
+        found,
+        num_fans,
+    )
+    return None
 
 
-def run_simulation(num_fans=16, total_shards=128, dj_timeout=None):
+def selected_shard_ids(shard_paths):
+    """
+    Manifest ids of the selected shard files, so the VJ orders over the
+    shards actually sent rather than the whole manifest. None without a
+    manifest; files it does not list are left out.
+    """
+    index = manifest.default_index()
+    if not index:
+        return None
+    ids = {s.file_path(verify=False): s.id() for s in index}
+    return [ids[p] for p in shard_paths if p in ids]
+
+
+def run_simulation(
+    num_fans=16, total_shards=128, dj_timeout=None, backend=None
+):
     logging.basicConfig(
         level=logging.INFO, format="[%(asctime)s:%(levelname)-8s] %(message)s"
     )
@@ -82,7 +169,14 @@ def run_simulation(num_fans=16, total_shards=128, dj_timeout=None):
     _ = total_shards
 
     manager = multiprocessing.Manager()
-    shared_buf = SharedBuffer(manager)
+    shared_buf = transport.make_transport(backend, manager, num_fans)
+    if getattr(config, "FLOW_CONTROL_ENABLED", False):
+        shared_buf.credits = CreditGate()
+    # the VJ acks each delivery as new or duplicate content, on a pipe
+    # per fan id
+    shared_buf.acks = transport.AckChannels(num_fans)
+    # no coverage map: every fan is handed one of the selected shards
+    # below, so no fan picks an id that the map could steer
 
     # Create an Event to signal the cleanup worker to stop
     stop_cleanup = multiprocessing.Event()
@@ -95,36 +189,19 @@ def run_simulation(num_fans=16, total_shards=128, dj_timeout=None):
     cleanup_proc.start()
 
     # We will read a fixed number of shards in parallel (num_fans). Pick
-    # up to `num_fans` random shard files from the shards directory.
-    # Only select from existing shard files on disk. If there are fewer than
-    # the requested `num_fans` shard files, abort with an error so the
-    # caller can populate the shard directory correctly.
-    shards_dir = config.SHARDS_DIR
-    candidates = []
-    if os.path.isdir(str(shards_dir)):
-        for fn in sorted(os.listdir(str(shards_dir))):
-            if fn.startswith("shard_") and fn.endswith(".mp4"):
-                candidates.append(os.path.join(str(shards_dir), fn))
-
-    if len(candidates) < num_fans:
-        logger = logging.getLogger(__name__)
-        logger.error(
-            "Not enough shard files present in %s: found %d, need %d.\n"
-            "Run the shard generator or place the shard files under "
-            "that directory and try again.",
-            shards_dir,
-            len(candidates),
-            num_fans,
-        )
+    # `num_fans` random shards, from the manifest index when available.
+    # If there are fewer than the requested `num_fans` usable shards,
+    # abort with an error so the caller can populate the shard directory
+    # correctly.
+    shard_paths = select_shard_paths(num_fans)
+    if shard_paths is None:
         sys.exit(1)
 
-    # choose exactly num_fans unique random shards from the existing files
-    shard_paths = random.sample(candidates, k=num_fans)
-
     # start DJ - expect as many shards as we selected (len(shard_paths))
     expected_shards = len(shard_paths)
     dj = multiprocessing.Process(
-        target=dj_worker, args=(shared_buf, expected_shards)
+        target=dj_worker,
+        args=(shared_buf, expected_shards, selected_shard_ids(shard_paths)),
     )
     dj.start()
 
@@ -172,6 +249,10 @@ def run_simulation(num_fans=16, total_shards=128, dj_timeout=None):
     except OSError:
         pass
 
+    # release the shared-memory block, if the backend has one
+    unlink = getattr(shared_buf, "unlink", shared_buf.close)
+    unlink()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run shard simulation")
@@ -190,6 +271,12 @@ if __name__ == "__main__":
         default=None,
         help="DJ timeout in seconds (overrides DJ_TIMEOUT env)",
     )
+    parser.add_argument(
+        "--buffer",
+        choices=transport.KINDS + transport.NETWORK_KINDS,
+        default=None,
+        help="Shared buffer backend (default: config.SHARED_BUFFER_BACKEND)",
+    )
     args = parser.parse_args()
 
     # allow environment DJ_TIMEOUT to override default if CLI arg not
@@ -198,4 +285,5 @@ if __name__ == "__main__":
         num_fans=args.fans,
         total_shards=args.shards,
         dj_timeout=args.dj_timeout,
+        backend=args.buffer,
     )
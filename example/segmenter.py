@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Single-pass shard generator.
+
+Cuts the source video into `shard_NNNN.mp4` files under
+`config.SHARDS_DIR` with one ffmpeg segment-muxer run, instead of one
+ffmpeg process (and one demux from the start of the source) per shard
+as `video.create_shard` does.
+
+Key behaviors:
+    - ffmpeg streams a CSV segment list (name,start,end) to stdout as
+      each segment is closed; each finished shard is hashed and recorded
+      while later segments are still being cut. The manifest file is
+      rewritten every `config.MANIFEST_FLUSH_EVERY` shards and at the end.
+    - Cuts are stream copies, so they land on keyframes. With `--shards`
+      the cut points are planned on the source's keyframe index, half a
+      frame ahead of each keyframe, so every shard gets the boundaries
+      that were asked for.
+
+Usage:
+    python segmenter.py --seconds 2.0
+    python segmenter.py --shards 128 --compare
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from fractions import Fraction
+
+import config
+import keyframes
+import manifest
+import video
+from config import logger
+
+# cut lead when the source frame rate is unknown: far above ffprobe's
+# microsecond rounding, below the frame interval of any real video
+_FALLBACK_HALF_FRAME = 0.0005
+
+# -segment_time for a plan without cuts: the segment muxer defaults to 2 s
+# segments, and rejects an empty -segment_times list, so one segment is
+# asked for as one longer than any source
+_NO_CUTS_SEGMENT_TIME = "9999999999"
+
+
+def segment_command(
+    input_file_path, output_dir, segment_seconds=None, segment_times=None
+):
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        str(input_file_path),
+        "-map",
+        "0",
+        "-c",
+        "copy",
+        "-f",
+        "segment",
+        "-reset_timestamps",
+        "1",
+        "-segment_start_number",
+        "0",
+        "-segment_list",
+        "pipe:1",
+        "-segment_list_type",
+        "csv",
+    ]
+    if segment_times is None:
+        cmd += ["-segment_time", str(segment_seconds)]
+    elif segment_times:
+        cmd += ["-segment_times", ",".join(str(t) for t in segment_times)]
+    else:
+        # every planned cut collapsed (or one shard was asked for)
+        cmd += ["-segment_time", _NO_CUTS_SEGMENT_TIME]
+    cmd.append(os.path.join(str(output_dir), "shard_%04d.mp4"))
+    return cmd
+
+
+def segment_source(
+    input_file_path=None,
+    output_dir=None,
+    segment_seconds=None,
+    segment_times=None,
+    writer=None,
+):
+    """
+    Cut the whole source in one ffmpeg pass and record every shard in the
+    manifest as its segment completes; the file is written in batches.
+
+    Returns the list of manifest records written, or None on failure.
+    """
+    if input_file_path is None:
+        input_file_path = config.SOURCE_VIDEO_FILE_PATH
+    if output_dir is None:
+        output_dir = config.SHARDS_DIR
+    if segment_times is None and not segment_seconds:
+        raise ValueError("segment_seconds or segment_times is required")
+    os.makedirs(str(output_dir), exist_ok=True)
+    if writer is None:
+        writer = manifest.ManifestWriter(
+            os.path.join(str(output_dir), "shards.json"),
+            autoflush=False,
+            fresh=True,
+        )
+    # each flush rewrites the whole manifest, so flushing per shard would
+    # be quadratic in the number of shards
+    flush_every = max(1, int(getattr(config, "MANIFEST_FLUSH_EVERY", 64)))
+
+    cmd = segment_command(
+        input_file_path, output_dir, segment_seconds, segment_times
+    )
+    logger.info("segmenting %s -> %s", input_file_path, output_dir)
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    except (FileNotFoundError, OSError) as e:
+        logger.error("Failed to start ffmpeg process: %s", e)
+        return None
+
+    records = []
+    # one "name,start,end" line per finished segment
+    for line in process.stdout:
+        line = line.strip()
+        if not line:
+            continue
+        name, start, end = line.rsplit(",", 2)
+        file_path = name
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(str(output_dir), name)
+        shard_id = len(records)
+        digest = video.file_hash(file_path)
+        records.append(
+            writer.add(shard_id, float(start), float(end), file_path, digest)
+        )
+        if len(records) % flush_every == 0:
+            writer.flush()
+        logger.debug("segment %s ready [%s, %s)", name, start, end)
+
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        logger.error("ffmpeg segment failed: %s", stderr)
+        return None
+    writer.flush()
+    logger.info("wrote %d shards", len(records))
+    return records
+
+
+def half_frame(stream_info):
+    """
+    Half a frame interval of a probed video stream, in seconds, or
+    `_FALLBACK_HALF_FRAME` when its frame rate is unknown.
+    """
+    for key in ("avg_frame_rate", "r_frame_rate"):
+        try:
+            rate = Fraction(stream_info.get(key) or "")
+        except (ValueError, ZeroDivisionError):
+            continue
+        if rate > 0:
+            return float(1 / (2 * rate))
+    return _FALLBACK_HALF_FRAME
+
+
+def plan_segment_times(input_file_path, num_shards):
+    """
+    Keyframe-aligned cut points splitting the source into ~num_shards.
+
+    ffprobe rounds keyframe times to microseconds, and the segment muxer
+    cuts at the first keyframe at or after each time, so a time rounded
+    up would skip its keyframe and cut a GOP later. Each cut is moved
+    half a frame before its keyframe, where no other frame sits.
+    """
+    info = video.probe(input_file_path)
+    duration = float(info.get("duration"))
+    ranges = keyframes.load(input_file_path).plan(num_shards, duration)
+    early = half_frame(info)
+    return [max(0.0, start - early) for start, _ in ranges[1:]]
+
+
+def per_shard_loop(input_file_path, output_dir, records):
+    """The legacy path: one create_shard call per planned range."""
+    for r in records:
+        out = os.path.join(str(output_dir), f"shard_{r['id']:04d}.mp4")
+        video.create_shard(input_file_path, out, r["start"], r["end"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cut the source video into shards in one ffmpeg pass"
+    )
+    parser.add_argument(
+        "--source",
+        default=str(config.SOURCE_VIDEO_FILE_PATH),
+        help="Source video (default: config.SOURCE_VIDEO_FILE_PATH)",
+    )
+    parser.add_argument(
+        "--out",
+        default=str(config.SHARDS_DIR),
+        help="Output directory (default: config.SHARDS_DIR)",
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--seconds", type=float, default=None, help="Segment length"
+    )
+    group.add_argument(
+        "--shards",
+        type=int,
+        default=config.NUM_SHARDS,
+        help="Number of shards (segment length derived from duration)",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Also time the per-shard create_shard loop",
+    )
+    args = parser.parse_args()
+
+    seconds = args.seconds
+    times = None
+    if seconds is None:
+        times = plan_segment_times(args.source, args.shards)
+
+    t0 = time.perf_counter()
+    records = segment_source(args.source, args.out, seconds, times)
+    single_pass = time.perf_counter() - t0
+    if records is None:
+        return 1
+    print(f"single pass : {len(records)} shards in {single_pass:.2f}s")
+
+    if args.compare:
+        os.makedirs(str(config.TEMP_DIR), exist_ok=True)
+        loop_dir = tempfile.mkdtemp(dir=str(config.TEMP_DIR))
+        try:
+            t0 = time.perf_counter()
+            per_shard_loop(args.source, loop_dir, records)
+            loop = time.perf_counter() - t0
+        finally:
+            shutil.rmtree(loop_dir, ignore_errors=True)
+        print(f"per-shard   : {len(records)} shards in {loop:.2f}s")
+        if single_pass > 0:
+            print(f"speedup     : {loop / single_pass:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,9 @@
 """Video shard representation and validation.
 
 Computes and verifies the file hash, and provides simple accessors and
-JSON-style stringification for debugging.
+JSON-style stringification for debugging. Shards built with `lazy=True`
+defer the hash check until the file is first used or `verify()` is
+called, so large catalogs can be loaded without reading every file.
 """
 
 import json
@@ -15,18 +17,49 @@ class Shard(object):
     video shard class
     """
 
-    def __init__(self, id, start, end, file_path, hash):
+    # no per-instance __dict__; large catalogs hold many shards
+    __slots__ = (
+        "__id",
+        "__start",
+        "__end",
+        "__file_path",
+        "__expected_hash",
+        "__hash",
+    )
+
+    def __init__(self, id, start, end, file_path, hash, lazy=False):
 
         self.__id = id
         self.__start = start
         self.__end = end
         self.__file_path = file_path
-        self.__hash = video.file_hash(file_path)
+        self.__expected_hash = hash
+        # computed hash; None until the file has been verified
+        self.__hash = None
+
+        if not lazy:
+            self.verify()
+
+    def verify(self, force=False):
+        """
+        hash the file and compare it with the expected hash, raising on
+        mismatch; the result is remembered unless `force` is set, which
+        also bypasses the persistent hash cache
+        """
+        if self.__hash is not None and not force:
+            return self.__hash
 
-        if self.__hash != hash:
+        digest = video.file_hash(self.__file_path, refresh=force)
+        if digest != self.__expected_hash:
             logger.error("File hash does not match. Data is corrupted.")
             raise Exception
 
+        self.__hash = digest
+        return digest
+
+    def is_verified(self):
+        return self.__hash is not None
+
     def id(self):
         return self.__id
 
@@ -36,11 +69,18 @@ class Shard(object):
     def end(self):
         return self.__end
 
-    def file_path(self):
+    def file_path(self, verify=True):
+        # a lazy shard is verified the first time its file is used;
+        # verify=False is for metadata-only callers such as catalogs
+        if verify:
+            self.verify()
         return self.__file_path
 
     def hash(self):
-        return self.__hash
+        return self.verify()
+
+    def expected_hash(self):
+        return self.__expected_hash
 
     def __str__(self):
         d = {
@@ -48,7 +88,7 @@ class Shard(object):
             "start": self.__start,
             "end": self.__end,
             "file_path": self.__file_path,
-            "hash": self.__hash,
+            "hash": self.__expected_hash,
         }
         s = json.dumps(d, indent=4)
         return s
@@ -0,0 +1,99 @@
+"""Received-shard bitmap shared between the VideoJockey and fans.
+
+With fans picking shard ids uniformly at random, collecting all
+`config.NUM_SHARDS` shards is a coupon-collector problem: about
+N * ln(N) sends for N shards, most of them repeats. A `CoverageMap`
+attached to the transport (`transport.coverage`) lets the VJ mark each
+shard id as it arrives and fans pick one of the ids still missing
+instead. Picking a random missing id, rather than the lowest, keeps
+concurrent fans from all choosing the same one, so total sends stay close
+to the shard count.
+
+The bitmap lives in shared memory (one bit per shard id), so fans read it
+without a round trip to the VJ. It is sized from the shard manifest (see
+`id_space()`) and is only worth attaching when fans pick shard ids
+themselves rather than being handed a shard path.
+"""
+
+import multiprocessing
+import random
+
+import config
+import manifest
+
+# random probes tried before scanning the whole bitmap for a missing id
+_PROBES = 8
+
+
+def id_space():
+    """
+    Number of shard ids to track: the highest manifest id + 1, or
+    `config.NUM_SHARDS` when there is no manifest.
+    """
+    index = manifest.default_index()
+    if index:
+        return max(s.id() for s in index) + 1
+    return config.NUM_SHARDS
+
+
+class CoverageMap(object):
+    """
+    bitmap of shard ids the VJ has received
+    """
+
+    def __init__(self, num_shards=None):
+        if num_shards is None:
+            num_shards = id_space()
+        self.__size = int(num_shards)
+        self.__bits = multiprocessing.Array("B", (self.__size + 7) // 8)
+        self.__count = multiprocessing.Value("i", 0, lock=False)
+
+    def size(self):
+        return self.__size
+
+    def __check(self, shard_id):
+        if not 0 <= shard_id < self.__size:
+            raise IndexError(f"shard id {shard_id} out of range")
+
+    def mark(self, shard_id):
+        """Record `shard_id` as received; True if it was missing."""
+        self.__check(shard_id)
+        byte, bit = divmod(shard_id, 8)
+        with self.__bits.get_lock():
+            if self.__bits[byte] & (1 << bit):
+                return False
+            self.__bits[byte] |= 1 << bit
+            self.__count.value += 1
+            return True
+
+    def has(self, shard_id):
+        self.__check(shard_id)
+        byte, bit = divmod(shard_id, 8)
+        return bool(self.__bits[byte] & (1 << bit))
+
+    def count(self):
+        return self.__count.value
+
+    def complete(self):
+        return self.__count.value >= self.__size
+
+    def missing(self):
+        """Ids not received yet, in order."""
+        with self.__bits.get_lock():
+            bits = bytes(self.__bits.get_obj())
+        return [
+            i for i in range(self.__size) if not bits[i // 8] & (1 << i % 8)
+        ]
+
+    def random_missing(self, rng=None):
+        """A random id not received yet, or None once all are in."""
+        rng = rng or random
+        if self.complete():
+            return None
+        # while most ids are missing a few probes find one cheaply
+        for _ in range(_PROBES):
+            shard_id = rng.randrange(self.__size)
+            if not self.has(shard_id):
+                return shard_id
+        missing = self.missing()
+        return rng.choice(missing) if missing else None
@@ -0,0 +1,151 @@
+"""Columnar shard catalog backed by NumPy.
+
+`ShardTable` keeps ids, starts, ends, sizes and hashes in parallel
+arrays sorted by start time, so catalog-wide integrity queries run as a
+handful of vectorized operations instead of a Python loop over `Shard`
+objects.
+
+Queries:
+    - total_duration(): sum of shard durations.
+    - gaps() / overlaps(): holes and overlaps between consecutive shards.
+    - larger_than(n): ids of shards over a size threshold.
+    - coverage(t0, t1): fraction of [t0, t1) covered by any shard.
+
+NumPy is an optional dependency; constructing a table without it raises
+ImportError.
+"""
+
+import os
+
+try:
+    # Optional dependency: only the columnar catalog needs it
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None  # type: ignore
+
+import config
+
+# shake256 hex digests from video.file_hash are 16 characters
+HASH_DTYPE = "S16"
+
+
+class ShardTable(object):
+    """
+    columnar shard catalog
+    """
+
+    def __init__(self, ids, starts, ends, sizes, hashes):
+        if np is None:
+            raise ImportError("ShardTable requires numpy")
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.float64)
+        order = np.lexsort((ids, starts))
+        self.__ids = ids[order]
+        self.__starts = starts[order]
+        self.__ends = np.asarray(ends, dtype=np.float64)[order]
+        self.__sizes = np.asarray(sizes, dtype=np.int64)[order]
+        self.__hashes = np.asarray(hashes, dtype=HASH_DTYPE)[order]
+
+    @classmethod
+    def from_shards(cls, shards):
+        """
+        Build a table from Shard objects (e.g. a manifest ShardIndex).
+        Sizes come from stat(); missing files get size -1. Lazy shards are
+        not verified.
+        """
+        shards = list(shards)
+        return cls(
+            [s.id() for s in shards],
+            [s.start() for s in shards],
+            [s.end() for s in shards],
+            [_file_size(s.file_path(verify=False)) for s in shards],
+            [s.expected_hash() for s in shards],
+        )
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def ids(self):
+        return self.__ids
+
+    def starts(self):
+        return self.__starts
+
+    def ends(self):
+        return self.__ends
+
+    def sizes(self):
+        return self.__sizes
+
+    def hashes(self):
+        return self.__hashes
+
+    def nbytes(self):
+        return sum(
+            a.nbytes
+            for a in (
+                self.__ids,
+                self.__starts,
+                self.__ends,
+                self.__sizes,
+                self.__hashes,
+            )
+        )
+
+    def total_duration(self):
+        return float(np.sum(self.__ends - self.__starts))
+
+    def __boundaries(self):
+        # signed distance from each shard's end to the next shard's start
+        return self.__starts[1:] - self.__ends[:-1]
+
+    def gaps(self, epsilon=None):
+        """
+        Return (prev_ids, next_ids, seconds) for consecutive shards with
+        a hole between them larger than `epsilon`.
+        """
+        if epsilon is None:
+            epsilon = config.TIME_EPSILON
+        delta = self.__boundaries()
+        mask = delta > epsilon
+        return self.__ids[:-1][mask], self.__ids[1:][mask], delta[mask]
+
+    def overlaps(self, epsilon=None):
+        """
+        Return (prev_ids, next_ids, seconds) for consecutive shards that
+        overlap by more than `epsilon`.
+        """
+        if epsilon is None:
+            epsilon = config.TIME_EPSILON
+        delta = self.__boundaries()
+        mask = delta < -epsilon
+        return self.__ids[:-1][mask], self.__ids[1:][mask], -delta[mask]
+
+    def larger_than(self, size_bytes):
+        return self.__ids[self.__sizes > size_bytes]
+
+    def covered_seconds(self, t0, t1):
+        """Length of the union of all shards clipped to [t0, t1)."""
+        if t1 <= t0 or len(self) == 0:
+            return 0.0
+        starts = np.clip(self.__starts, t0, t1)
+        ends = np.clip(self.__ends, t0, t1)
+        # starts are sorted, so each shard only adds what lies beyond the
+        # furthest end reached by the shards before it
+        reach = np.maximum.accumulate(ends)
+        prev_reach = np.concatenate(([t0], reach[:-1]))
+        added = ends - np.maximum(starts, prev_reach)
+        return float(np.sum(np.clip(added, 0.0, None)))
+
+    def coverage(self, t0, t1):
+        """Fraction of [t0, t1) covered by at least one shard."""
+        if t1 <= t0:
+            return 0.0
+        return self.covered_seconds(t0, t1) / (t1 - t0)
+
+
+def _file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return -1
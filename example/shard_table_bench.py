@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Compare memory use and query latency of a list of `Shard` objects with a
+columnar `ShardTable` holding the same synthetic catalog.
+Usage:
+    python shard_table_bench.py --count 100000
+
+Memory is measured with tracemalloc while building each catalog; query
+latency is the best of a few runs of the same query on each side.
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from shard import Shard
+from shard_table import ShardTable
+
+
+def _synthetic(count, seed=0):
+    """Contiguous 1s shards with a few holes and overlaps sprinkled in."""
+    rng = random.Random(seed)
+    rows = []
+    t = 0.0
+    for i in range(count):
+        duration = 1.0
+        start = t + rng.choice((0.0,) * 98 + (0.25, -0.25))
+        rows.append(
+            (i, start, start + duration, rng.randint(1, 200) * 2**20)
+        )
+        t = start + duration
+    return rows
+
+
+def _build_objects(rows):
+    return [
+        (
+            Shard(i, s, e, f"shard_{i:06d}.mp4", f"{i:016x}", lazy=True),
+            size,
+        )
+        for i, s, e, size in rows
+    ]
+
+
+def _build_table(rows):
+    return ShardTable(
+        [r[0] for r in rows],
+        [r[1] for r in rows],
+        [r[2] for r in rows],
+        [r[3] for r in rows],
+        [f"{r[0]:016x}" for r in rows],
+    )
+
+
+def _measure(build, rows):
+    tracemalloc.start()
+    obj = build(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, current, peak
+
+
+def _best_ms(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def _list_queries(objects, t0, t1, threshold):
+    ordered = sorted(objects, key=lambda o: o[0].start())
+    return {
+        "total_duration": lambda: sum(
+            s.end() - s.start() for s, _ in ordered
+        ),
+        "gaps": lambda: [
+            (a.id(), b.id())
+            for (a, _), (b, _) in zip(ordered, ordered[1:])
+            if b.start() - a.end() > 1e-7
+        ],
+        "overlaps": lambda: [
+            (a.id(), b.id())
+            for (a, _), (b, _) in zip(ordered, ordered[1:])
+            if b.start() - a.end() < -1e-7
+        ],
+        "larger_than": lambda: [s.id() for s, n in ordered if n > threshold],
+        "coverage": lambda: _list_coverage(ordered, t0, t1),
+    }
+
+
+def _list_coverage(ordered, t0, t1):
+    covered = 0.0
+    reach = t0
+    for s, _ in ordered:
+        start = min(max(s.start(), t0), t1)
+        end = min(max(s.end(), t0), t1)
+        if end > max(start, reach):
+            covered += end - max(start, reach)
+        reach = max(reach, end)
+    return covered / (t1 - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark ShardTable against a list of Shard objects"
+    )
+    parser.add_argument(
+        "--count", type=int, default=100000, help="Number of shards"
+    )
+    args = parser.parse_args()
+
+    rows = _synthetic(args.count)
+    objects, obj_mem, obj_peak = _measure(_build_objects, rows)
+    table, tab_mem, tab_peak = _measure(_build_table, rows)
+
+    print(f"catalog of {args.count} shards")
+    print(f"{'':<16} {'retained MB':>12} {'peak MB':>10}")
+    for label, mem, peak in (
+        ("list[Shard]", obj_mem, obj_peak),
+        ("ShardTable", tab_mem, tab_peak),
+    ):
+        print(f"{label:<16} {mem / 2**20:>12.2f} {peak / 2**20:>10.2f}")
+
+    t0, t1 = args.count * 0.25, args.count * 0.75
+    threshold = 100 * 2**20
+    table_queries = {
+        "total_duration": table.total_duration,
+        "gaps": table.gaps,
+        "overlaps": table.overlaps,
+        "larger_than": lambda: table.larger_than(threshold),
+        "coverage": lambda: table.coverage(t0, t1),
+    }
+    list_queries = _list_queries(objects, t0, t1, threshold)
+
+    print(f"\n{'query':<16} {'list ms':>10} {'table ms':>10} {'speedup':>9}")
+    for name, fn in table_queries.items():
+        list_ms = _best_ms(list_queries[name])
+        table_ms = _best_ms(fn)
+        speedup = list_ms / table_ms if table_ms > 0 else float("inf")
+        print(
+            f"{name:<16} {list_ms:>10.2f} {table_ms:>10.3f} {speedup:>8.0f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Parallel shard verification.
+
+Checks a set of `Shard` objects concurrently with a thread pool. Hashing
+is I/O bound and hashlib releases the GIL while digesting large buffers,
+so threads overlap both the reads and the hashing.
+
+Key behaviors:
+    - Every shard gets a `VerifyResult`; failures never abort the run.
+    - An optional progress callback is called as each shard finishes,
+      otherwise progress is logged every ~10% of the set.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from config import logger
+
+# shard: the Shard checked; ok: hash matched; hash: computed digest (None
+# on failure); error: exception type name on failure (None on success)
+VerifyResult = namedtuple("VerifyResult", ["shard", "ok", "hash", "error"])
+
+
+def verify_one(shard, force=False):
+    """Verify a single shard and wrap the outcome in a VerifyResult."""
+    try:
+        digest = shard.verify(force=force)
+    except (Exception, SystemExit) as e:
+        # file_hash quits on unreadable files; keep that local to the shard
+        return VerifyResult(shard, False, None, type(e).__name__)
+    return VerifyResult(shard, True, digest, None)
+
+
+def _log_progress(done, total, result):
+    step = max(1, total // 10)
+    if done % step == 0 or done == total:
+        logger.info("verified %d/%d shards", done, total)
+    if not result.ok:
+        logger.warning(
+            "shard %s failed verification (%s)",
+            result.shard.id(),
+            result.error,
+        )
+
+
+def verify_shards(shards, max_workers=None, progress=None, force=False):
+    """
+    Verify `shards` in parallel and return their results in input order.
+
+    `progress(done, total, result)` is called from the calling thread as
+    each shard finishes.
+    """
+    shards = list(shards)
+    total = len(shards)
+    if total == 0:
+        return []
+    if max_workers is None:
+        max_workers = int(getattr(config, "VERIFY_WORKERS", 8))
+    if progress is None:
+        progress = _log_progress
+
+    results = [None] * total
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(verify_one, shard, force): i
+            for i, shard in enumerate(shards)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[futures[future]] = result
+            progress(done, total, result)
+    return results
+
+
+def failed(results):
+    """Return the results that did not verify."""
+    return [r for r in results if not r.ok]
@@ -9,27 +9,96 @@ API:
                         return True/False
                 - get_shard(timeout): try to dequeue, return (sender_name,
                         file_path) or None
+                - put_many(entries, timeout): enqueue (sender_name,
+                        file_path) entries in batches, return how many
+                        were enqueued
+                - get_many(max_items, timeout): dequeue up to max_items
+                        entries, return a (possibly empty) list
                 - vj_has_all_shards: manager.Value('b') flag set by the DJ when
-                        collection done
+                        collection done (kept for compatibility)
+                - set_all_shards_collected() / all_shards_collected() /
+                        wait_all_shards_collected(timeout): the same signal
+                        as a multiprocessing.Event, no Manager round trip
+                        (from transport.Transport)
+
+Consumers do not poll: every successful put bumps a sequence number and
+notifies a multiprocessing.Condition, and an empty get waits on it until
+something lands (or the timeout passes).
+
+A batch from put_many travels as one queue item (one Manager round
+trip). Backpressure counts entries, not queue items: a counting
+semaphore of SHARED_BUFFER_SIZE slots is taken once per entry put and
+given back once per entry handed to a consumer, so the buffer never
+holds more than SHARED_BUFFER_SIZE entries however they are batched.
 """
 
+import collections
+import multiprocessing
+import time
+
 import config
 import queue
+from transport import Transport
 
 
-class SharedBuffer(object):
+class SharedBuffer(Transport):
     def __init__(self, manager):
+        super().__init__()
         # flag set by VideoJockey when it has collected all shards
         self.vj_has_all_shards = manager.Value("b", False)
 
         # bounded queue for shard entries (sender_name, file_path)
         # Use manager.Queue so it is safe across processes
         self._queue = manager.Queue(maxsize=config.SHARED_BUFFER_SIZE)
+        # one slot per entry in the buffer (queued or pending), so a
+        # batch does not hold more than one queue item's worth of room
+        self._slots = multiprocessing.Semaphore(config.SHARED_BUFFER_SIZE)
         # list of temp file paths that failed to be enqueued and need
         # cleanup. Producers register failed temp files here instead
         # of deleting them immediately so a separate cleanup worker
         # can remove them safely.
         self.failed_temp_paths = manager.list()
+        # consumer-side entries from a dequeued batch not yet returned;
+        # local to the process that dequeued them
+        self._pending = collections.deque()
+        # arrival notifications: producers bump _seq (guarded by the
+        # condition's lock) and notify after each successful put
+        self._arrivals = multiprocessing.Condition()
+        self._seq = multiprocessing.Value("Q", 0, lock=False)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_pending"] = collections.deque()
+        return state
+
+    def _notify_put(self):
+        with self._arrivals:
+            self._seq.value += 1
+            self._arrivals.notify_all()
+
+    def _release(self, count):
+        """Give back the slots of `count` entries handed out."""
+        for _ in range(count):
+            self._slots.release()
+
+    def _get_item(self, timeout):
+        """Dequeue one queue item, waiting on the arrival condition
+        instead of polling. Returns None once `timeout` has passed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._arrivals:
+                seq = self._seq.value
+            try:
+                return self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with self._arrivals:
+                self._arrivals.wait_for(
+                    lambda: self._seq.value != seq, remaining
+                )
 
     def put_shard(self, sender_name, file_path, timeout=5.0):
         """Try to put a shard into the queue. Returns True on success.
@@ -37,32 +106,117 @@ class SharedBuffer(object):
         If the queue is full, this will block up to `timeout` seconds
         and then return False if not possible.
         """
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            return False
         try:
-            self._queue.put((sender_name, file_path), timeout=timeout)
-            return True
+            self._queue.put(
+                (sender_name, file_path),
+                timeout=max(0.0, deadline - time.monotonic()),
+            )
         except queue.Full:
+            self._release(1)
             return False
         except (EOFError, BrokenPipeError, OSError):
+            self._release(1)
             return False
+        self._notify_put()
+        return True
 
     def get_shard(self, timeout=0.1):
         """Try to get a shard from the queue.
 
         Returns (sender_name, file_path) or None on timeout.
         """
+        if self._pending:
+            self._release(1)
+            return self._pending.popleft()
         try:
-            item = self._queue.get(timeout=timeout)
-            return item
-        except queue.Empty:
-            return None
+            item = self._get_item(timeout)
         except (EOFError, BrokenPipeError, OSError):
             return None
+        if item is None:
+            return None
+        self._release(1)
+        if isinstance(item, list):
+            self._pending.extend(item[1:])
+            return item[0]
+        return item
+
+    def put_many(self, entries, timeout=5.0):
+        """Put (sender_name, file_path) entries into the queue in batches
+        of up to SHARED_BUFFER_BATCH_SIZE, one round trip per batch.
+
+        Blocks up to `timeout` seconds overall while the buffer is full
+        and returns the number of entries enqueued (a prefix of
+        `entries`). Only the first slot of a batch is waited for; the
+        batch is cut short at the slots free right then, so entries
+        already put can be consumed while the rest waits for room.
+        """
+        entries = [tuple(e) for e in entries]
+        batch_size = max(1, getattr(config, "SHARED_BUFFER_BATCH_SIZE", 16))
+        deadline = time.monotonic() + timeout
+        sent = 0
+        while sent < len(entries):
+            want = min(batch_size, len(entries) - sent)
+            remaining = max(0.0, deadline - time.monotonic())
+            if not self._slots.acquire(timeout=remaining):
+                break
+            taken = 1
+            while taken < want and self._slots.acquire(block=False):
+                taken += 1
+            batch = entries[sent : sent + taken]
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                self._queue.put(batch, timeout=remaining)
+            except queue.Full:
+                self._release(taken)
+                break
+            except (EOFError, BrokenPipeError, OSError):
+                self._release(taken)
+                break
+            sent += taken
+            self._notify_put()
+        return sent
+
+    def get_many(self, max_items, timeout=0.1):
+        """Get up to `max_items` entries.
+
+        Waits up to `timeout` seconds for the first one, then takes
+        whatever else is already queued without waiting. Returns a list
+        of (sender_name, file_path), empty on timeout.
+        """
+        items = []
+        while self._pending and len(items) < max_items:
+            items.append(self._pending.popleft())
+        wait = not items
+        while len(items) < max_items:
+            try:
+                if wait:
+                    item = self._get_item(timeout)
+                    wait = False
+                    if item is None:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            except (EOFError, BrokenPipeError, OSError):
+                break
+            batch = item if isinstance(item, list) else [item]
+            take = max_items - len(items)
+            items.extend(batch[:take])
+            self._pending.extend(batch[take:])
+        self._release(len(items))
+        return items
 
     def qsize(self):
+        """Queue items in use (a batch counts once) plus entries already
+        dequeued locally but not yet returned."""
         try:
-            return self._queue.qsize()
+            return self._queue.qsize() + len(self._pending)
         except (NotImplementedError, OSError, AttributeError):
-            return 0
+            return len(self._pending)
 
     def register_failed_temp(self, temp_path):
         """Producers call this to register a temp file that couldn't
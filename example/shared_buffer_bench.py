@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of SharedBuffer entries/s at different batch sizes.
+Usage:
+    python shared_buffer_bench.py --entries 20000 --batch 1 8 32 128
+
+One producer process pushes `--entries` (sender_name, file_path) entries
+through a Manager-backed SharedBuffer to this process. Batch size 1 uses
+put_shard/get_shard, larger sizes use put_many/get_many with
+SHARED_BUFFER_BATCH_SIZE set to the batch size.
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+
+import config
+from shared_buffer import SharedBuffer
+
+
+def _produce(buf, entries, batch):
+    config.SHARED_BUFFER_BATCH_SIZE = batch
+    items = [("fan", f"/tmp/shard_{i:06d}.mp4") for i in range(entries)]
+    if batch == 1:
+        for name, path in items:
+            while not buf.put_shard(name, path, timeout=1.0):
+                pass
+        return
+    sent = 0
+    while sent < entries:
+        sent += buf.put_many(items[sent:], timeout=1.0)
+
+
+def _consume(buf, entries, batch):
+    got = 0
+    while got < entries:
+        if batch == 1:
+            got += buf.get_shard(timeout=1.0) is not None
+        else:
+            got += len(buf.get_many(batch, timeout=1.0))
+
+
+def _run(entries, batch):
+    manager = multiprocessing.Manager()
+    try:
+        buf = SharedBuffer(manager)
+        p = multiprocessing.Process(
+            target=_produce, args=(buf, entries, batch)
+        )
+        t0 = time.perf_counter()
+        p.start()
+        _consume(buf, entries, batch)
+        elapsed = time.perf_counter() - t0
+        p.join()
+    finally:
+        manager.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="SharedBuffer entries/s by batch size"
+    )
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument(
+        "--batch", type=int, nargs="+", default=[1, 4, 16, 64, 256]
+    )
+    args = parser.parse_args()
+
+    print(f"{args.entries} entries, queue slots={config.SHARED_BUFFER_SIZE}")
+    print(f"{'batch':>6} {'seconds':>10} {'entries/s':>12}")
+    for batch in args.batch:
+        elapsed = _run(args.entries, batch)
+        print(f"{batch:>6} {elapsed:>10.3f} {args.entries / elapsed:>12.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
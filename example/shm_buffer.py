@@ -0,0 +1,223 @@
+"""
+ShmRingBuffer: a bounded shard buffer on `multiprocessing.shared_memory`.
+
+Unlike `SharedBuffer`, which sends every entry through a Manager server
+process, the ring is a fixed block of shared memory split into
+`config.SHM_RING_SLOTS` slots of `config.SHM_SLOT_SIZE` bytes. Shard
+bytes are copied into the slots directly, so fans do not need to write a
+temp file and no entry is pickled or proxied.
+
+Key behaviors:
+    - An entry (sender name + payload) occupies as many consecutive
+      slots as it needs; the ring wraps around.
+    - A counting semaphore of free slots provides backpressure: a put
+      reserves all the slots it needs (or gives up after `timeout`) while
+      holding the producer lock, so two large entries cannot deadlock
+      each other by holding half a reservation each.
+    - A second semaphore counts complete entries for the consumer.
+    - Payloads may be bytes (carried in the ring) or a str file path
+      (carried as-is), so the API matches `SharedBuffer`.
+
+API:
+    - put_shard(sender_name, payload, timeout): True/False; ValueError
+      for an entry that can never fit
+    - get_shard(timeout): (sender_name, payload) or None
+    - qsize(): number of complete entries in the ring
+    - vj_has_all_shards: multiprocessing.Value('b') completion flag
+    - close()/unlink(): release the mapping; the creator unlinks it
+    - batch calls, done signal and failed temps: see transport.Transport
+"""
+
+import multiprocessing
+import os
+import struct
+import time
+
+from contextlib import suppress
+from multiprocessing import shared_memory
+
+import config
+from config import logger
+from transport import Transport
+
+# entry header: kind (0 = path, 1 = bytes), name length, payload length
+_HEADER = struct.Struct("<BIQ")
+_PATH = 0
+_BYTES = 1
+
+
+class ShmRingBuffer(Transport):
+    """
+    fixed-slot shared-memory ring of shard payloads
+    """
+
+    # fans check this to send shard bytes instead of a temp file path
+    carries_payload = True
+
+    def __init__(self, slots=None, slot_size=None):
+        super().__init__()
+        if slots is None:
+            slots = getattr(config, "SHM_RING_SLOTS", 64)
+        if slot_size is None:
+            slot_size = getattr(config, "SHM_SLOT_SIZE", 256 * 1024)
+        if slots < 1 or slot_size <= _HEADER.size:
+            raise ValueError(
+                f"invalid ring geometry slots={slots} slot_size={slot_size}"
+            )
+        self.__slots = slots
+        self.__slot_size = slot_size
+        self.__shm = shared_memory.SharedMemory(
+            create=True, size=slots * slot_size
+        )
+        self.__owner = os.getpid()
+
+        # flag set by VideoJockey when it has collected all shards
+        self.vj_has_all_shards = multiprocessing.Value("b", False)
+
+        self.__free = multiprocessing.Semaphore(slots)
+        self.__entries = multiprocessing.Semaphore(0)
+        self.__put_lock = multiprocessing.Lock()
+        self.__get_lock = multiprocessing.Lock()
+        # head/tail are slot indexes guarded by the put/get locks
+        self.__head = multiprocessing.Value("Q", 0, lock=False)
+        self.__tail = multiprocessing.Value("Q", 0, lock=False)
+        self.__count = multiprocessing.Value("i", 0)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_ShmRingBuffer__shm"] = self.__shm.name
+        return state
+
+    def __setstate__(self, state):
+        name = state.pop("_ShmRingBuffer__shm")
+        self.__dict__.update(state)
+        try:
+            # only the creating process should unlink the block
+            self.__shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 has no `track` argument
+            self.__shm = shared_memory.SharedMemory(name=name)
+
+    def name(self):
+        return self.__shm.name
+
+    def capacity(self):
+        """Total payload capacity in bytes (all slots)."""
+        return self.__slots * self.__slot_size
+
+    def __encode(self, sender_name, payload):
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            return sender_name.encode("utf-8"), _BYTES, payload
+        return sender_name.encode("utf-8"), _PATH, str(payload).encode()
+
+    def __write(self, offset, data):
+        """Copy `data` into the ring at byte `offset`, wrapping."""
+        buf = self.__shm.buf
+        data = memoryview(data).cast("B")
+        cap = self.capacity()
+        first = min(len(data), cap - offset)
+        buf[offset : offset + first] = data[:first]
+        if first < len(data):
+            buf[: len(data) - first] = data[first:]
+
+    def __read(self, offset, length):
+        buf = self.__shm.buf
+        cap = self.capacity()
+        first = min(length, cap - offset)
+        data = bytes(buf[offset : offset + first])
+        if first < length:
+            data += bytes(buf[: length - first])
+        return data
+
+    def put_shard(self, sender_name, payload, timeout=5.0):
+        """Try to put a shard into the ring. Returns True on success.
+
+        Blocks up to `timeout` seconds for enough free slots and returns
+        False if they do not become available. Raises ValueError for an
+        entry larger than the whole ring, which would never fit.
+        """
+        name, kind, body = self.__encode(sender_name, payload)
+        size = _HEADER.size + len(name) + len(body)
+        needed = -(-size // self.__slot_size)
+        if needed > self.__slots:
+            raise ValueError(
+                f"shard from {sender_name} is {size} bytes;"
+                f" ring holds {self.capacity()}"
+            )
+
+        deadline = time.monotonic() + timeout
+        if not self.__put_lock.acquire(timeout=timeout):
+            return False
+        reserved = 0
+        try:
+            while reserved < needed:
+                remaining = max(0.0, deadline - time.monotonic())
+                if not self.__free.acquire(timeout=remaining):
+                    break
+                reserved += 1
+            if reserved < needed:
+                for _ in range(reserved):
+                    self.__free.release()
+                return False
+
+            offset = self.__head.value * self.__slot_size
+            self.__write(offset, _HEADER.pack(kind, len(name), len(body)))
+            offset = (offset + _HEADER.size) % self.capacity()
+            self.__write(offset, name)
+            offset = (offset + len(name)) % self.capacity()
+            self.__write(offset, body)
+            self.__head.value = (self.__head.value + needed) % self.__slots
+            with self.__count.get_lock():
+                self.__count.value += 1
+            # released under the put lock so entries are read in order
+            self.__entries.release()
+            return True
+        except (OSError, ValueError) as e:
+            logger.error("ring write failed: %s", e)
+            for _ in range(reserved):
+                self.__free.release()
+            return False
+        finally:
+            self.__put_lock.release()
+
+    def get_shard(self, timeout=0.1):
+        """Try to get a shard from the ring.
+
+        Returns (sender_name, payload) or None on timeout. `payload` is
+        bytes for byte entries and a str for path entries.
+        """
+        if not self.__entries.acquire(timeout=timeout):
+            return None
+        with self.__get_lock:
+            offset = self.__tail.value * self.__slot_size
+            kind, name_len, body_len = _HEADER.unpack(
+                self.__read(offset, _HEADER.size)
+            )
+            offset = (offset + _HEADER.size) % self.capacity()
+            name = self.__read(offset, name_len).decode("utf-8")
+            offset = (offset + name_len) % self.capacity()
+            body = self.__read(offset, body_len)
+            size = _HEADER.size + name_len + body_len
+            used = -(-size // self.__slot_size)
+            self.__tail.value = (self.__tail.value + used) % self.__slots
+            with self.__count.get_lock():
+                self.__count.value -= 1
+        for _ in range(used):
+            self.__free.release()
+        if kind == _PATH:
+            body = body.decode()
+        return name, body
+
+    def qsize(self):
+        return self.__count.value
+
+    def close(self):
+        with suppress(OSError, BufferError):
+            self.__shm.close()
+
+    def unlink(self):
+        """Close and, in the creating process, remove the block."""
+        self.close()
+        if os.getpid() == self.__owner:
+            with suppress(FileNotFoundError):
+                self.__shm.unlink()
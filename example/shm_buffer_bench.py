@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Compare shard throughput of the manager-queue `SharedBuffer` with the
+shared-memory `ShmRingBuffer`.
+Usage:
+    python shm_buffer_bench.py --producers 8 --shards 16 --size-kb 2048
+
+Each producer process sends `--shards` payloads of `--size-kb` to one
+consumer (this process). The manager path does what fans and the VJ do
+today: write a temp file, enqueue its path, read the file back. The shm
+path copies the bytes through the ring. Prints MB/s for both.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from shared_buffer import SharedBuffer
+from shm_buffer import ShmRingBuffer
+
+
+def _produce_paths(buf, tmp_dir, count, size):
+    payload = os.urandom(size)
+    for i in range(count):
+        with tempfile.NamedTemporaryFile(delete=False, dir=tmp_dir) as tmp:
+            tmp.write(payload)
+        while not buf.put_shard(f"p{os.getpid()}", tmp.name, timeout=1.0):
+            pass
+
+
+def _produce_bytes(buf, count, size):
+    payload = os.urandom(size)
+    for i in range(count):
+        while not buf.put_shard(f"p{os.getpid()}", payload, timeout=1.0):
+            pass
+
+
+def _consume(buf, total, read_files):
+    received = 0
+    got = 0
+    while got < total:
+        item = buf.get_shard(timeout=1.0)
+        if item is None:
+            continue
+        got += 1
+        payload = item[1]
+        if read_files:
+            with open(payload, "rb") as fh:
+                payload = fh.read()
+            os.remove(item[1])
+        received += len(payload)
+    return received
+
+
+def _run(mode, producers, shards, size, tmp_dir):
+    manager = None
+    if mode == "manager":
+        manager = multiprocessing.Manager()
+        buf = SharedBuffer(manager)
+        target, args = _produce_paths, (tmp_dir, shards, size)
+    else:
+        buf = ShmRingBuffer()
+        target, args = _produce_bytes, (shards, size)
+    try:
+        t0 = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=target, args=(buf,) + args)
+            for _ in range(producers)
+        ]
+        for p in procs:
+            p.start()
+        received = _consume(buf, producers * shards, mode == "manager")
+        elapsed = time.perf_counter() - t0
+        for p in procs:
+            p.join()
+    finally:
+        if manager is not None:
+            manager.shutdown()
+        else:
+            buf.unlink()
+    return received, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare manager-queue and shared-memory shard buffers"
+    )
+    parser.add_argument("--producers", type=int, default=8)
+    parser.add_argument(
+        "--shards", type=int, default=16, help="Shards per producer"
+    )
+    parser.add_argument(
+        "--size-kb", type=int, default=2048, help="Shard size in KiB"
+    )
+    args = parser.parse_args()
+
+    size = args.size_kb * 1024
+    print(
+        f"{args.producers} producers x {args.shards} shards"
+        f" x {args.size_kb} KiB"
+    )
+    print(f"{'backend':<10} {'seconds':>10} {'MB/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in ("manager", "shm"):
+            received, elapsed = _run(
+                mode, args.producers, args.shards, size, tmp_dir
+            )
+            rate = received / 2**20 / elapsed if elapsed > 0 else 0.0
+            print(f"{mode:<10} {elapsed:>10.3f} {rate:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Transport interface between fans and the VideoJockey.
+
+A transport carries (sender_name, payload) entries from fan processes to
+the VJ with bounded capacity. `Fan`, `VideoJockey` and `run_simulation`
+only rely on the methods below, so the Manager queue (`SharedBuffer`),
+the shared-memory ring (`ShmRingBuffer`) and the per-fan pipes
+(`PipeTransport`) are interchangeable. `make_transport()` builds one by
+name; "socket" builds the fan side of `ingest_server`, whose VJ side is
+started with `serve()`.
+
+Subclasses implement put_shard/get_shard/qsize and call
+`Transport.__init__`; the batch calls, the done signal and the
+failed-temp registry have working defaults.
+"""
+
+import multiprocessing
+import os
+import time
+
+from contextlib import suppress
+
+import config
+
+KINDS = ("manager", "shm", "pipe")
+# transports whose consumer runs a server the fans connect to
+NETWORK_KINDS = ("socket",)
+
+# delivery acknowledgements the VJ hands back to fans
+ACK_NEW = "new"
+ACK_DUPLICATE = "duplicate"
+
+
+def sender_tag(name, fan_id, token):
+    """
+    Sender field of a fan's entry: its name plus its fan id and a
+    per-delivery token. Acks are keyed by the whole tag, since fan names
+    are not unique (forked fans inherit the same Faker state), and are
+    routed by the fan id (see `AckChannels`).
+    """
+    return f"{name} #{fan_id}.{token}"
+
+
+def fan_id_of(tag):
+    """The fan id in a `sender_tag`, or None for other sender names."""
+    _, sep, rest = str(tag).rpartition(" #")
+    if not sep:
+        return None
+    try:
+        return int(rest.split(".", 1)[0])
+    except ValueError:
+        return None
+
+
+class AckChannels(object):
+    """
+    one-way pipes, one per fan id, that carry the VJ's (sender tag,
+    ACK_*) to the fan that sent the delivery
+
+    A fan blocks on its own pipe rather than polling a shared mapping,
+    and an ack that lands after the fan stopped waiting is read and
+    dropped by its next wait instead of piling up.
+    """
+
+    def __init__(self, num_fans):
+        self.__pipes = [
+            multiprocessing.Pipe(duplex=False) for _ in range(num_fans)
+        ]
+
+    def __pipe(self, tag):
+        fan_id = fan_id_of(tag)
+        if fan_id is None or not 0 <= fan_id < len(self.__pipes):
+            return None
+        return self.__pipes[fan_id]
+
+    def send(self, tag, status):
+        """Called by the VJ: ack the delivery sent as `tag`."""
+        pipe = self.__pipe(tag)
+        if pipe is not None:
+            pipe[1].send((tag, status))
+
+    def wait(self, tag, timeout=0.0):
+        """
+        The ack for the delivery sent as `tag`, waiting up to `timeout`
+        seconds; None if it has not arrived. Acks for earlier deliveries
+        of the same fan are discarded on the way.
+        """
+        pipe = self.__pipe(tag)
+        if pipe is None:
+            return None
+        reader = pipe[0]
+        deadline = time.monotonic() + timeout
+        while reader.poll(max(0.0, deadline - time.monotonic())):
+            acked, status = reader.recv()
+            if acked == tag:
+                return status
+        return None
+
+
+class Transport(object):
+    """
+    base class for fan -> VJ transports
+    """
+
+    # True when put_shard takes shard bytes rather than a temp file path
+    carries_payload = False
+    # optional flow_control.CreditGate shared by the VJ and fans
+    credits = None
+    # optional AckChannels on which the VJ sends each fan ACK_NEW or
+    # ACK_DUPLICATE for its deliveries
+    acks = None
+    # True when the transport drops duplicate shard content itself
+    dedups = False
+    # optional shard_coverage.CoverageMap: shard ids the VJ has, read by
+    # fans to pick a missing one
+    coverage = None
+
+    def __init__(self):
+        # set by the VJ once it has every shard; checked locally by fans
+        self._all_collected = multiprocessing.Event()
+
+    def bind(self, fan_id):
+        """The transport a given fan should send on."""
+        return self
+
+    def put_shard(self, sender_name, payload, timeout=5.0):
+        """Enqueue one entry; False if there is no room within
+        `timeout` seconds."""
+        raise NotImplementedError
+
+    def get_shard(self, timeout=0.1):
+        """Dequeue one (sender_name, payload), or None on timeout."""
+        raise NotImplementedError
+
+    def qsize(self):
+        raise NotImplementedError
+
+    def put_many(self, entries, timeout=5.0):
+        """Enqueue entries in order; returns how many went in."""
+        deadline = time.monotonic() + timeout
+        sent = 0
+        for sender_name, payload in entries:
+            remaining = max(0.0, deadline - time.monotonic())
+            if not self.put_shard(sender_name, payload, timeout=remaining):
+                break
+            sent += 1
+        return sent
+
+    def get_many(self, max_items, timeout=0.1):
+        """Up to `max_items` entries, waiting up to `timeout` for the
+        first one only."""
+        items = []
+        while len(items) < max_items:
+            item = self.get_shard(timeout=0.0 if items else timeout)
+            if item is None:
+                break
+            items.append(item)
+        return items
+
+    def set_all_shards_collected(self):
+        """Called by the VJ once it has every shard it needs."""
+        self._all_collected.set()
+        # keep the legacy flag in step for code that still reads it
+        flag = getattr(self, "vj_has_all_shards", None)
+        if flag is not None:
+            with suppress(EOFError, BrokenPipeError, OSError):
+                flag.value = True
+
+    def all_shards_collected(self):
+        return self._all_collected.is_set()
+
+    def wait_all_shards_collected(self, timeout=None):
+        """Block until the VJ has all shards; True if it does."""
+        return self._all_collected.wait(timeout)
+
+    def acknowledge(self, sender_name, status):
+        """Called by the VJ: the delivery sent as `sender_name` (a
+        `sender_tag`) was ACK_NEW or ACK_DUPLICATE."""
+        if self.acks is None:
+            return
+        with suppress(EOFError, BrokenPipeError, OSError):
+            self.acks.send(sender_name, status)
+
+    def delivery_status(self, sender_name, timeout=0.0):
+        """
+        The VJ's ack for the delivery sent as `sender_name`, waiting up
+        to `timeout` seconds for it; None if there is none (yet). An ack
+        is handed out once.
+        """
+        if self.acks is None:
+            return None
+        try:
+            return self.acks.wait(sender_name, timeout)
+        except (EOFError, BrokenPipeError, OSError):
+            return None
+
+    def handed_over(self, sender_name):
+        """True if a shard sent as `sender_name` that put_shard did not
+        report as delivered may still reach the VJ; its credit is then
+        settled there rather than refunded."""
+        return False
+
+    def register_failed_temp(self, temp_path):
+        """A temp file whose entry could not be enqueued. Transports
+        without a cleanup registry remove it right away."""
+        with suppress(FileNotFoundError, PermissionError, OSError):
+            os.remove(temp_path)
+
+    def get_and_clear_failed_temps(self):
+        return []
+
+    def close(self):
+        """Release resources held by the creating process."""
+
+
+def make_transport(kind=None, manager=None, num_fans=None):
+    """
+    Build the transport named `kind` (default
+    `config.SHARED_BUFFER_BACKEND`). "manager" needs a
+    multiprocessing.Manager; "pipe" makes one channel per fan;
+    "socket" connects to `config.INGEST_*`.
+    """
+    # imported here since the implementations import this module
+    from ingest_server import IngestClient
+    from pipe_transport import PipeTransport
+    from shared_buffer import SharedBuffer
+    from shm_buffer import ShmRingBuffer
+
+    if kind is None:
+        kind = getattr(config, "SHARED_BUFFER_BACKEND", "manager")
+    if kind == "manager":
+        if manager is None:
+            manager = multiprocessing.Manager()
+        return SharedBuffer(manager)
+    if kind == "shm":
+        return ShmRingBuffer()
+    if kind == "pipe":
+        return PipeTransport(num_channels=num_fans)
+    if kind == "socket":
+        return IngestClient()
+    raise ValueError(f"unknown transport {kind!r}")
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Run the same fan/VJ workload over each transport and shard size.
+Usage:
+    python transport_bench.py --fans 8 --shards 16 --size-kb 64 1024 \
+        --transports manager shm pipe
+
+Every fan process sends `--shards` shards of a given size: a temp file
+path for path transports, the bytes themselves for payload transports
+(`carries_payload`). A VJ process drains them with `get_many`, as the
+real VJ does. Reported per transport and size:
+    - throughput in MB/s (first put to last receive)
+    - p50/p99 enqueue latency: time spent inside put_shard
+    - p50/p99 dequeue latency: put returned -> VJ received the entry
+    - CPU seconds (user+sys): mean per fan, the VJ, and the Manager
+      server process when there is one (Linux /proc only)
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import transport
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _proc_cpu_seconds(pid):
+    """CPU time of another process from /proc, or None."""
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="ascii") as fh:
+            fields = fh.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf(
+            "SC_CLK_TCK"
+        )
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _fan(buf, fan_id, shards, size, tmp_dir, results):
+    buf = buf.bind(fan_id)
+    payload = os.urandom(size)
+    stamps = []
+    for i in range(shards):
+        if buf.carries_payload:
+            item = payload
+        else:
+            fd, item = tempfile.mkstemp(dir=tmp_dir)
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(payload)
+        key = f"{fan_id}:{i}"
+        t0 = time.perf_counter()
+        while not buf.put_shard(key, item, timeout=1.0):
+            pass
+        t1 = time.perf_counter()
+        stamps.append((key, t1 - t0, time.time()))
+    results.put(("fan", stamps, _cpu_seconds()))
+
+
+def _vj(buf, total, results):
+    received = {}
+    nbytes = 0
+    first = None
+    while len(received) < total:
+        for key, item in buf.get_many(total - len(received), timeout=1.0):
+            now = time.time()
+            first = first or now
+            received[key] = now
+            if isinstance(item, bytes):
+                nbytes += len(item)
+            else:
+                nbytes += os.path.getsize(item)
+                os.remove(item)
+    buf.set_all_shards_collected()
+    results.put(("vj", received, nbytes, _cpu_seconds()))
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(kind, fans, shards, size):
+    manager = multiprocessing.Manager() if kind == "manager" else None
+    buf = transport.make_transport(kind, manager, num_fans=fans)
+    results = multiprocessing.Queue()
+    tmp_dir = tempfile.mkdtemp()
+    server_pid = manager._process.pid if manager is not None else None
+    server_cpu0 = _proc_cpu_seconds(server_pid) if server_pid else None
+    try:
+        vj = multiprocessing.Process(
+            target=_vj, args=(buf, fans * shards, results)
+        )
+        vj.start()
+        t_start = time.time()
+        procs = [
+            multiprocessing.Process(
+                target=_fan, args=(buf, i, shards, size, tmp_dir, results)
+            )
+            for i in range(fans)
+        ]
+        for p in procs:
+            p.start()
+        fan_rows = []
+        vj_row = None
+        for _ in range(fans + 1):
+            row = results.get()
+            if row[0] == "vj":
+                vj_row = row
+            else:
+                fan_rows.append(row)
+        for p in procs + [vj]:
+            p.join()
+        server_cpu = None
+        if server_cpu0 is not None:
+            server_cpu = _proc_cpu_seconds(server_pid) - server_cpu0
+    finally:
+        unlink = getattr(buf, "unlink", buf.close)
+        unlink()
+        if manager is not None:
+            manager.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _, received, nbytes, vj_cpu = vj_row
+    enqueue = []
+    dequeue = []
+    for _, stamps, _ in fan_rows:
+        for key, put_seconds, put_done in stamps:
+            enqueue.append(put_seconds)
+            dequeue.append(max(0.0, received[key] - put_done))
+    elapsed = max(received.values()) - t_start
+    return {
+        "mb_s": nbytes / 2**20 / elapsed if elapsed > 0 else 0.0,
+        "enq_p50": _percentile(enqueue, 0.50),
+        "enq_p99": _percentile(enqueue, 0.99),
+        "deq_p50": _percentile(dequeue, 0.50),
+        "deq_p99": _percentile(dequeue, 0.99),
+        "fan_cpu": sum(r[2] for r in fan_rows) / len(fan_rows),
+        "vj_cpu": vj_cpu,
+        "server_cpu": server_cpu,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare transports on the same fan/VJ workload"
+    )
+    parser.add_argument("--fans", type=int, default=8)
+    parser.add_argument(
+        "--shards", type=int, default=16, help="Shards per fan"
+    )
+    parser.add_argument(
+        "--size-kb", type=int, nargs="+", default=[64, 1024]
+    )
+    parser.add_argument(
+        "--transports", nargs="+", choices=transport.KINDS, default=None
+    )
+    args = parser.parse_args()
+
+    kinds = args.transports or list(transport.KINDS)
+    print(f"{args.fans} fans x {args.shards} shards")
+    print(
+        f"{'transport':<9} {'KiB':>6} {'MB/s':>8} {'enq p50':>8}"
+        f" {'enq p99':>8} {'deq p50':>8} {'deq p99':>8}"
+        f" {'cpu fan':>8} {'cpu vj':>7} {'cpu srv':>7}"
+    )
+    for size_kb in args.size_kb:
+        for kind in kinds:
+            r = run(kind, args.fans, args.shards, size_kb * 1024)
+            srv = "-" if r["server_cpu"] is None else f"{r['server_cpu']:.2f}"
+            print(
+                f"{kind:<9} {size_kb:>6} {r['mb_s']:>8.1f}"
+                f" {r['enq_p50'] * 1e3:>8.2f} {r['enq_p99'] * 1e3:>8.2f}"
+                f" {r['deq_p50'] * 1e3:>8.2f} {r['deq_p99'] * 1e3:>8.2f}"
+                f" {r['fan_cpu']:>8.2f} {r['vj_cpu']:>7.2f} {srv:>7}"
+            )
+    print("latencies in ms, CPU in seconds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
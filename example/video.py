@@ -7,18 +7,31 @@ temp-file paths, hashing, and VLC-based playback (when not under tests).
 import hashlib
 import os
 import platform
+import shutil
 import sys
+import tempfile
 import time
 import json
+import re
 import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 from os.path import isfile, join
 
 import vlc
 
 import config
+import hash_cache
+import probe_cache
 from config import logger
 
 
+# result of one probe in probe_many: info is the full ffprobe JSON (None on
+# failure); error is the exception raised (None on success)
+ProbeResult = namedtuple("ProbeResult", ["info", "error"])
+
+
 def end_reached_cb(event, params):
     logger.info("video end reached")
     params["finish"] = True
@@ -60,7 +73,51 @@ def shake256_hash(s):
     return digest
 
 
-def file_hash(file_path):
+def shake256_stream(file, chunk_size=None):
+    """
+    Hash an open binary file in fixed-size chunks.
+
+    Digests have always been taken over the bytes decoded as latin-1 and
+    re-encoded as UTF-8 (see `file_hash`), so each chunk goes through the
+    same translation. Latin-1 maps bytes one-to-one, so chunk boundaries
+    do not change the result and peak memory stays at a few chunks.
+    """
+    if chunk_size is None:
+        chunk_size = getattr(config, "HASH_CHUNK_SIZE", 1024 * 1024)
+    m = hashlib.shake_256()
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        shake256_update(m, chunk)
+    return m.hexdigest(8)
+
+
+def shake256_update(m, chunk):
+    """
+    Feed one chunk of raw bytes to a shake_256 object the way
+    `shake256_stream` does, for callers that receive data incrementally.
+    `m.hexdigest(8)` then matches `file_hash` of the same bytes.
+    """
+    if chunk.isascii():
+        # ASCII is unchanged by the latin-1 -> UTF-8 round trip
+        m.update(chunk)
+    else:
+        m.update(chunk.decode("latin-1").encode("utf-8"))
+
+
+def file_hash(file_path, refresh=False, use_cache=True):
+    """
+    Hash a file, consulting the persistent hash cache first.
+
+    `refresh` forces a rehash (and updates the cache); `use_cache=False`
+    skips the cache entirely, e.g. for short-lived temp files.
+    """
+    identity = hash_cache.file_identity(file_path) if use_cache else None
+    if identity is not None and not refresh:
+        digest = hash_cache.lookup(identity)
+        if digest is not None:
+            return digest
 
     try:
         file = open(file_path, "rb")
@@ -70,17 +127,13 @@ def file_hash(file_path):
         )
         quit(-1)
 
-    # read the data
-    byte_data = file.read()
+    # stream the data through the hasher instead of reading it all
+    with file:
+        digest = shake256_stream(file)
 
-    # close file
-    file.close()
-
-    # convert to string
-    s = byte_data.decode("latin-1")
-
-    # calculate hash
-    digest = shake256_hash(s)
+    # keyed by the identity taken before reading, so a file modified
+    # while being hashed is rehashed next time
+    hash_cache.store(identity, digest)
 
     return digest
 
@@ -92,8 +145,7 @@ def dimensions(video_file_path):
     return (width, height)
 
 
-def probe(video_file_path):
-    """Return first video stream info via ffprobe JSON output."""
+def _ffprobe(video_file_path):
     cmd = [
         "ffprobe",
         "-v",
@@ -107,7 +159,47 @@ def probe(video_file_path):
     proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
     if proc.returncode != 0:
         raise RuntimeError(f"ffprobe failed: {proc.stderr}")
-    data = json.loads(proc.stdout)
+    return json.loads(proc.stdout)
+
+
+def probe_info(video_file_path, use_cache=True):
+    """
+    Return the full ffprobe JSON (streams and format) for a file,
+    memoized by file identity in `probe_cache`.
+    """
+    if not use_cache:
+        return _ffprobe(video_file_path)
+    return probe_cache.DEFAULT.get(video_file_path, _ffprobe)
+
+
+def probe_many(video_file_paths, max_workers=None):
+    """
+    Probe many files concurrently with at most `max_workers` ffprobe
+    processes at a time. Returns {path: ProbeResult}; a failed probe is
+    reported in its result's `error` instead of raising.
+    """
+    if max_workers is None:
+        max_workers = int(getattr(config, "PROBE_WORKERS", 8))
+    paths = list(dict.fromkeys(video_file_paths))
+    results = {}
+    if not paths:
+        return results
+
+    def _probe_one(path):
+        try:
+            return ProbeResult(probe_info(path), None)
+        except (RuntimeError, OSError, ValueError) as e:
+            return ProbeResult(None, e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for path, result in zip(paths, pool.map(_probe_one, paths)):
+            results[path] = result
+    return results
+
+
+def probe(video_file_path):
+    """Return first video stream info via ffprobe JSON output."""
+    data = probe_info(video_file_path)
     streams = data.get("streams", [])
     video_stream = next(
         (s for s in streams if s.get("codec_type") == "video"), None
@@ -117,6 +209,41 @@ def probe(video_file_path):
     return video_stream
 
 
+_DURATION = re.compile(rb"Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)")
+
+
+def parse_duration(stderr):
+    """Input duration in seconds from ffmpeg's stderr bytes, or None."""
+    m = _DURATION.search(stderr)
+    if m is None:
+        return None
+    h, mins, secs = m.groups()
+    return int(h) * 3600 + int(mins) * 60 + float(secs)
+
+
+def duration(file_path):
+    """
+    Length of a media file in seconds, or None if unknown. Read from the
+    cached ffprobe format info, or from ffmpeg's input summary where
+    ffprobe is not installed.
+    """
+    try:
+        return float(probe_info(file_path)["format"]["duration"])
+    except FileNotFoundError:
+        pass
+    except (RuntimeError, OSError, ValueError, KeyError, TypeError):
+        return None
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-i", str(file_path)],
+            capture_output=True,
+            check=False,
+        )
+    except OSError:
+        return None
+    return parse_duration(proc.stderr)
+
+
 def temp_file_path(name, ext):
     """
     creates a valid path to a temp file
@@ -167,6 +294,185 @@ def audio(name, input_video_file_path, input_audio_file_path):
     return output_file
 
 
+def ts_service_metadata():
+    """
+    ffmpeg output arguments naming the MPEG-TS service after
+    config.TS_SERVICE_NAME, prefixed with the UTF-8 charset selector when
+    config.TS_SERVICE_NAME_UTF8 is set.
+    """
+    name = getattr(config, "TS_SERVICE_NAME", "VideoSphere VJ")
+    if getattr(config, "TS_SERVICE_NAME_UTF8", False):
+        # ffmpeg writes strings starting below 0x20 as already encoded
+        name = "\x15" + name
+    return [
+        "-metadata",
+        f"service_provider={name}",
+        "-metadata",
+        f"service_name={name}",
+    ]
+
+
+def soundtrack_input_args(track=None):
+    """
+    ffmpeg input arguments for the final video's soundtrack: a track
+    pre-rendered by audio_cache, or else the source audio starting at
+    `config.AUDIO_OFFSET_SECONDS`.
+    """
+    if track is not None:
+        return ["-i", str(track)]
+    audio_offset = str(getattr(config, "AUDIO_OFFSET_SECONDS", 78))
+    return ["-ss", audio_offset, "-i", str(config.SOURCE_AUDIO_FILE_PATH)]
+
+
+def soundtrack_output_args(track=None):
+    """
+    ffmpeg output arguments for the soundtrack: a pre-rendered track is
+    copied as is; the source audio is encoded as AAC with the configured
+    fade in/out.
+    """
+    if track is not None:
+        return ["-c:a", "copy"]
+    # Build fade filter string separately to keep lines short
+    fade_in = getattr(config, "AUDIO_FADE_IN_SECONDS", 0.2)
+    fade_out = getattr(config, "AUDIO_FADE_OUT_SECONDS", 1.2)
+    fade_filter = (
+        f"afade=t=in:d={fade_in},areverse,afade=t=in:d={fade_out},"
+        "areverse"
+    )
+    audio_bitrate = str(getattr(config, "AUDIO_BITRATE", "192k"))
+    return ["-c:a", "aac", "-b:a", audio_bitrate, "-af", fade_filter]
+
+
+def concat_copy(input_paths, output_path):
+    """
+    Stream-copy concat of `input_paths` into `output_path` with the
+    concat demuxer; True on success.
+    """
+    output_path = str(output_path)
+    list_path = output_path + ".txt"
+    with open(list_path, "w", encoding="utf-8") as fh:
+        for p in input_paths:
+            escaped = str(p).replace(chr(39), chr(39) + "\\" + chr(39))
+            fh.write(f"file '{escaped}'\n")
+    cmd = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        list_path,
+        "-c",
+        "copy",
+        "-y",
+        output_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    except OSError as e:
+        logger.error("Failed to start ffmpeg concat: %s", e)
+        return False
+    finally:
+        with suppress(OSError):
+            os.remove(list_path)
+    if proc.returncode != 0:
+        logger.error(
+            "ffmpeg concat of %d files failed: %s",
+            len(input_paths),
+            proc.stderr,
+        )
+        return False
+    return True
+
+
+def _concat_workers():
+    workers = getattr(config, "CONCAT_WORKERS", None)
+    return int(workers) if workers else os.cpu_count() or 1
+
+
+def tree_concat_wanted(num_inputs):
+    """True if `num_inputs` files should be concatenated as a tree."""
+    if not getattr(config, "CONCAT_TREE_ENABLED", False):
+        return False
+    if _concat_workers() < 2:
+        return False
+    return num_inputs > int(getattr(config, "CONCAT_TREE_FAN_IN", 64))
+
+
+def tree_reduce(input_paths, work_dir, fan_in=None, max_workers=None):
+    """
+    Concatenate `input_paths` in groups of `fan_in`, with at most
+    `max_workers` ffmpeg processes at a time, then the group outputs
+    again, level by level, until no more than `fan_in` files are left.
+    Returns those files in order, for the caller's final concat, or None
+    if a group fails. Intermediates go to `work_dir`; each level's are
+    removed once the next level is built.
+    """
+    if fan_in is None:
+        fan_in = int(getattr(config, "CONCAT_TREE_FAN_IN", 64))
+    if max_workers is None:
+        max_workers = _concat_workers()
+    fan_in = max(2, fan_in)
+    # intermediates keep the inputs' container
+    ext = os.path.splitext(str(input_paths[0]))[1] if input_paths else ""
+    ext = ext or ".mp4"
+    current = [str(p) for p in input_paths]
+    created = set()
+    level = 0
+    while len(current) > fan_in:
+        groups = [
+            current[i : i + fan_in] for i in range(0, len(current), fan_in)
+        ]
+        outputs = []
+        jobs = []
+        for i, group in enumerate(groups):
+            if len(group) == 1:
+                # a lone trailing file moves up a level as is
+                outputs.append(group[0])
+                continue
+            out = os.path.join(work_dir, f"tree_{level}_{i:05d}{ext}")
+            outputs.append(out)
+            jobs.append((group, out))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            ok = list(pool.map(lambda job: concat_copy(*job), jobs))
+        for p in current:
+            if p in created and p not in outputs:
+                with suppress(OSError):
+                    os.remove(p)
+        created.update(out for _, out in jobs)
+        if not all(ok):
+            for p in created:
+                with suppress(OSError):
+                    os.remove(p)
+            return None
+        logger.debug(
+            "concat tree level %d: %d -> %d files",
+            level,
+            len(current),
+            len(outputs),
+        )
+        current = outputs
+        level += 1
+    return current
+
+
+def tree_concat(input_paths, output_path, fan_in=None, max_workers=None):
+    """
+    Stream-copy concat of `input_paths` into `output_path` through
+    `tree_reduce`; True on success.
+    """
+    tree_dir = tempfile.mkdtemp(
+        dir=os.path.dirname(str(output_path)) or None, prefix="tree_"
+    )
+    try:
+        reduced = tree_reduce(input_paths, tree_dir, fan_in, max_workers)
+        return reduced is not None and concat_copy(reduced, output_path)
+    finally:
+        shutil.rmtree(tree_dir, ignore_errors=True)
+
+
 def concat(name, *input_video_file_paths):
     """
     concatenates videos
@@ -189,33 +495,11 @@ def concat(name, *input_video_file_paths):
     print(f"\tname        : {name}")
     print("\tstatus      : processing...", end="")
     output_file = temp_file_path(name, ".mp4")
-    # Build a concat list file for demuxer
-    temp_dir = str(config.TEMP_DIR)
-    list_path = os.path.join(temp_dir, f"concat_{shake256_hash(name)}.txt")
-    with open(list_path, "w", encoding="utf-8") as fh:
-        for p in input_video_file_paths:
-            p_str = str(p)
-            fh.write(f"file '{p_str.replace("'", "'\\''")}'\n")
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-f",
-        "concat",
-        "-safe",
-        "0",
-        "-i",
-        list_path,
-        "-c",
-        "copy",
-        output_file,
-    ]
-    proc = subprocess.run(cmd, capture_output=True, text=True, check=False)
-    try:
-        os.remove(list_path)
-    except OSError:
-        pass
-    if proc.returncode != 0:
-        logger.error("ffmpeg concat failed: %s", proc.stderr)
+    if tree_concat_wanted(n):
+        ok = tree_concat(input_video_file_paths, output_file)
+    else:
+        ok = concat_copy(input_video_file_paths, output_file)
+    if not ok:
         return None
 
     print("done")
@@ -272,7 +556,21 @@ def clean_temp_directory():
                 os.remove(os.path.join(temp_dir, temp_file))
 
 
-def create_shard(input_file_path, output_file_path, start, end):
+def create_shard(
+    input_file_path,
+    output_file_path,
+    start,
+    end,
+    shard_id=None,
+    manifest=None,
+    keyframe_index=None,
+):
+    """
+    trims [start, end) of the input into output_file_path; when a
+    manifest writer and shard id are given, the new shard is recorded.
+    With a keyframe index the range is snapped to keyframes first, so the
+    stream-copy cut and the recorded times agree.
+    """
     # create output dir if needed
     dir_name = os.path.dirname(output_file_path)
     if dir_name and not os.path.exists(dir_name):
@@ -281,6 +579,8 @@ def create_shard(input_file_path, output_file_path, start, end):
     # trim with copy
     start_s = float(start)
     end_s = float(end)
+    if keyframe_index is not None:
+        start_s, end_s = keyframe_index.snap_range(start_s, end_s)
     duration = max(0.0, end_s - start_s)
     logger.info("writing %s", output_file_path)
     cmd = [
@@ -301,6 +601,10 @@ def create_shard(input_file_path, output_file_path, start, end):
         logger.error("ffmpeg trim failed: %s", proc.stderr)
         return None
 
+    if manifest is not None and shard_id is not None:
+        digest = file_hash(output_file_path)
+        manifest.add(shard_id, start_s, end_s, output_file_path, digest)
+
 
 def write(name, shard_data):
     """
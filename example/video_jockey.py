@@ -1,20 +1,43 @@
-"""VideoJockey: collects shard temp files from the shared buffer and
-composes the final video.
+"""VideoJockey: collects shard temp files (or shard bytes) from the
+shared buffer and composes the final video.
 
 Workflow:
-    1. Poll the shared buffer until the expected number of shards are
-       collected.
+    1. Poll the shared buffer until the expected number of distinct
+       shards are collected; content already received (same shard hash)
+       is dropped on arrival and the fan told its delivery was redundant.
+       Shards the manifest knows are kept in shard id order
+       (reorder_buffer), whatever order they arrive in.
     2. Write a concat list file and run ffmpeg to stitch shards and add
-       audio.
+       audio, copied from a soundtrack pre-rendered to the video's length
+       (audio_cache) when the shard durations are known. In incremental
+       mode (`config.VJ_COMPOSE_MODE`) shards are appended to a running
+       ffmpeg as they join the ready prefix of shard ids instead, and
+       only the audio mux is left once the last one lands. In HLS mode
+       (`config.VJ_OUTPUT_MODE`) each shard of the ready prefix becomes
+       a segment of a live playlist instead (hls_output), which is
+       ended once every shard is in.
     3. Clean up temp shard files and the concat list on success.
     4. Optionally auto-play the final video (macOS) if configured.
 """
 
+import hashlib
 import os
+import shutil
 import subprocess
+import tempfile
+import time
 
+from contextlib import suppress
+
+import audio_cache
 import config
+import hls_output
+import incremental_composer
+import manifest
+import transport
+import video
 from config import logger
+from reorder_buffer import ReorderBuffer
 
 
 class VideoJockey(object):
@@ -25,6 +48,29 @@ class VideoJockey(object):
     def __init__(self):
         self.__name = "Marshmello"
         self.__shards = [None]
+        # content-addressed store: shard hash -> collected file path
+        self.__store = {}
+        self.__duplicates = 0
+        self.__duplicate_bytes = 0
+        # shards expected by the last read, and the optional shared
+        # shard_coverage.CoverageMap of shard ids received
+        self.__expected = None
+        self.__coverage = None
+        # manifest hash -> shard id and -> shard length in seconds,
+        # loaded on first use
+        self.__shard_ids = None
+        self.__shard_lengths = None
+        # shards keyed by the rank of their manifest id among the ids
+        # expected (reorder_buffer.ReorderBuffer), and those without a
+        # known id in arrival order
+        self.__reorder = None
+        self.__order = []
+        self.__ranks = {}
+        self.__unordered = []
+        # incremental_composer.IncrementalComposer while one is running
+        self.__composer = None
+        # hls_output.HlsWriter in HLS output mode
+        self.__hls = None
 
     def name(self):
         return self.__name
@@ -32,47 +78,281 @@ class VideoJockey(object):
     def shards(self):
         return self.__shards
 
+    def duplicates(self):
+        """Duplicate deliveries dropped and the bytes they carried."""
+        return {
+            "duplicate_shards": self.__duplicates,
+            "duplicate_bytes": self.__duplicate_bytes,
+        }
+
+    def ready_shards(self):
+        """Shards of the contiguous id prefix 0..k-1 received so far."""
+        if self.__reorder is None:
+            return []
+        return self.__reorder.ready()
+
+    def gaps(self):
+        """Shard ids the ready prefix is waiting for."""
+        if self.__reorder is None:
+            return []
+        return [self.__order[rank] for rank in self.__reorder.gaps()]
+
     def has_all_shards(self):
         """
-        for the example code, we only check if the first shard exists
+        True once every shard id is covered (with a coverage map) or the
+        expected number of shards has been collected
         """
-        return self.__shards[0] is not None
+        if self.__coverage is not None:
+            return self.__coverage.complete()
+        if self.__expected is None or None in self.__shards:
+            return False
+        return len(self.__shards) >= self.__expected
 
-    def __read_all_shards(self, shared_buffer, total_shards):
+    def __read_all_shards(self, shared_buffer, total_shards, shard_ids=None):
         """
-        Read shards by polling the shared buffer until total_shards have
-        been collected. Uses non-blocking reads to avoid deadlocks; the
-        function returns a list of file paths that were consumed.
+        Read shards from the shared buffer until total_shards have been
+        collected. Buffers with get_many wake the VJ as soon as a shard
+        lands; others are polled with a short sleep between empty reads.
+        Event-loop ingest servers (async_ingest) collect by themselves.
+        `shard_ids` are the manifest ids the fans were handed, if known;
+        shards are ordered over those instead of the whole manifest.
         """
         collected = []
         import time
 
+        get_many = getattr(shared_buffer, "get_many", None)
+        # optional flow_control.CreditGate: grant fans credits to send
+        gate = getattr(shared_buffer, "credits", None)
+        self.__expected = total_shards
+        self.__coverage = getattr(shared_buffer, "coverage", None)
+        self.__start_reorder(shard_ids)
+        collect = getattr(shared_buffer, "collect", None)
+        if callable(collect):
+            # the server's loop owns the collection state and credits
+            for sender_name, file_path in collect(total_shards):
+                file_path = self.__admit(shared_buffer, sender_name, file_path)
+                if file_path is None:
+                    continue
+                logger.info(
+                    "%s received shard from %s -> %s",
+                    self.name(),
+                    sender_name,
+                    file_path,
+                )
+                collected.append((sender_name, file_path))
         while len(collected) < total_shards:
-            item = shared_buffer.get_shard(timeout=1.0)
-            if item is None:
-                # no slot currently available, small sleep to avoid busy
-                # spin
-                time.sleep(0.05)
-                continue
-            sender_name, file_path = item
-            logger.info(
-                "%s received shard from %s -> %s",
-                self.name(),
-                sender_name,
-                file_path,
-            )
-            collected.append((sender_name, file_path))
+            if gate is not None:
+                gate.replenish(total_shards - len(collected))
+            if callable(get_many):
+                # drain whatever is queued in as few round trips as
+                # possible; get_many sleeps until the first entry lands
+                items = get_many(total_shards - len(collected), timeout=1.0)
+            else:
+                item = shared_buffer.get_shard(timeout=1.0)
+                items = [] if item is None else [item]
+                if not items:
+                    # no slot currently available, small sleep to avoid
+                    # busy spin
+                    time.sleep(0.05)
+            for sender_name, file_path in items:
+                file_path = self.__admit(shared_buffer, sender_name, file_path)
+                if file_path is None:
+                    continue
+                logger.info(
+                    "%s received shard from %s -> %s",
+                    self.name(),
+                    sender_name,
+                    file_path,
+                )
+                collected.append((sender_name, file_path))
+            if gate is not None and items:
+                gate.consumed(len(items))
 
         # indicate to all fans that the vj has all the shards
         try:
-            shared_buffer.vj_has_all_shards.value = True
+            mark = getattr(shared_buffer, "set_all_shards_collected", None)
+            if callable(mark):
+                mark()
+            else:
+                shared_buffer.vj_has_all_shards.value = True
         except OSError as e:
             logger.warning("Failed to set completion flag: %s", e)
 
-        # store as flat list of file paths
-        self.__shards = [p for (_, p) in collected]
+        if gate is not None:
+            # wake fans still waiting for a credit so they can exit
+            gate.close()
+            logger.info("%s flow control: %s", self.name(), gate.metrics())
+
+        if self.__reorder is None:
+            # store as flat list of file paths
+            self.__shards = [p for (_, p) in collected]
+        else:
+            # in shard id order; shards the manifest does not know last
+            self.__shards = self.__reorder.items() + self.__unordered
+            if not self.__reorder.complete():
+                logger.info(
+                    "%s ready prefix %d/%d shards, gaps %s",
+                    self.name(),
+                    self.__reorder.ready_count(),
+                    self.__reorder.size(),
+                    self.gaps(),
+                )
+            # the ready prefix is handed off already; append the rest
+            self.__hand_off(self.__reorder.drain() + self.__unordered)
         return True
 
+    def __start_reorder(self, shard_ids=None):
+        """
+        Key shards by manifest id when ordering is on and ids exist: by
+        their rank among `shard_ids` when the caller knows which shards
+        were sent, else among every id up to the manifest's highest.
+        """
+        self.__reorder = None
+        self.__order = []
+        self.__ranks = {}
+        self.__unordered = []
+        if not getattr(config, "VJ_ORDER_BY_SHARD_ID", True):
+            return
+        if shard_ids is not None:
+            self.__order = sorted(set(shard_ids))
+        else:
+            ids = self.__load_shard_ids()
+            if ids:
+                self.__order = list(range(max(ids.values()) + 1))
+        if self.__order:
+            self.__ranks = {sid: i for i, sid in enumerate(self.__order)}
+            self.__reorder = ReorderBuffer(len(self.__order))
+
+    def __content_key(self, payload):
+        """
+        (shard hash, size) of a received path or payload; the hash is
+        None if the file cannot be read, so it is kept undeduplicated.
+        """
+        if isinstance(payload, bytes):
+            m = hashlib.shake_256()
+            video.shake256_update(m, payload)
+            return m.hexdigest(8), len(payload)
+        try:
+            with open(payload, "rb") as fh:
+                # temp files are short-lived; keep them out of the cache
+                return video.shake256_stream(fh), os.fstat(fh.fileno()).st_size
+        except (OSError, TypeError):
+            return None, 0
+
+    def __admit(self, shared_buffer, sender_name, payload):
+        """
+        Add one delivery to the content-addressed store and ack it.
+        Returns its file path, or None for a duplicate, whose temp file
+        is freed right away.
+        """
+        digest = None
+        # transports that dedup themselves only need the hash for the
+        # coverage map and shard id order
+        if (
+            self.__coverage is not None
+            or self.__reorder is not None
+            or not getattr(shared_buffer, "dedups", False)
+        ):
+            digest, nbytes = self.__content_key(payload)
+        if digest is not None and digest in self.__store:
+            self.__duplicates += 1
+            self.__duplicate_bytes += nbytes
+            logger.info(
+                "%s dropped duplicate shard %s from %s",
+                self.name(),
+                digest,
+                sender_name,
+            )
+            if not isinstance(payload, bytes):
+                with suppress(OSError):
+                    os.remove(payload)
+            self.__acknowledge(
+                shared_buffer, sender_name, transport.ACK_DUPLICATE
+            )
+            return None
+        if isinstance(payload, bytes):
+            # payload-carrying buffers hand over the shard bytes; ffmpeg
+            # needs them on disk for the concat demuxer
+            payload = video.write("shard", payload)
+        shard_id = None
+        if digest is not None:
+            self.__store[digest] = payload
+            shard_id = self.__load_shard_ids().get(digest)
+            self.__mark_covered(shard_id)
+        self.__acknowledge(shared_buffer, sender_name, transport.ACK_NEW)
+        self.__reassemble(shard_id, payload)
+        return payload
+
+    def __reassemble(self, shard_id, path):
+        """
+        File a new shard under its id and hand the shards that completed
+        the ready prefix to the composer.
+        """
+        if self.__reorder is None:
+            self.__hand_off([path])
+            return
+        rank = self.__ranks.get(shard_id)
+        if rank is None:
+            self.__unordered.append(path)
+            return
+        self.__reorder.add(rank, path)
+        self.__hand_off(self.__reorder.pop_ready())
+        logger.debug(
+            "%s ready prefix %d, gaps %s",
+            self.name(),
+            self.__reorder.ready_count(),
+            self.gaps(),
+        )
+
+    def __hand_off(self, paths):
+        """Pass shards, in order, to the running composer or HLS writer."""
+        for sink in (self.__composer, self.__hls):
+            if sink is not None:
+                for p in paths:
+                    sink.append(p)
+
+    def __load_shard_ids(self):
+        """Manifest hash -> shard id, loaded on first use."""
+        if self.__shard_ids is None:
+            index = manifest.default_index() or []
+            self.__shard_ids = {s.expected_hash(): s.id() for s in index}
+            self.__shard_lengths = {
+                s.expected_hash(): s.end() - s.start() for s in index
+            }
+        return self.__shard_ids
+
+    def __soundtrack(self, shard_paths):
+        """
+        Soundtrack pre-rendered to the length of `shard_paths` played in
+        a row, or None to encode it from the source audio. Lengths come
+        from the manifest, or from probing shards it does not list.
+        """
+        if not audio_cache.available():
+            return None
+        self.__load_shard_ids()
+        digests = {path: digest for digest, path in self.__store.items()}
+        total = 0.0
+        for path in shard_paths:
+            length = self.__shard_lengths.get(digests.get(path))
+            if length is None:
+                length = video.duration(path)
+            if length is None:
+                return None
+            total += length
+        return audio_cache.soundtrack(total)
+
+    def __mark_covered(self, shard_id):
+        """Set the coverage bit of a received manifest shard."""
+        if self.__coverage is None or shard_id is None:
+            return
+        if 0 <= shard_id < self.__coverage.size():
+            self.__coverage.mark(shard_id)
+
+    def __acknowledge(self, shared_buffer, sender_name, status):
+        ack = getattr(shared_buffer, "acknowledge", None)
+        if callable(ack):
+            ack(sender_name, status)
+
     def __cleanup_temp_files(self):
         """
         Clean up temp files after they've been consumed for the video
@@ -90,6 +370,30 @@ class VideoJockey(object):
                 )
         logger.debug("Cleaned up %d temp files", len(cleaned))
 
+    def __prevalidate(self, shard_paths):
+        """
+        Probe shards concurrently via video.probe_many and keep the ones
+        with a video stream. If ffprobe itself is unavailable the shards
+        are kept unchecked.
+        """
+        results = video.probe_many(shard_paths)
+        usable = []
+        for p in shard_paths:
+            info, error = results[p]
+            if isinstance(error, FileNotFoundError):
+                logger.warning("ffprobe unavailable; not validating %s", p)
+                usable.append(p)
+            elif error is not None:
+                logger.warning("Shard failed probe, skipping %s: %s", p, error)
+            elif not any(
+                s.get("codec_type") == "video"
+                for s in info.get("streams", [])
+            ):
+                logger.warning("Shard has no video stream, skipping %s", p)
+            else:
+                usable.append(p)
+        return usable
+
     def __write_video(self):
         """
         Compose received video shards into a final video using ffmpeg.
@@ -108,18 +412,46 @@ class VideoJockey(object):
             else:
                 logger.warning("Shard file missing: %s", shard_path)
 
+        # Probe the surviving shards in parallel and drop any that ffprobe
+        # cannot read or that carry no video stream
+        valid_shards = self.__prevalidate(valid_shards)
+
         if not valid_shards:
             logger.error("No valid input shards found")
             return None
 
         # Create output path
         out_path = os.path.join(str(out_dir), "final_collage.mp4")
+        track = self.__soundtrack(valid_shards)
 
+        # Concatenate large shard sets as a tree first (video.tree_reduce)
+        # so the concat list below names only the intermediates left
+        concat_inputs = valid_shards
+        tree_dir = None
+        if video.tree_concat_wanted(len(valid_shards)):
+            tree_dir = tempfile.mkdtemp(dir=str(out_dir), prefix="tree_")
+            reduced = video.tree_reduce(valid_shards, tree_dir)
+            if reduced is None:
+                logger.warning("Tree concat failed; using one flat concat")
+            else:
+                concat_inputs = reduced
+        try:
+            return self.__concat_and_mux(concat_inputs, track, out_path)
+        finally:
+            if tree_dir is not None:
+                shutil.rmtree(tree_dir, ignore_errors=True)
+
+    def __concat_and_mux(self, inputs, track, out_path):
+        """
+        Concatenate `inputs` with the concat demuxer and add the
+        soundtrack (`track`, or the source audio) into `out_path`.
+        """
+        out_dir = os.path.dirname(out_path)
         # Create a temporary file listing all the input files
         list_path = os.path.join(out_dir, "concat_list.txt")
         try:
             with open(list_path, "w", encoding="utf-8") as fh:
-                for p in valid_shards:
+                for p in inputs:
                     # FFmpeg concat demuxer requires 'file' prefix and single
                     # quotes
                     escaped = p.replace(chr(39), chr(39) + "\\" + chr(39))
@@ -129,17 +461,6 @@ class VideoJockey(object):
             return None
 
         # Build ffmpeg command with audio input (configurable via config.py)
-        # Build fade filter string separately to keep lines short
-        fade_in = getattr(config, "AUDIO_FADE_IN_SECONDS", 0.2)
-        fade_out = getattr(config, "AUDIO_FADE_OUT_SECONDS", 1.2)
-        fade_filter = (
-            f"afade=t=in:d={fade_in},areverse,afade=t=in:d={fade_out},"
-            "areverse"
-        )
-
-        audio_bitrate = str(getattr(config, "AUDIO_BITRATE", "192k"))
-        audio_offset = str(getattr(config, "AUDIO_OFFSET_SECONDS", 78))
-
         ffmpeg_cmd = [
             "ffmpeg",
             "-f",
@@ -148,18 +469,10 @@ class VideoJockey(object):
             "0",
             "-i",
             list_path,
-            "-ss",
-            audio_offset,
-            "-i",
-            str(config.SOURCE_AUDIO_FILE_PATH),
+            *video.soundtrack_input_args(track),
             "-c:v",
             "copy",
-            "-c:a",
-            "aac",
-            "-b:a",
-            audio_bitrate,
-            "-af",
-            fade_filter,
+            *video.soundtrack_output_args(track),
             "-shortest",
             "-movflags",
             "+faststart",
@@ -214,17 +527,101 @@ class VideoJockey(object):
         )
         return None
 
-    def start(self, shared_buffer, total_shards=128):
+    def __compose(self):
         """
-        1. read all shards from shared buffer
+        Finish the incremental composition if one is running, falling
+        back to the batch concat if it fails; otherwise compose in batch.
+        """
+        composer = self.__composer
+        self.__composer = None
+        if composer is None:
+            return self.__write_video()
+        out_path = os.path.join(str(config.TEMP_DIR), "final_collage.mp4")
+        if composer.finish(out_path, self.__soundtrack) is None:
+            logger.warning("Incremental composition failed; using batch")
+            return self.__write_video()
+        if composer.skipped():
+            logger.warning(
+                "Skipped %d shard(s) that failed to remux: %s",
+                len(composer.skipped()),
+                composer.skipped(),
+            )
+        self.__cleanup_temp_files()
+        return out_path
+
+    def __finish_hls(self):
+        """
+        End the HLS playlist, falling back to the batch mp4 if no segment
+        could be written. Returns the playlist (or video) path.
+        """
+        writer = self.__hls
+        self.__hls = None
+        playlist = writer.finish()
+        if playlist is None:
+            logger.warning("HLS output failed; writing the mp4 instead")
+            return self.__write_video()
+        if writer.skipped():
+            logger.warning(
+                "Skipped %d shard(s) that failed to remux: %s",
+                len(writer.skipped()),
+                writer.skipped(),
+            )
+        self.__cleanup_temp_files()
+        return playlist
+
+    def __start_output(self):
+        """Start the HLS writer or incremental composer if configured."""
+        if getattr(config, "VJ_OUTPUT_MODE", "mp4") == "hls":
+            writer = hls_output.HlsWriter()
+            try:
+                writer.start()
+            except OSError as e:
+                logger.error("Failed to start HLS output: %s", e)
+            else:
+                self.__hls = writer
+                return
+        if getattr(config, "VJ_COMPOSE_MODE", "batch") == "incremental":
+            composer = incremental_composer.IncrementalComposer()
+            if composer.start():
+                self.__composer = composer
+
+    def start(self, shared_buffer, total_shards=128, shard_ids=None):
+        """
+        1. read all shards from shared buffer (ordered over `shard_ids`,
+           the manifest ids handed to the fans, when given)
         2. if we have all shards, write the video to disk, add audio, play
            video
         """
-        has_all_shards = self.__read_all_shards(shared_buffer, total_shards)
+        self.__start_output()
+        has_all_shards = self.__read_all_shards(
+            shared_buffer, total_shards, shard_ids
+        )
+        t_last_shard = time.perf_counter()
+        counts = self.duplicates()
+        if getattr(shared_buffer, "dedups", False):
+            # the ingest server dropped duplicates before we saw them
+            stats = shared_buffer.stats()
+            counts = {k: stats.get(k, 0) for k in counts}
+        logger.info(
+            "%s run summary: %d shards, %d duplicates dropped,"
+            " %d duplicate bytes avoided",
+            self.__name,
+            len(self.__shards),
+            counts["duplicate_shards"],
+            counts["duplicate_bytes"],
+        )
         if has_all_shards:
             logger.info("*** SUCCESS! %s has shards! ***", self.__name)
             logger.info("%s writing the video", self.__name)
-            video_file_path = self.__write_video()
+            if self.__hls is not None:
+                video_file_path = self.__finish_hls()
+            else:
+                video_file_path = self.__compose()
+            logger.info(
+                "%s final file %.2fs after the last shard",
+                self.__name,
+                time.perf_counter() - t_last_shard,
+            )
             logger.info("%s writing done -> %s", self.__name, video_file_path)
             # Auto-play the final video on macOS (configurable)
             try:
@@ -237,3 +634,9 @@ class VideoJockey(object):
                     subprocess.Popen(["open", video_file_path])
             except (OSError, ValueError, TypeError) as e:
                 logger.warning("Auto-play failed: %s", e)
+        else:
+            for sink in (self.__composer, self.__hls):
+                if sink is not None:
+                    sink.abort()
+            self.__composer = None
+            self.__hls = None
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Measure how long the VJ takes to notice a shard after a fan puts it.
+Usage:
+    python vj_latency_bench.py --shards 200 --max-gap-ms 20
+
+A producer process puts `--shards` entries with random gaps and stamps
+each with its put time. The consumer collects them with either the old
+loop (get with timeout, 50 ms sleep after an empty read) or the current
+condition-driven `get_many`, and reports put -> noticed latency for all
+shards and for the last one. It also times one completion check made the
+old way (manager Value) and the new way (Event).
+"""
+import argparse
+import multiprocessing
+import queue
+import random
+import statistics
+import sys
+import time
+
+from shared_buffer import SharedBuffer
+
+
+def _produce(buf, shards, max_gap):
+    rng = random.Random(0)
+    for _ in range(shards):
+        time.sleep(rng.uniform(0, max_gap))
+        buf.put_shard("fan", repr(time.time()), timeout=5.0)
+
+
+def _legacy_collect(buf, shards):
+    """The previous VideoJockey loop over the previous get_shard."""
+    latencies = []
+    while len(latencies) < shards:
+        try:
+            item = buf._queue.get(timeout=1.0)
+        except queue.Empty:
+            item = None
+        if item is None:
+            time.sleep(0.05)
+            continue
+        # give the entry's slot back, as get_shard does
+        buf._release(1)
+        latencies.append(time.time() - float(item[1]))
+    return latencies
+
+
+def _event_collect(buf, shards):
+    latencies = []
+    while len(latencies) < shards:
+        for item in buf.get_many(shards - len(latencies), timeout=1.0):
+            latencies.append(time.time() - float(item[1]))
+    return latencies
+
+
+def _check_cost(fn, repeat=2000):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Put -> VJ notice latency, polling vs condition wakeups"
+    )
+    parser.add_argument("--shards", type=int, default=200)
+    parser.add_argument("--max-gap-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(f"{'loop':<8} {'p50 ms':>8} {'p99 ms':>8} {'last ms':>8}")
+    loops = (("poll", _legacy_collect), ("event", _event_collect))
+    for name, collect in loops:
+        manager = multiprocessing.Manager()
+        try:
+            buf = SharedBuffer(manager)
+            p = multiprocessing.Process(
+                target=_produce,
+                args=(buf, args.shards, args.max_gap_ms / 1000.0),
+            )
+            p.start()
+            in_order = [x * 1000 for x in collect(buf, args.shards)]
+            p.join()
+            lat = sorted(in_order)
+            last = in_order[-1]
+            print(
+                f"{name:<8} {statistics.median(lat):>8.2f}"
+                f" {lat[int(len(lat) * 0.99) - 1]:>8.2f} {last:>8.2f}"
+            )
+            value_cost = _check_cost(lambda: buf.vj_has_all_shards.value)
+            event_cost = _check_cost(buf.all_shards_collected)
+        finally:
+            manager.shutdown()
+
+    print(f"completion check via manager Value: {value_cost * 1e6:.1f} us")
+    print(f"completion check via Event:         {event_cost * 1e6:.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
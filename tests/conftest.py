@@ -0,0 +1,101 @@
+"""
+Shared fixtures: example/ on sys.path for every test module, a
+multiprocessing Manager, and synthetic shards and soundtracks made with
+ffmpeg.
+"""
+
+import multiprocessing
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add example/ to sys.path to import example modules
+example_dir = Path(__file__).resolve().parents[1] / "example"
+if str(example_dir) not in sys.path:
+    sys.path.insert(0, str(example_dir))
+
+import config  # noqa: E402
+
+
+@pytest.fixture
+def mp_manager():
+    mgr = multiprocessing.Manager()
+    yield mgr
+    mgr.shutdown()
+
+
+def _ffmpeg(*args):
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", *args], check=True, timeout=60
+    )
+
+
+@pytest.fixture
+def make_shard():
+    """make_shard(path, duration=1, comment=None): a 64x48 H.264 shard.
+
+    `comment` is written as metadata so shards of the same length get
+    distinct bytes and the VJ does not drop them as duplicates.
+    """
+
+    def _make(path, duration=1, comment=None):
+        metadata = [] if comment is None else ["-metadata", comment]
+        _ffmpeg(
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=size=64x48:rate=10:duration={duration}",
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            *metadata,
+            str(path),
+        )
+        return str(path)
+
+    return _make
+
+
+@pytest.fixture
+def make_song():
+    """make_song(path, duration=5): an AAC sine tone."""
+
+    def _make(path, duration=5):
+        _ffmpeg(
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=duration={duration}",
+            "-c:a",
+            "aac",
+            str(path),
+        )
+        return path
+
+    return _make
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch, make_shard, make_song):
+    """
+    Three distinct 1 s shards and a 5 s source soundtrack, with config
+    pointed at them and at scratch TEMP_DIR, HLS_DIR and audio cache
+    directories under tmp_path.
+    """
+    shards = [
+        make_shard(tmp_path / f"shard_{i:04d}.mp4", comment=f"comment={i}")
+        for i in range(3)
+    ]
+    audio = make_song(tmp_path / "song.m4a")
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.setattr(config, "SOURCE_AUDIO_FILE_PATH", audio)
+    monkeypatch.setattr(config, "AUDIO_OFFSET_SECONDS", 0)
+    monkeypatch.setattr(config, "AUDIO_CACHE_DIR", tmp_path / "audio_cache")
+    monkeypatch.setattr(config, "TEMP_DIR", work)
+    monkeypatch.setattr(config, "HLS_DIR", tmp_path / "hls")
+    return SimpleNamespace(shards=shards, work=work, audio=audio)
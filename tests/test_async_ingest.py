@@ -0,0 +1,141 @@
+import socket
+import threading
+from pathlib import Path
+
+import pytest
+
+import config
+import ingest_server
+import video_jockey as vj_mod
+from async_ingest import AsyncIngestServer
+from fan import Fan
+from flow_control import CreditGate
+from ingest_server import IngestClient
+
+
+@pytest.fixture
+def server(tmp_path):
+    srv = AsyncIngestServer(("127.0.0.1", 0), "tcp", tmp_dir=tmp_path)
+    srv.start()
+    yield srv
+    srv.close()
+
+
+def _client(srv):
+    return IngestClient(srv.address(), srv.family(), connect_timeout=5)
+
+
+def test_many_concurrent_fans(server):
+    fans = 200
+    ready = threading.Barrier(fans)
+
+    def send(i):
+        client = _client(server)
+        client._IngestClient__connect()
+        ready.wait()
+        client.put_shard(f"fan {i}", b"shard-%d" % i + b"\xff" * i, 10)
+        client.close()
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(fans)]
+    for t in threads:
+        t.start()
+    collected = server.collect(fans - 50, timeout=30)
+    for t in threads:
+        t.join(timeout=30)
+
+    assert len(collected) == fans - 50
+    for name, path in collected:
+        i = int(name.split()[1])
+        assert Path(path).read_bytes() == b"shard-%d" % i + b"\xff" * i
+    stats = server.stats()
+    assert stats["connections"] == fans
+    assert stats["dropped"] == 50
+    assert server.all_shards_collected()
+
+
+def test_bad_checksum_is_rejected(server):
+    with socket.create_connection(server.address(), timeout=5) as sock:
+        header = ingest_server.HEADER.pack(
+            ingest_server.MAGIC, ingest_server.VERSION, 3, b"0" * 16, 4
+        )
+        sock.sendall(header + b"fan" + b"data")
+        assert sock.recv(1) == ingest_server.ACK_BAD_CHECKSUM
+    assert server.stats()["checksum_failures"] == 1
+
+
+def test_credits_are_granted_from_the_loop(tmp_path):
+    srv = AsyncIngestServer(("127.0.0.1", 0), "tcp", tmp_dir=tmp_path)
+    srv.credits = CreditGate(window=2)
+    srv.start()
+    shards = []
+    for i in range(4):
+        shard = tmp_path / f"shard_{i:04d}.mp4"
+        shard.write_bytes(bytes([i]) * 1000)
+        shards.append(str(shard))
+    try:
+        # one connection per fan, as with fan processes
+        clients = [_client(srv) for _ in range(4)]
+        for client in clients:
+            client.credits = srv.credits
+        fans = [Fan(i, shards[i], verbose=False) for i in range(4)]
+        threads = [
+            threading.Thread(target=f.send_shard, args=(c,))
+            for f, c in zip(fans, clients)
+        ]
+        for t in threads:
+            t.start()
+        collected = srv.collect(3, timeout=30)
+        # the VJ closes the gate once it has everything
+        srv.credits.close()
+        for t in threads:
+            t.join(timeout=30)
+        assert len(collected) == 3
+        metrics = srv.credits.metrics()
+        assert metrics["consumed"] == 3
+        assert metrics["avoided_shards"] == 1
+        for client in clients:
+            client.close()
+    finally:
+        srv.close()
+
+
+@pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="AF_UNIX not available"
+)
+def test_vj_collects_through_the_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VJ_INGEST_MODE", "asyncio")
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    sock_path = str(tmp_path / "ingest.sock")
+    client = IngestClient(sock_path, "unix", connect_timeout=5)
+    srv = client.serve()
+    assert isinstance(srv, AsyncIngestServer)
+    try:
+        shards = []
+        for i in range(2):
+            shard = tmp_path / f"shard_{i:04d}.mp4"
+            shard.write_bytes(bytes([i, 0xE9]) * 5000)
+            shards.append(shard)
+        for i, shard in enumerate(shards):
+            Fan(i, shard_path=str(shard), verbose=False).send_shard(client)
+        vj = vj_mod.VideoJockey()
+        vj._VideoJockey__read_all_shards(srv, 2)
+        assert [Path(p).read_bytes() for p in vj.shards()] == [
+            s.read_bytes() for s in shards
+        ]
+        # late fans are told the VJ is done
+        assert not client.put_shard("late fan", str(shard), timeout=5)
+        assert client.all_shards_collected()
+        client.close()
+    finally:
+        srv.close()
+    assert not Path(sock_path).exists()
+
+
+def test_close_removes_uncollected_shards(tmp_path):
+    srv = AsyncIngestServer(("127.0.0.1", 0), "tcp", tmp_dir=tmp_path)
+    srv.start()
+    client = _client(srv)
+    assert client.put_shard("fan", b"orphan", timeout=5)
+    client.close()
+    srv.close()
+    assert not list(tmp_path.glob("ingest_*"))
@@ -0,0 +1,149 @@
+import os
+import shutil
+from unittest import mock
+
+import pytest
+
+import audio_cache
+import config
+import video
+import video_jockey as vj_mod
+
+needs_ffmpeg = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None, reason="ffmpeg not on PATH"
+)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "AUDIO_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(config, "AUDIO_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "HASH_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "AUDIO_OFFSET_SECONDS", 1)
+    monkeypatch.setattr(config, "AUDIO_FADE_IN_SECONDS", 0.5)
+    monkeypatch.setattr(config, "AUDIO_FADE_OUT_SECONDS", 0.5)
+    monkeypatch.setattr(config, "AUDIO_BITRATE", "64k")
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def song(tmp_path, monkeypatch, make_song):
+    path = make_song(tmp_path / "song.m4a", duration=6)
+    monkeypatch.setattr(config, "SOURCE_AUDIO_FILE_PATH", path)
+    return path
+
+
+def test_cache_key_covers_every_setting():
+    base = ("abc", 78.0, 1.0, 2.3, "192k", 30.0)
+    keys = {audio_cache.cache_key(*base)}
+    for i, changed in enumerate(("abd", 79.0, 1.5, 2.0, "128k", 31.0)):
+        fields = list(base)
+        fields[i] = changed
+        keys.add(audio_cache.cache_key(*fields))
+    assert len(keys) == 7
+    assert audio_cache.cache_key(*base) == audio_cache.cache_key(*base)
+
+
+@needs_ffmpeg
+def test_renders_once_then_hits(cache, song):
+    before = audio_cache.stats()
+    track = audio_cache.soundtrack(3.0)
+    assert track is not None and os.path.dirname(track) == str(cache)
+    assert video.duration(track) == pytest.approx(3.0, abs=0.1)
+    assert audio_cache.soundtrack(3.0) == track
+    # a different length is a different track
+    assert audio_cache.soundtrack(2.0) != track
+    after = audio_cache.stats()
+    assert after["misses"] - before["misses"] == 2
+    assert after["hits"] - before["hits"] == 1
+    assert not [n for n in os.listdir(cache) if n.endswith(".tmp")]
+
+
+def test_no_track_without_source_or_duration(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "SOURCE_AUDIO_FILE_PATH", tmp_path / "missing.mp3"
+    )
+    assert audio_cache.soundtrack(3.0) is None
+    (tmp_path / "song.mp3").write_bytes(b"x")
+    assert audio_cache.soundtrack(None, tmp_path / "song.mp3") is None
+    monkeypatch.setattr(config, "AUDIO_CACHE_ENABLED", False)
+    assert not audio_cache.available(tmp_path / "song.mp3")
+
+
+def test_evicts_least_recently_used(cache):
+    cache.mkdir()
+    for i, name in enumerate(("old", "mid", "new")):
+        path = cache / f"{name}.m4a"
+        path.write_bytes(b"\0" * 100)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    (cache / "render_x.tmp").write_bytes(b"\0" * 500)
+    assert audio_cache.evict(max_bytes=250, keep=str(cache / "old.m4a")) == 1
+    assert sorted(os.listdir(cache)) == [
+        "new.m4a",
+        "old.m4a",
+        "render_x.tmp",
+    ]
+    assert audio_cache.clear() == 2
+
+
+def test_write_video_copies_prepared_track(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path)
+    shards = []
+    for i in range(2):
+        path = tmp_path / f"s{i}.mp4"
+        path.write_bytes(b"%d" % i)
+        shards.append(str(path))
+    track = tmp_path / "track.m4a"
+    lengths = []
+
+    def fake_soundtrack(duration):
+        lengths.append(duration)
+        return str(track)
+
+    monkeypatch.setattr(audio_cache, "available", lambda: True)
+    monkeypatch.setattr(audio_cache, "soundtrack", fake_soundtrack)
+    monkeypatch.setattr(video, "duration", lambda path: 1.5)
+    probed = {
+        p: video.ProbeResult({"streams": [{"codec_type": "video"}]}, None)
+        for p in shards
+    }
+    monkeypatch.setattr(video, "probe_many", lambda paths: probed)
+
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__shards = list(shards)
+    captured = {}
+
+    class FakeProc:
+        stderr = []
+
+        def wait(self):
+            return 0
+
+    def fake_popen(cmd, stdout=None, stderr=None, text=None):
+        captured["cmd"] = cmd
+        return FakeProc()
+
+    with mock.patch("subprocess.Popen", side_effect=fake_popen):
+        assert vj._VideoJockey__write_video() is not None
+    cmd = captured["cmd"]
+    assert lengths == [3.0]
+    assert cmd[cmd.index(str(track)) - 1] == "-i"
+    assert cmd[cmd.index("-c:a") + 1] == "copy"
+    assert "-af" not in cmd and "-ss" not in cmd
+
+
+@needs_ffmpeg
+def test_write_video_end_to_end(
+    cache, song, tmp_path, monkeypatch, make_shard
+):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "work")
+    shards = [
+        make_shard(tmp_path / f"shard_{i}.mp4", comment=f"comment={i}")
+        for i in range(2)
+    ]
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__shards = shards
+    out = vj._VideoJockey__write_video()
+    assert out is not None
+    assert video.duration(out) == pytest.approx(2.0, abs=0.2)
+    assert len(os.listdir(cache)) == 1
@@ -1,16 +1,10 @@
 import logging
 from pathlib import Path
-import sys
 
 import pytest
 
-# Ensure project root is on sys.path so tests can import local modules
-root = Path(__file__).resolve().parents[1]
-if str(root) not in sys.path:
-    sys.path.insert(0, str(root))
-
-import config  # noqa: E402
-from fan import Fan  # noqa: E402
+import config
+from fan import Fan
 
 
 class _Flag:
@@ -0,0 +1,30 @@
+import pytest
+
+import config
+import video
+
+
+def _legacy_digest(data):
+    return video.shake256_hash(data.decode("latin-1"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 256, 1024 * 1024])
+def test_streaming_hash_matches_legacy(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(config, "HASH_CHUNK_SIZE", chunk_size)
+    # every byte value, so non-ASCII bytes straddle chunk boundaries
+    data = bytes(range(256)) * 9 + b"ascii tail"
+    p = tmp_path / "shard.bin"
+    p.write_bytes(data)
+
+    assert video.file_hash(str(p), use_cache=False) == _legacy_digest(data)
+
+
+def test_streaming_hash_empty_file(tmp_path):
+    p = tmp_path / "empty.bin"
+    p.write_bytes(b"")
+    assert video.file_hash(str(p), use_cache=False) == _legacy_digest(b"")
+
+
+def test_file_hash_missing_file_exits(tmp_path):
+    with pytest.raises(SystemExit):
+        video.file_hash(str(tmp_path / "missing.mp4"))
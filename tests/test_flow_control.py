@@ -0,0 +1,213 @@
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import config
+import manifest
+import video
+import video_jockey as vj_mod
+from fan import Fan
+from flow_control import CreditGate
+from ingest_server import IngestClient, IngestServer
+from shared_buffer import SharedBuffer
+
+
+def test_replenish_respects_window_and_remaining():
+    gate = CreditGate(window=3)
+    assert gate.replenish(remaining=10) == 3
+    assert gate.replenish(remaining=10) == 0
+    gate.consumed(2)
+    assert gate.replenish(remaining=8) == 2
+    # near the end only what is still needed is outstanding
+    gate.consumed(3)
+    assert gate.outstanding() == 0
+    assert gate.replenish(remaining=1) == 1
+    gate.refund()
+    assert gate.outstanding() == 0
+
+
+def test_acquire_waits_and_close_wakes_waiters():
+    gate = CreditGate(window=1)
+    assert not gate.acquire(timeout=0.05)
+    results = []
+    t = threading.Thread(target=lambda: results.append(gate.acquire(10)))
+    t.start()
+    # let the thread block on the credit semaphore
+    time.sleep(0.2)
+    gate.close()
+    t.join(timeout=5)
+    assert results == [False]
+    assert gate.metrics()["credit_waits"] == 2
+    gate.grant(1)
+    assert gate.metrics()["granted"] == 0
+
+
+def test_fan_does_no_io_once_gate_is_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    shard = tmp_path / "shard_0000.mp4"
+    shard.write_bytes(b"x" * 1234)
+
+    class _Buffer:
+        credits = CreditGate(window=1)
+
+        def put_shard(self, *args, **kwargs):
+            raise AssertionError("no credit, no put")
+
+    buf = _Buffer()
+    buf.credits.close()
+    Fan(0, shard_path=str(shard)).send_shard(buf)
+    assert not (tmp_path / "temp").exists()
+    metrics = buf.credits.metrics()
+    assert metrics["avoided_shards"] == 1
+    assert metrics["avoided_bytes"] == 1234
+
+
+class _GatedBuffer:
+    def __init__(self):
+        self.credits = CreditGate(window=1)
+        self.puts = []
+
+    def put_shard(self, sender_name, item, timeout=None):
+        self.puts.append(item)
+        return True
+
+
+def test_closed_gate_does_not_hash_indexed_shard(tmp_path, monkeypatch):
+    shards_dir = tmp_path / "video_shards"
+    shards_dir.mkdir()
+    monkeypatch.setattr(config, "SHARDS_DIR", shards_dir)
+    monkeypatch.setattr(
+        config, "SHARDS_JSON_FILE_PATH", shards_dir / "shards.json"
+    )
+    monkeypatch.setattr(config, "HASH_CACHE_ENABLED", False)
+    monkeypatch.setattr(config, "NUM_SHARDS", 1)
+    shard = shards_dir / "shard_0000.mp4"
+    shard.write_bytes(b"x" * 777)
+    manifest.ManifestWriter().add(0, 0.0, 2.0, shard, video.file_hash(shard))
+
+    hashed = []
+    monkeypatch.setattr(
+        video, "file_hash", lambda *a, **kw: hashed.append(a) or "h"
+    )
+    gate = CreditGate(window=1)
+    gate.close()
+    buf = _GatedBuffer()
+    buf.credits = gate
+    Fan(0).send_shard(buf)
+    assert hashed == []
+    assert gate.metrics()["avoided_bytes"] == 777
+
+
+def test_failed_temp_write_refunds_credit(tmp_path, monkeypatch):
+    # TEMP_DIR is a file, so creating the temp dir fails
+    (tmp_path / "temp").write_bytes(b"")
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    buf = _GatedBuffer()
+    assert buf.credits.replenish(remaining=1) == 1
+    Fan(0, shard_path=str(tmp_path / "missing.mp4")).send_shard(buf)
+    assert buf.puts == []
+    assert buf.credits.outstanding() == 0
+    assert buf.credits.replenish(remaining=1) == 1
+
+
+def test_unexpected_error_refunds_credit(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    buf = _GatedBuffer()
+    buf.credits.replenish(remaining=1)
+    fan = Fan(0, shard_path=str(tmp_path / "missing.mp4"))
+    monkeypatch.setattr(
+        fan,
+        "_Fan__write_temp",
+        lambda tmp_dir: (_ for _ in ()).throw(RuntimeError("boom")),
+    )
+    with pytest.raises(RuntimeError):
+        fan.send_shard(buf)
+    assert buf.credits.outstanding() == 0
+
+
+def test_delivered_shard_keeps_its_credit(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    buf = _GatedBuffer()
+    buf.credits.replenish(remaining=1)
+    Fan(0, shard_path=str(tmp_path / "missing.mp4")).send_shard(buf)
+    assert len(buf.puts) == 1
+    # returned only when the VJ consumes the shard
+    assert buf.credits.outstanding() == 1
+
+
+def test_ack_timeout_does_not_refund_a_queued_shard(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    srv = IngestServer(
+        ("127.0.0.1", 0), "tcp", capacity=1, tmp_dir=tmp_path / "in"
+    )
+    srv.credits = CreditGate(window=2)
+    srv.start()
+    try:
+        assert srv.credits.replenish(remaining=2) == 2
+        paths = []
+        for i in range(2):
+            path = tmp_path / f"shard_{i:04d}.mp4"
+            path.write_bytes(bytes([i]) * 1000)
+            paths.append(str(path))
+        clients = []
+        for _ in paths:
+            client = IngestClient(srv.address(), "tcp", connect_timeout=5)
+            client.credits = srv.credits
+            clients.append(client)
+        # the first shard fills the server's queue
+        Fan(0, shard_path=paths[0], verbose=False).send_shard(clients[0])
+        # the second is queued behind it, but its ack never comes in time
+        real = clients[1].put_shard
+        monkeypatch.setattr(
+            clients[1],
+            "put_shard",
+            lambda name, payload, timeout: real(name, payload, 0.05),
+        )
+        Fan(1, shard_path=paths[1], verbose=False).send_shard(clients[1])
+        for _ in paths:
+            assert srv.get_shard(timeout=5) is not None
+            srv.credits.consumed(1)
+        assert srv.credits.outstanding() == 0
+        for client in clients:
+            client.close()
+    finally:
+        srv.close()
+
+
+def _fan(buf, i, shard_path):
+    Fan(i, shard_path=shard_path, verbose=False).send_shard(buf)
+
+
+def test_surplus_fans_skip_their_shards(tmp_path, monkeypatch, mp_manager):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    shards = []
+    for i in range(6):
+        shard = tmp_path / f"shard_{i:04d}.mp4"
+        shard.write_bytes(bytes([i]) * 500)
+        shards.append(str(shard))
+    buf = SharedBuffer(mp_manager)
+    buf.credits = CreditGate(window=2)
+
+    procs = [
+        multiprocessing.Process(target=_fan, args=(buf, i, shards[i]))
+        for i in range(6)
+    ]
+    for p in procs:
+        p.start()
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(buf, 3)
+    for p in procs:
+        p.join(timeout=20)
+        assert p.exitcode == 0
+
+    metrics = buf.credits.metrics()
+    assert metrics["consumed"] == 3
+    assert metrics["avoided_shards"] == 3
+    assert metrics["avoided_bytes"] == 3 * 500
+    # only the collected shards ever reached the temp dir
+    assert sorted(Path(p).name for p in vj.shards()) == sorted(
+        p.name for p in (tmp_path / "temp").iterdir()
+    )
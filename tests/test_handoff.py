@@ -0,0 +1,85 @@
+import errno
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+import config
+import handoff
+from fan import Fan
+
+PAYLOAD = os.urandom(300 * 1024) + b"tail"
+
+
+@pytest.fixture
+def shard(tmp_path):
+    p = tmp_path / "store" / "shard_0000.mp4"
+    p.parent.mkdir()
+    p.write_bytes(PAYLOAD)
+    return p
+
+
+@pytest.mark.parametrize("mode", ["copy_file_range", "sendfile", "copy"])
+def test_copy_modes_produce_identical_files(shard, tmp_path, mode):
+    if mode != "copy" and not hasattr(os, mode):
+        pytest.skip(f"os.{mode} unavailable")
+    dst, used = handoff.handoff(shard, tmp_path / "temp", modes=(mode,))
+    assert used == mode
+    assert Path(dst).read_bytes() == PAYLOAD
+    assert os.stat(dst).st_ino != os.stat(shard).st_ino
+
+
+def test_hardlink_is_preferred_on_same_filesystem(shard, tmp_path):
+    dst, used = handoff.handoff(shard, tmp_path / "temp")
+    assert used == "hardlink"
+    assert os.stat(dst).st_ino == os.stat(shard).st_ino
+    # removing the temp (as the VJ does) keeps the shard store intact
+    os.remove(dst)
+    assert shard.read_bytes() == PAYLOAD
+
+
+def test_falls_through_failing_modes(shard, tmp_path):
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "cross-device link")
+
+    with mock.patch.dict(
+        handoff._HANDLERS,
+        {"hardlink": cross_device, "reflink": cross_device},
+    ):
+        dst, used = handoff.handoff(
+            shard, tmp_path / "temp", modes=("hardlink", "reflink", "copy")
+        )
+    assert used == "copy"
+    assert Path(dst).read_bytes() == PAYLOAD
+    assert os.listdir(tmp_path / "temp") == [os.path.basename(dst)]
+
+
+def test_missing_source_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        handoff.handoff(tmp_path / "nope.mp4", tmp_path / "temp")
+
+
+class _Buffer:
+    def __init__(self):
+        self.vj_has_all_shards = mock.Mock(value=False)
+        self.items = []
+
+    def put_shard(self, name, path, timeout=None):
+        self.items.append(path)
+        return True
+
+
+def test_fan_hands_off_real_shards_and_writes_dummies(
+    shard, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    buf = _Buffer()
+
+    with mock.patch.object(Fan, "read_random_shard") as read:
+        Fan(0, shard_path=str(shard), verbose=False).send_shard(buf)
+        read.assert_not_called()
+    assert Path(buf.items[0]).read_bytes() == PAYLOAD
+
+    Fan(1, shard_path=str(tmp_path / "missing.mp4")).send_shard(buf)
+    assert Path(buf.items[1]).read_bytes().startswith(b"dummy-shard-1-")
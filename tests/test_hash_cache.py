@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+import config
+import hash_cache
+import video
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = tmp_path / "cache" / "hash_cache.sqlite3"
+    monkeypatch.setattr(config, "HASH_CACHE_PATH", path)
+    monkeypatch.setattr(config, "HASH_CACHE_ENABLED", True)
+    return path
+
+
+@pytest.fixture
+def stream_calls(monkeypatch):
+    calls = []
+    real_stream = video.shake256_stream
+
+    def counting_stream(file, chunk_size=None):
+        calls.append(file.name)
+        return real_stream(file, chunk_size)
+
+    monkeypatch.setattr(video, "shake256_stream", counting_stream)
+    return calls
+
+
+def test_second_hash_is_served_from_cache(cache_path, stream_calls, tmp_path):
+    p = tmp_path / "shard.mp4"
+    p.write_bytes(b"shard bytes")
+
+    first = video.file_hash(str(p))
+    second = video.file_hash(str(p))
+
+    assert first == second
+    assert len(stream_calls) == 1
+    assert cache_path.exists()
+
+
+def test_modified_file_is_rehashed(cache_path, stream_calls, tmp_path):
+    p = tmp_path / "shard.mp4"
+    p.write_bytes(b"original")
+    first = video.file_hash(str(p))
+
+    p.write_bytes(b"changed!!")
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    second = video.file_hash(str(p))
+
+    assert first != second
+    assert len(stream_calls) == 2
+
+
+def test_refresh_and_invalidate_force_recheck(
+    cache_path, stream_calls, tmp_path
+):
+    p = tmp_path / "shard.mp4"
+    p.write_bytes(b"payload")
+
+    video.file_hash(str(p))
+    video.file_hash(str(p), refresh=True)
+    assert len(stream_calls) == 2
+
+    hash_cache.invalidate(str(p))
+    video.file_hash(str(p))
+    assert len(stream_calls) == 3
+
+    video.file_hash(str(p), use_cache=False)
+    assert len(stream_calls) == 4
+
+
+def test_temp_files_are_not_cached(
+    cache_path, stream_calls, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    (tmp_path / "temp").mkdir()
+    p = tmp_path / "temp" / "shard_abc.mp4"
+    p.write_bytes(b"temp shard")
+    assert video.file_hash(str(p)) == video.file_hash(str(p))
+    assert len(stream_calls) == 2
+    # the database is never even opened for them
+    assert not cache_path.exists()
+
+
+def test_prune_drops_missing_files(cache_path, tmp_path):
+    keep = tmp_path / "keep.mp4"
+    gone = tmp_path / "gone.mp4"
+    keep.write_bytes(b"k")
+    gone.write_bytes(b"g")
+    video.file_hash(str(keep))
+    video.file_hash(str(gone))
+    gone.unlink()
+
+    assert hash_cache.prune() == 1
+    assert hash_cache.lookup(hash_cache.file_identity(str(keep)))
+
+
+def test_unwritable_cache_falls_back_to_hashing(monkeypatch, tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_bytes(b"")
+    monkeypatch.setattr(
+        config, "HASH_CACHE_PATH", blocker / "hash_cache.sqlite3"
+    )
+    p = tmp_path / "shard.mp4"
+    p.write_bytes(b"payload")
+
+    assert video.file_hash(str(p)) == video.shake256_hash("payload")
+
+
+def _store_many(db_path, paths):
+    config.HASH_CACHE_PATH = db_path
+    for p in paths:
+        video.file_hash(p)
+
+
+def test_concurrent_processes_share_cache(cache_path, tmp_path):
+    paths = []
+    for i in range(40):
+        p = tmp_path / f"shard_{i:04d}.mp4"
+        p.write_bytes(f"shard {i}".encode())
+        paths.append(str(p))
+
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(target=_store_many, args=(cache_path, paths[i::4]))
+        for i in range(4)
+    ]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(timeout=60)
+        assert proc.exitcode == 0
+
+    for p in paths:
+        digest = hash_cache.lookup(hash_cache.file_identity(p))
+        assert digest == video.shake256_hash(Path(p).read_text())
+
+
+def test_connect_retries_locked_setup(cache_path, monkeypatch):
+    real_connect = hash_cache.sqlite3.connect
+    calls = {"n": 0}
+
+    class _Flaky(object):
+        def __init__(self, conn):
+            self.conn = conn
+
+        def execute(self, sql, *args):
+            if sql.startswith("PRAGMA journal_mode") and calls["n"] < 2:
+                calls["n"] += 1
+                raise sqlite3.OperationalError("database is locked")
+            return self.conn.execute(sql, *args)
+
+        def close(self):
+            self.conn.close()
+
+    monkeypatch.setattr(
+        hash_cache.sqlite3,
+        "connect",
+        lambda *a, **kw: _Flaky(real_connect(*a, **kw)),
+    )
+    monkeypatch.setattr(hash_cache, "_local", threading.local())
+    conn = hash_cache._connect()
+    assert calls["n"] == 2
+    conn.execute("SELECT count(*) FROM file_hashes")
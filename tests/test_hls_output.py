@@ -0,0 +1,106 @@
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import config
+import video
+import video_jockey as vj_mod
+from hls_output import HlsWriter
+from shared_buffer import SharedBuffer
+
+needs_ffmpeg = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None, reason="ffmpeg not on PATH"
+)
+
+
+def _playlist_duration(playlist):
+    """Duration of the whole playlist as ffprobe (or ffmpeg) reads it."""
+    if shutil.which("ffprobe"):
+        out = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "csv=p=0",
+                str(playlist),
+            ],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        return float(out.stdout)
+    out = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-i", str(playlist)],
+        capture_output=True,
+        timeout=60,
+    )
+    return video.parse_duration(out.stderr)
+
+
+def test_parse_duration():
+    assert video.parse_duration(b"  Duration: 00:01:02.50, start") == 62.5
+    assert video.parse_duration(b"no input") is None
+
+
+@needs_ffmpeg
+def test_live_playlist_grows_and_ends(media, tmp_path):
+    writer = HlsWriter()
+    writer.start()
+    playlist = Path(writer.playlist())
+    assert "#EXT-X-ENDLIST" not in playlist.read_text()
+
+    writer.append(media.shards[0])
+    writer.append(tmp_path / "missing.mp4")
+    writer.append(media.shards[1])
+    writer.abort()
+    live = playlist.read_text()
+    # readable while still open
+    assert live.count("#EXTINF:") == 2
+    assert "#EXT-X-PLAYLIST-TYPE:EVENT" in live
+    assert "#EXT-X-ENDLIST" not in live
+    assert writer.skipped() == [str(tmp_path / "missing.mp4")]
+
+
+@needs_ffmpeg
+def test_finished_playlist_plays_through(media):
+    writer = HlsWriter()
+    writer.start()
+    for path in media.shards:
+        writer.append(path)
+    playlist = writer.finish()
+    text = Path(playlist).read_text()
+    assert text.rstrip().endswith("#EXT-X-ENDLIST")
+    names = [name for name, _ in writer.segments()]
+    assert names == [f"segment_{i:05d}.ts" for i in range(3)]
+    assert all(name in text for name in names)
+    assert _playlist_duration(playlist) == pytest.approx(3.0, abs=0.2)
+
+
+def test_finish_without_segments(tmp_path):
+    writer = HlsWriter(tmp_path / "hls")
+    writer.start()
+    assert writer.finish() is None
+
+
+@needs_ffmpeg
+def test_vj_hls_mode(media, tmp_path, monkeypatch, mp_manager):
+    monkeypatch.setattr(config, "VJ_OUTPUT_MODE", "hls")
+    monkeypatch.setattr(config, "AUTO_PLAY_FINAL_VIDEO", False)
+    buf = SharedBuffer(mp_manager)
+    for i, path in enumerate(media.shards):
+        temp = tmp_path / f"in_{i}.mp4"
+        shutil.copyfile(path, temp)
+        assert buf.put_shard(f"fan {i}", str(temp), timeout=0.5)
+    vj_mod.VideoJockey().start(buf, len(media.shards))
+    playlist = tmp_path / "hls" / "index.m3u8"
+    text = playlist.read_text()
+    assert len(re.findall(r"^#EXTINF:", text, re.M)) == 3
+    assert "#EXT-X-ENDLIST" in text
+    assert not (tmp_path / "work" / "final_collage.mp4").exists()
+    assert not list(tmp_path.glob("in_*.mp4"))
@@ -0,0 +1,115 @@
+import os
+import shutil
+
+import pytest
+
+import config
+import video
+import video_jockey as vj_mod
+from incremental_composer import IncrementalComposer
+from shared_buffer import SharedBuffer
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None, reason="ffmpeg not on PATH"
+)
+
+
+def test_service_name_is_plain_ascii(monkeypatch):
+    monkeypatch.setattr(config, "TS_SERVICE_NAME_UTF8", False)
+    args = video.ts_service_metadata()
+    assert args[-1] == f"service_name={config.TS_SERVICE_NAME}"
+    assert config.TS_SERVICE_NAME.isascii()
+
+
+def test_utf8_flag_only_adds_the_charset_selector(monkeypatch):
+    monkeypatch.setattr(config, "TS_SERVICE_NAME_UTF8", True)
+    args = video.ts_service_metadata()
+    assert args[-1] == f"service_name=\x15{config.TS_SERVICE_NAME}"
+
+
+def test_append_and_finish(media):
+    shards, work = media.shards, media.work
+    composer = IncrementalComposer(work)
+    assert composer.start()
+    for path in shards:
+        composer.append(path)
+    out = composer.finish(work / "out.mp4")
+    assert out == str(work / "out.mp4")
+    assert os.path.getsize(out) > 0
+    assert composer.appended() == shards
+    assert composer.skipped() == []
+    # only the final file is left behind
+    assert os.listdir(work) == ["out.mp4"]
+
+
+def test_bad_shard_is_skipped(media, tmp_path):
+    shards, work = media.shards, media.work
+    bad = tmp_path / "bad.mp4"
+    bad.write_bytes(b"not a video")
+    composer = IncrementalComposer(work)
+    assert composer.start()
+    for path in (shards[0], str(bad), shards[1]):
+        composer.append(path)
+    assert composer.finish(work / "out.mp4") is not None
+    assert composer.appended() == shards[:2]
+    assert composer.skipped() == [str(bad)]
+
+
+def test_abort_removes_intermediate(media):
+    shards, work = media.shards, media.work
+    composer = IncrementalComposer(work)
+    assert composer.start()
+    composer.append(shards[0])
+    composer.abort()
+    assert not os.path.exists(composer.intermediate())
+    assert os.listdir(work) == []
+
+
+def test_finish_without_shards_fails(media):
+    work = media.work
+    composer = IncrementalComposer(work)
+    assert composer.start()
+    assert composer.finish(work / "out.mp4") is None
+    assert os.listdir(work) == []
+
+
+def _run_vj(shards, tmp_path, manager):
+    buf = SharedBuffer(manager)
+    for i, path in enumerate(shards):
+        temp = tmp_path / f"in_{i}.mp4"
+        shutil.copyfile(path, temp)
+        assert buf.put_shard(f"fan {i}", str(temp), timeout=0.5)
+    vj = vj_mod.VideoJockey()
+    vj.start(buf, len(shards))
+    return vj
+
+
+def test_vj_incremental_mode(media, tmp_path, monkeypatch, mp_manager):
+    shards, work = media.shards, media.work
+    monkeypatch.setattr(config, "VJ_COMPOSE_MODE", "incremental")
+    monkeypatch.setattr(config, "AUTO_PLAY_FINAL_VIDEO", False)
+    _run_vj(shards, tmp_path, mp_manager)
+    assert (work / "final_collage.mp4").stat().st_size > 0
+    # the received temp shards are cleaned up as in batch mode
+    assert not list(tmp_path.glob("in_*.mp4"))
+
+
+def test_vj_falls_back_to_batch(media, tmp_path, monkeypatch, mp_manager):
+    shards, work = media.shards, media.work
+    monkeypatch.setattr(config, "VJ_COMPOSE_MODE", "incremental")
+    monkeypatch.setattr(config, "AUTO_PLAY_FINAL_VIDEO", False)
+    monkeypatch.setattr(
+        IncrementalComposer, "finish", lambda self, *args: None
+    )
+    batch = []
+    orig = vj_mod.VideoJockey._VideoJockey__write_video
+
+    def _write_video(self):
+        batch.append(True)
+        return orig(self)
+
+    monkeypatch.setattr(
+        vj_mod.VideoJockey, "_VideoJockey__write_video", _write_video
+    )
+    _run_vj(shards, tmp_path, mp_manager)
+    assert batch == [True]
@@ -0,0 +1,173 @@
+import hashlib
+import socket
+import threading
+from pathlib import Path
+
+import pytest
+
+import ingest_server
+import video
+import video_jockey as vj_mod
+from fan import Fan
+from ingest_server import IngestClient, IngestServer
+
+
+def _server(tmp_path, capacity):
+    srv = IngestServer(
+        ("127.0.0.1", 0), "tcp", capacity=capacity, tmp_dir=tmp_path
+    )
+    return srv.start()
+
+
+@pytest.fixture
+def server(tmp_path):
+    srv = _server(tmp_path, capacity=64)
+    yield srv
+    srv.close()
+
+
+def _client(srv):
+    return IngestClient(srv.address(), srv.family(), connect_timeout=5)
+
+
+def _drain(srv, n):
+    got = []
+    while len(got) < n:
+        item = srv.get_shard(timeout=5)
+        assert item is not None
+        got.append(item)
+    return got
+
+
+def test_concurrent_senders_over_loopback(server, tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    shards = []
+    for i in range(8):
+        shard = src / f"shard_{i:04d}.mp4"
+        shard.write_bytes(bytes([i]) * (70000 + i) + b"\xe9\xff")
+        shards.append(shard)
+
+    def send(i):
+        client = _client(server)
+        assert client.put_shard(f"fan {i}", str(shards[i]), timeout=5)
+        assert client.put_shard(f"fan {i}", b"dummy-%d" % i, timeout=5)
+        client.close()
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    received = _drain(server, 16)
+    for t in threads:
+        t.join(timeout=10)
+
+    by_name = {}
+    for name, path in received:
+        by_name.setdefault(name, []).append(Path(path).read_bytes())
+    for i in range(8):
+        assert sorted(by_name[f"fan {i}"]) == sorted(
+            [shards[i].read_bytes(), b"dummy-%d" % i]
+        )
+    stats = server.stats()
+    assert stats["connections"] == 8
+    assert stats["frames"] == 16
+    assert stats["checksum_failures"] == 0
+
+
+def test_bad_checksum_is_rejected(server, tmp_path):
+    payload = b"payload"
+    with socket.create_connection(server.address(), timeout=5) as sock:
+        header = ingest_server.HEADER.pack(
+            ingest_server.MAGIC, ingest_server.VERSION, 3, b"0" * 16, 7
+        )
+        sock.sendall(header + b"fan" + payload)
+        assert sock.recv(1) == ingest_server.ACK_BAD_CHECKSUM
+        # the connection stays usable for a resend
+        m = hashlib.shake_256()
+        video.shake256_update(m, payload)
+        header = ingest_server.HEADER.pack(
+            ingest_server.MAGIC,
+            ingest_server.VERSION,
+            3,
+            m.hexdigest(8).encode("ascii"),
+            7,
+        )
+        sock.sendall(header + b"fan" + payload)
+        assert sock.recv(1) == ingest_server.ACK_OK
+    assert server.stats()["checksum_failures"] == 1
+    name, path = server.get_shard(timeout=1)
+    assert Path(path).read_bytes() == payload
+    assert [p.name for p in tmp_path.glob("ingest_*")] == [Path(path).name]
+
+
+def test_backpressure_holds_the_ack(tmp_path):
+    srv = _server(tmp_path, capacity=1)
+    try:
+        client = _client(srv)
+        assert client.put_shard("fan", b"one", timeout=5)
+        # the queue is full: the frame arrives but is not acked
+        assert not client.put_shard("fan", b"two", timeout=0.3)
+        assert srv.get_shard(timeout=1)[0] == "fan"
+        # retrying waits for the pending ack rather than resending
+        assert client.put_shard("fan", b"two", timeout=5)
+        assert Path(srv.get_shard(timeout=1)[1]).read_bytes() == b"two"
+        assert srv.stats()["frames"] == 2
+        client.close()
+    finally:
+        srv.close()
+
+
+def test_done_ack_stops_the_client(tmp_path):
+    srv = _server(tmp_path, capacity=1)
+    try:
+        client = _client(srv)
+        assert client.put_shard("fan", b"one", timeout=5)
+        srv.set_all_shards_collected()
+        assert not client.put_shard("fan", b"two", timeout=5)
+        assert client.all_shards_collected()
+        assert srv.stats()["dropped"] == 1
+        client.close()
+    finally:
+        srv.close()
+    # unread shards are removed on close
+    assert not list(tmp_path.glob("ingest_*"))
+
+
+@pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="AF_UNIX not available"
+)
+def test_unix_socket_and_vj(tmp_path):
+    sock_path = str(tmp_path / "ingest.sock")
+    srv = IngestServer(sock_path, "unix", tmp_dir=tmp_path / "temp")
+    srv.start()
+    try:
+        shards = []
+        for i in range(2):
+            shard = tmp_path / f"shard_{i:04d}.mp4"
+            shard.write_bytes(bytes([i, 1]) * 5000)
+            shards.append(shard)
+        client = IngestClient(sock_path, "unix", connect_timeout=5)
+        for i, shard in enumerate(shards):
+            Fan(i, shard_path=str(shard), verbose=False).send_shard(client)
+        vj = vj_mod.VideoJockey()
+        vj._VideoJockey__read_all_shards(srv, 2)
+        assert [Path(p).read_bytes() for p in vj.shards()] == [
+            s.read_bytes() for s in shards
+        ]
+        client.close()
+    finally:
+        srv.close()
+    assert not Path(sock_path).exists()
+
+
+def test_client_state_drops_its_socket(server):
+    client = _client(server)
+    assert client.put_shard("fan", b"x", timeout=5)
+    # fan processes each open their own connection
+    assert client.__getstate__()["_IngestClient__sock"] is None
+    client.close()
+
+
+def test_unknown_family():
+    with pytest.raises(ValueError):
+        ingest_server.default_address("carrier-pigeon")
@@ -0,0 +1,108 @@
+import os
+from unittest import mock
+
+import pytest
+
+import keyframes
+import video
+
+PACKETS = (
+    "0.000000,K__\n"
+    "0.040000,___\n"
+    "2.000000,K__\n"
+    "N/A,K__\n"
+    "2.040000,___\n"
+    "4.000000,K_\n"
+    "6.000000,K__\n"
+)
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(keyframes, "_loaded", {})
+    p = tmp_path / "src.mp4"
+    p.write_bytes(b"not really a video")
+    return p
+
+
+def _ffprobe_ok():
+    return mock.Mock(returncode=0, stdout=PACKETS, stderr="")
+
+
+def test_scan_keeps_only_keyframes():
+    with mock.patch("subprocess.run", return_value=_ffprobe_ok()):
+        assert keyframes.scan("src.mp4") == [0.0, 2.0, 4.0, 6.0]
+
+
+def test_scan_failure_raises():
+    failed = mock.Mock(returncode=1, stdout="", stderr="boom")
+    with mock.patch("subprocess.run", return_value=failed):
+        with pytest.raises(RuntimeError):
+            keyframes.scan("src.mp4")
+
+
+def test_load_scans_once_and_reuses_sidecar(source, monkeypatch):
+    with mock.patch("subprocess.run", return_value=_ffprobe_ok()) as run:
+        first = keyframes.load(source)
+        keyframes.load(source)
+        assert run.call_count == 1
+
+        # a new process (empty memo) reads the sidecar instead of probing
+        monkeypatch.setattr(keyframes, "_loaded", {})
+        second = keyframes.load(source)
+        assert run.call_count == 1
+
+    assert os.path.exists(keyframes.sidecar_path(source))
+    assert first.times() == second.times() == [0.0, 2.0, 4.0, 6.0]
+
+
+def test_load_rescans_when_source_changes(source, monkeypatch):
+    with mock.patch("subprocess.run", return_value=_ffprobe_ok()) as run:
+        keyframes.load(source)
+        source.write_bytes(b"a different, longer video file")
+        keyframes.load(source)
+        assert run.call_count == 2
+        keyframes.load(source, rebuild=True)
+        assert run.call_count == 3
+
+
+def test_snap_modes():
+    index = keyframes.KeyframeIndex([4.0, 0.0, 2.0])
+    assert index.snap(2.0) == 2.0
+    assert index.snap(2.9) == 2.0
+    assert index.snap(3.1) == 4.0
+    assert index.snap(2.9, mode="after") == 4.0
+    assert index.snap(3.1, mode="before") == 2.0
+    assert index.snap(-1.0) == 0.0
+    assert index.snap(9.0) == 4.0
+    assert keyframes.KeyframeIndex([]).snap(1.5) == 1.5
+
+
+def test_snap_range_keeps_tail_end():
+    index = keyframes.KeyframeIndex([0.0, 2.0, 4.0])
+    assert index.snap_range(1.9, 3.8) == (2.0, 4.0)
+    assert index.snap_range(3.9, 5.5) == (4.0, 5.5)
+
+
+def test_plan_snaps_and_collapses_boundaries():
+    index = keyframes.KeyframeIndex([0.0, 2.0, 4.0, 6.0])
+    assert index.plan(4, 8.0) == [
+        (0.0, 2.0),
+        (2.0, 4.0),
+        (4.0, 6.0),
+        (6.0, 8.0),
+    ]
+    # eight requested cuts only have three inner keyframes to land on
+    assert len(index.plan(8, 8.0)) == 4
+
+
+def test_create_shard_snaps_to_keyframes(tmp_path):
+    index = keyframes.KeyframeIndex([0.0, 2.0, 4.0])
+    with mock.patch("subprocess.run") as run:
+        run.return_value.returncode = 0
+        video.create_shard(
+            "src.mp4", str(tmp_path / "o.mp4"), 1.9, 3.7, keyframe_index=index
+        )
+    cmd = run.call_args[0][0]
+    assert cmd[cmd.index("-ss") + 1] == "2.0"
+    assert cmd[cmd.index("-t") + 1] == "2.0"
@@ -0,0 +1,135 @@
+import json
+from unittest import mock
+
+import pytest
+
+import config
+import manifest
+import video
+from fan import Fan
+from shard import Shard
+
+
+@pytest.fixture
+def shards_dir(tmp_path, monkeypatch):
+    d = tmp_path / "video_shards"
+    d.mkdir()
+    monkeypatch.setattr(config, "SHARDS_DIR", d)
+    monkeypatch.setattr(config, "SHARDS_JSON_FILE_PATH", d / "shards.json")
+    monkeypatch.setattr(config, "HASH_CACHE_ENABLED", False)
+    return d
+
+
+def _write_shards(shards_dir, n, length=2.0):
+    writer = manifest.ManifestWriter()
+    for i in range(n):
+        p = shards_dir / f"shard_{i:04d}.mp4"
+        p.write_bytes(f"shard {i}".encode())
+        writer.add(i, i * length, (i + 1) * length, p, video.file_hash(p))
+    return writer
+
+
+def test_writer_records_relative_paths(shards_dir):
+    _write_shards(shards_dir, 3)
+    records = json.loads((shards_dir / "shards.json").read_text())
+    assert [r["id"] for r in records] == [0, 1, 2]
+    assert records[1]["file_path"] == "shard_0001.mp4"
+    assert set(records[0]) == {"id", "start", "end", "file_path", "hash"}
+
+
+def test_writer_upserts_existing_manifest(shards_dir):
+    _write_shards(shards_dir, 2)
+    writer = manifest.ManifestWriter()
+    p = shards_dir / "shard_0001.mp4"
+    writer.add(1, 2.0, 3.5, p, video.file_hash(p))
+    records = manifest.read_records()
+    assert len(records) == 2
+    assert records[1]["end"] == 3.5
+
+
+def test_add_shard_from_shard_object(shards_dir):
+    p = shards_dir / "shard_0007.mp4"
+    p.write_bytes(b"seven")
+    s = Shard(7, 14.0, 16.0, str(p), video.file_hash(p))
+    manifest.ManifestWriter().add_shard(s)
+    assert manifest.load_index().get(7).end() == 16.0
+
+
+def test_index_lookups(shards_dir):
+    _write_shards(shards_dir, 5)
+    index = manifest.load_index()
+
+    assert len(index) == 5 and 3 in index and 9 not in index
+    s = index.get(3)
+    assert not s.is_verified()
+    assert s.file_path() == str(shards_dir / "shard_0003.mp4")
+
+    assert index.covering(0.0).id() == 0
+    assert index.covering(4.0).id() == 2
+    assert index.covering(9.99).id() == 4
+    assert index.covering(10.0) is None
+    assert index.covering(-1.0) is None
+
+    assert [s.id() for s in index.overlapping(3.0, 6.0)] == [1, 2]
+    assert [s.id() for s in index.overlapping(4.0, 4.5)] == [2]
+    assert index.overlapping(20.0, 30.0) == []
+
+
+def test_index_handles_overlapping_shards(shards_dir):
+    writer = manifest.ManifestWriter()
+    for i, (start, end) in enumerate([(0.0, 10.0), (2.0, 3.0), (4.0, 5.0)]):
+        p = shards_dir / f"shard_{i:04d}.mp4"
+        p.write_bytes(b"x")
+        writer.add(i, start, end, p, video.file_hash(p))
+    index = manifest.load_index()
+
+    assert index.covering(4.5).id() == 2
+    assert index.covering(3.5).id() == 0
+    assert [s.id() for s in index.overlapping(3.5, 3.6)] == [0]
+
+
+def test_default_index_reloads_on_change(shards_dir):
+    assert manifest.default_index() is None
+    writer = _write_shards(shards_dir, 2)
+    assert len(manifest.default_index()) == 2
+    p = shards_dir / "shard_0002.mp4"
+    p.write_bytes(b"late")
+    writer.add(2, 4.0, 6.0, p, video.file_hash(p))
+    assert len(manifest.default_index()) == 3
+
+
+def test_create_shard_records_in_manifest(shards_dir):
+    out = shards_dir / "shard_0000.mp4"
+
+    def fake_run(cmd, **kwargs):
+        out.write_bytes(b"trimmed")
+        return mock.Mock(returncode=0, stderr="")
+
+    writer = manifest.ManifestWriter()
+    with mock.patch("subprocess.run", side_effect=fake_run):
+        video.create_shard("src.mp4", str(out), 0, 2, 0, writer)
+
+    (record,) = manifest.read_records()
+    assert record["file_path"] == "shard_0000.mp4"
+    assert record["hash"] == video.file_hash(out)
+
+
+def test_fan_reads_shard_through_index(shards_dir, monkeypatch):
+    _write_shards(shards_dir, 2)
+    # the indexed path is used even though the file name differs
+    moved = shards_dir / "moved.mp4"
+    (shards_dir / "shard_0001.mp4").rename(moved)
+    writer = manifest.ManifestWriter()
+    writer.add(1, 2.0, 4.0, moved, video.file_hash(moved))
+
+    monkeypatch.setattr(config, "NUM_SHARDS", 2)
+    monkeypatch.setattr("fan.random.randint", lambda a, b: 1)
+    assert Fan(0).read_random_shard() == b"shard 1"
+
+
+def test_fan_uses_dummy_for_corrupt_indexed_shard(shards_dir, monkeypatch):
+    _write_shards(shards_dir, 1)
+    (shards_dir / "shard_0000.mp4").write_bytes(b"corrupted")
+
+    monkeypatch.setattr(config, "NUM_SHARDS", 1)
+    assert Fan(5).read_random_shard().startswith(b"dummy-shard-5-")
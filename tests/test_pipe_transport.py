@@ -0,0 +1,94 @@
+import multiprocessing
+
+import pytest
+
+import transport
+import video_jockey as vj_mod
+from pipe_transport import PipeTransport
+
+
+@pytest.fixture
+def pt():
+    return PipeTransport(num_channels=3, capacity=2)
+
+
+def test_round_trip_and_qsize(pt):
+    fan = pt.bind(1)
+    assert fan.put_shard("Fan A", "/tmp/a.mp4", timeout=0.1)
+    assert pt.qsize() == 1
+    assert pt.get_shard(timeout=1.0) == ("Fan A", "/tmp/a.mp4")
+    assert pt.qsize() == 0
+    assert pt.get_shard(timeout=0.05) is None
+    assert pt.channel_counts() == [0, 1, 0]
+
+
+def test_backpressure_is_per_channel(pt):
+    a, b = pt.bind(0), pt.bind(1)
+    assert a.put_many([("a", "/a1"), ("a", "/a2"), ("a", "/a3")], 0.1) == 2
+    # channel 0 is full, channel 1 is not held up by it
+    assert not a.put_shard("a", "/a3", timeout=0.05)
+    assert b.put_shard("b", "/b1", timeout=0.05)
+    got = pt.get_many(10, timeout=1.0)
+    assert sorted(got) == [("a", "/a1"), ("a", "/a2"), ("b", "/b1")]
+    assert a.put_shard("a", "/a3", timeout=0.1)
+
+
+def test_closed_channel_is_dropped(pt):
+    b = pt.bind(1)
+    assert b.put_shard("b", "/b1", timeout=0.1)
+    # channel 0's writer goes away: its reader reports EOF from now on
+    pt._PipeTransport__writers[0].close()
+    assert pt.get_many(10, timeout=1.0) == [("b", "/b1")]
+    assert b.put_shard("b", "/b2", timeout=0.1)
+    assert pt.get_many(10, timeout=1.0) == [("b", "/b2")]
+    assert pt.get_shard(timeout=0.05) is None
+
+
+def _fan(transport, fan_id, n):
+    ch = transport.bind(fan_id)
+    for i in range(n):
+        assert ch.put_shard(f"fan{fan_id}", f"/tmp/{fan_id}_{i}", 5.0)
+
+
+def test_vj_multiplexes_fans_in_processes(pt):
+    procs = [
+        multiprocessing.Process(target=_fan, args=(pt, i, 4))
+        for i in range(3)
+    ]
+    for p in procs:
+        p.start()
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(pt, 12)
+    for p in procs:
+        p.join(timeout=10)
+        assert p.exitcode == 0
+
+    shards = vj.shards()
+    assert sorted(shards) == sorted(
+        f"/tmp/{f}_{i}" for f in range(3) for i in range(4)
+    )
+    # per-fan order is preserved on each channel
+    for f in range(3):
+        mine = [s for s in shards if s.startswith(f"/tmp/{f}_")]
+        assert mine == [f"/tmp/{f}_{i}" for i in range(4)]
+    assert pt.channel_counts() == [4, 4, 4]
+    assert pt.all_shards_collected() and pt.vj_has_all_shards.value
+
+
+def test_failed_temp_registry(pt):
+    pt.register_failed_temp("/tmp/x")
+    pt.register_failed_temp("/tmp/x")
+    pt.register_failed_temp("/tmp/y")
+    collected = []
+    for _ in range(50):
+        collected += pt.get_and_clear_failed_temps()
+        if len(set(collected)) == 2:
+            break
+        multiprocessing.Event().wait(0.01)
+    assert sorted(set(collected)) == ["/tmp/x", "/tmp/y"]
+
+
+def test_make_transport_can_select_pipe_backend():
+    buf = transport.make_transport("pipe", num_fans=5)
+    assert isinstance(buf, PipeTransport)
+    assert buf.num_channels() == 5
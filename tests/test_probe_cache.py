@@ -0,0 +1,126 @@
+import json
+from unittest import mock
+
+import pytest
+
+import config
+import probe_cache
+import video
+
+INFO = {
+    "streams": [
+        {"codec_type": "audio"},
+        {"codec_type": "video", "width": 320, "height": 240},
+    ],
+    "format": {"duration": "2.000000"},
+}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        config, "PROBE_CACHE_PATH", tmp_path / "probe_cache.sqlite3"
+    )
+    monkeypatch.setattr(config, "PROBE_CACHE_PERSIST", True)
+    fresh = probe_cache.ProbeCache(maxsize=2)
+    monkeypatch.setattr(probe_cache, "DEFAULT", fresh)
+    return fresh
+
+
+@pytest.fixture
+def ffprobe():
+    with mock.patch("subprocess.run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = json.dumps(INFO)
+        yield run
+
+
+def _media(tmp_path, name="v.mp4"):
+    p = tmp_path / name
+    p.write_bytes(b"\x00\x00")
+    return str(p)
+
+
+def test_probe_and_dimensions_share_one_ffprobe(cache, ffprobe, tmp_path):
+    v = _media(tmp_path)
+    assert video.probe(v)["width"] == 320
+    assert video.dimensions(v) == (320, 240)
+    assert video.probe_info(v)["format"]["duration"] == "2.000000"
+
+    assert ffprobe.call_count == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 2
+
+
+def test_changed_file_is_reprobed(cache, ffprobe, tmp_path):
+    v = _media(tmp_path)
+    video.probe(v)
+    with open(v, "ab") as fh:
+        fh.write(b"more")
+    video.probe(v)
+    assert ffprobe.call_count == 2
+
+
+def test_lru_evicts_least_recently_used(
+    cache, ffprobe, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(config, "PROBE_CACHE_PERSIST", False)
+    a, b, c = (_media(tmp_path, n) for n in ("a.mp4", "b.mp4", "c.mp4"))
+    video.probe(a)
+    video.probe(b)
+    video.probe(a)
+    video.probe(c)  # evicts b
+    assert cache.stats()["size"] == 2
+    video.probe(a)
+    assert ffprobe.call_count == 3
+    video.probe(b)
+    assert ffprobe.call_count == 4
+
+
+def test_disk_layer_survives_new_process(
+    cache, ffprobe, tmp_path, monkeypatch
+):
+    v = _media(tmp_path)
+    video.probe(v)
+
+    # a fresh in-process cache (as in another process) hits the disk layer
+    other = probe_cache.ProbeCache()
+    monkeypatch.setattr(probe_cache, "DEFAULT", other)
+    assert video.probe(v)["height"] == 240
+    assert ffprobe.call_count == 1
+    assert other.stats()["disk_hits"] == 1
+
+    other.invalidate(v)
+    video.probe(v)
+    assert ffprobe.call_count == 2
+
+
+def test_failures_are_not_cached(cache, tmp_path):
+    v = _media(tmp_path)
+    with mock.patch("subprocess.run") as run:
+        run.return_value.returncode = 1
+        run.return_value.stderr = "boom"
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                video.probe(v)
+    assert run.call_count == 2
+    assert cache.stats()["size"] == 0
+
+
+def test_temp_files_skip_disk_layer(cache, ffprobe, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    (tmp_path / "temp").mkdir()
+    received = _media(tmp_path / "temp", "received.mp4")
+    kept = _media(tmp_path, "kept.mp4")
+    video.probe(received)
+    video.probe(received)
+    video.probe(kept)
+    assert ffprobe.call_count == 2
+
+    # only the file outside TEMP_DIR reached the database
+    other = probe_cache.ProbeCache()
+    monkeypatch.setattr(probe_cache, "DEFAULT", other)
+    video.probe(kept)
+    video.probe(received)
+    assert other.stats()["disk_hits"] == 1
+    assert ffprobe.call_count == 3
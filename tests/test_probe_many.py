@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+import config
+import probe_cache
+import video
+import video_jockey as vj_mod
+
+VIDEO_INFO = {"streams": [{"codec_type": "video"}], "format": {}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_probe_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROBE_CACHE_PERSIST", False)
+    monkeypatch.setattr(probe_cache, "DEFAULT", probe_cache.ProbeCache())
+
+
+def _files(tmp_path, n):
+    paths = []
+    for i in range(n):
+        p = tmp_path / f"s{i}.mp4"
+        p.write_bytes(b"%d" % i)
+        paths.append(str(p))
+    return paths
+
+
+def test_probe_many_reports_errors_per_file(tmp_path):
+    paths = _files(tmp_path, 6)
+    active = [0]
+    peak = [0]
+    lock = threading.Lock()
+
+    def fake_run(cmd, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        if cmd[-1] == paths[2]:
+            return mock.Mock(returncode=1, stderr="invalid data", stdout="")
+        return mock.Mock(returncode=0, stdout=json.dumps(VIDEO_INFO))
+
+    with mock.patch("subprocess.run", side_effect=fake_run):
+        results = video.probe_many(paths + [paths[0]], max_workers=3)
+
+    assert list(results) == paths
+    assert isinstance(results[paths[2]].error, RuntimeError)
+    assert results[paths[2]].info is None
+    ok = [p for p in paths if results[p].error is None]
+    assert len(ok) == 5
+    assert results[paths[0]].info == VIDEO_INFO
+    assert 1 < peak[0] <= 3
+
+
+def test_probe_many_empty():
+    assert video.probe_many([]) == {}
+
+
+def test_vj_drops_shards_that_fail_probe(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path)
+    good, bad, audio_only = _files(tmp_path, 3)
+    results = {
+        good: video.ProbeResult(VIDEO_INFO, None),
+        bad: video.ProbeResult(None, RuntimeError("ffprobe failed")),
+        audio_only: video.ProbeResult(
+            {"streams": [{"codec_type": "audio"}]}, None
+        ),
+    }
+    seen = {}
+
+    def fake_probe_many(paths):
+        seen["paths"] = list(paths)
+        return results
+
+    monkeypatch.setattr(video, "probe_many", fake_probe_many)
+
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__shards = [good, bad, audio_only]
+    captured = {}
+
+    class FakeProc:
+        stderr = []
+
+        def wait(self):
+            return 0
+
+    def fake_popen(cmd, **kwargs):
+        captured["list"] = Path(cmd[cmd.index("-i") + 1]).read_text()
+        return FakeProc()
+
+    with mock.patch("subprocess.Popen", side_effect=fake_popen):
+        vj._VideoJockey__write_video()
+
+    assert seen["paths"] == [good, bad, audio_only]
+    assert os.path.basename(good) in captured["list"]
+    assert os.path.basename(bad) not in captured["list"]
+    assert os.path.basename(audio_only) not in captured["list"]
+
+
+def test_vj_keeps_shards_when_ffprobe_missing(tmp_path, monkeypatch):
+    (p,) = _files(tmp_path, 1)
+    monkeypatch.setattr(
+        video,
+        "probe_many",
+        lambda paths: {p: video.ProbeResult(None, FileNotFoundError())},
+    )
+    vj = vj_mod.VideoJockey()
+    assert vj._VideoJockey__prevalidate([p]) == [p]
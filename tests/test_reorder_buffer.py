@@ -0,0 +1,150 @@
+
+import pytest
+
+import config
+import manifest
+import video
+import video_jockey as vj_mod
+from reorder_buffer import ReorderBuffer
+from shard import Shard
+from shared_buffer import SharedBuffer
+
+
+def test_ready_prefix_and_gaps():
+    buf = ReorderBuffer(6)
+    assert buf.add(2, "c")
+    assert buf.add(0, "a")
+    assert not buf.add(2, "c again")
+    assert buf.ready() == ["a"]
+    assert buf.gaps() == [1]
+    assert buf.missing() == [1, 3, 4, 5]
+    assert buf.add(4, "e")
+    assert buf.gaps() == [1, 3]
+    assert buf.add(1, "b")
+    assert buf.ready_count() == 3
+    assert buf.ready() == ["a", "b", "c"]
+    assert buf.items() == ["a", "b", "c", "e"]
+    assert not buf.complete()
+    with pytest.raises(IndexError):
+        buf.add(6, "x")
+
+
+def test_pop_ready_hands_out_each_item_once():
+    buf = ReorderBuffer(4)
+    buf.add(1, "b")
+    assert buf.pop_ready() == []
+    buf.add(0, "a")
+    assert buf.pop_ready() == ["a", "b"]
+    assert buf.pop_ready() == []
+    buf.add(3, "d")
+    assert buf.drain() == ["d"]
+    buf.add(2, "c")
+    assert buf.pop_ready() == []
+    assert buf.complete()
+
+
+def _manifest_shards(tmp_path, monkeypatch, count):
+    paths = []
+    shards = []
+    for i in range(count):
+        path = tmp_path / f"shard_{i:04d}.mp4"
+        path.write_bytes(b"content %d" % i)
+        paths.append(str(path))
+        digest = video.shake256_hash("content %d" % i)
+        shards.append(Shard(i, i, i + 1, str(path), digest, lazy=True))
+    monkeypatch.setattr(manifest, "default_index", lambda: shards)
+    return paths
+
+
+def test_vj_orders_shards_by_id(tmp_path, monkeypatch, mp_manager):
+    paths = _manifest_shards(tmp_path, monkeypatch, 4)
+    stray = tmp_path / "stray.mp4"
+    stray.write_bytes(b"not in the manifest")
+    buf = SharedBuffer(mp_manager)
+    for i in (3, 1):
+        assert buf.put_shard(f"fan {i}", paths[i], timeout=0.5)
+    assert buf.put_shard("fan x", str(stray), timeout=0.5)
+    assert buf.put_shard("fan 0", paths[0], timeout=0.5)
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(buf, 4)
+    assert vj.shards() == [paths[0], paths[1], paths[3], str(stray)]
+    assert vj.ready_shards() == paths[:2]
+    assert vj.gaps() == [2]
+
+
+def test_arrival_order_when_disabled(tmp_path, monkeypatch, mp_manager):
+    paths = _manifest_shards(tmp_path, monkeypatch, 2)
+    monkeypatch.setattr(config, "VJ_ORDER_BY_SHARD_ID", False)
+    buf = SharedBuffer(mp_manager)
+    for i in (1, 0):
+        assert buf.put_shard(f"fan {i}", paths[i], timeout=0.5)
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(buf, 2)
+    assert vj.shards() == [paths[1], paths[0]]
+    assert vj.gaps() == []
+
+
+def test_composer_gets_the_ready_prefix_in_order(
+    tmp_path, monkeypatch, mp_manager
+):
+    paths = _manifest_shards(tmp_path, monkeypatch, 3)
+    appended = []
+
+    class _Composer:
+        def append(self, path):
+            appended.append(path)
+
+    buf = SharedBuffer(mp_manager)
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__composer = _Composer()
+    for i in (2, 0, 1):
+        assert buf.put_shard(f"fan {i}", paths[i], timeout=0.5)
+    vj._VideoJockey__read_all_shards(buf, 3)
+    assert appended == paths
+
+
+def test_vj_orders_over_the_selected_ids(tmp_path, monkeypatch, mp_manager):
+    # run_simulation sends a random subset of the manifest: the ready
+    # prefix follows the ids sent, so shards reach the composer while
+    # collection runs instead of all at once from drain()
+    paths = _manifest_shards(tmp_path, monkeypatch, 8)
+    buf = SharedBuffer(mp_manager)
+    appended = []
+
+    class _Composer:
+        def append(self, path):
+            appended.append((path, buf.vj_has_all_shards.value))
+
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__composer = _Composer()
+    for i in (5, 2, 6):
+        assert buf.put_shard(f"fan {i}", paths[i], timeout=0.5)
+    vj._VideoJockey__read_all_shards(buf, 3, shard_ids=[6, 2, 5])
+    assert appended == [(paths[i], False) for i in (2, 5, 6)]
+    assert vj.ready_shards() == [paths[2], paths[5], paths[6]]
+
+
+def test_gaps_name_selected_ids(tmp_path, monkeypatch, mp_manager):
+    paths = _manifest_shards(tmp_path, monkeypatch, 8)
+    buf = SharedBuffer(mp_manager)
+    for i in (1, 7):
+        assert buf.put_shard(f"fan {i}", paths[i], timeout=0.5)
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(buf, 2, shard_ids=[1, 4, 7])
+    assert vj.shards() == [paths[1], paths[7]]
+    assert vj.ready_shards() == [paths[1]]
+    # 2, 3, 5 and 6 were never sent
+    assert vj.gaps() == [4]
+
+
+def test_selected_shard_ids_follow_the_manifest(tmp_path, monkeypatch):
+    import run_simulation
+
+    paths = _manifest_shards(tmp_path, monkeypatch, 4)
+    stray = str(tmp_path / "stray.mp4")
+    assert run_simulation.selected_shard_ids([paths[3], stray, paths[1]]) == [
+        3,
+        1,
+    ]
+    monkeypatch.setattr(manifest, "default_index", lambda: None)
+    assert run_simulation.selected_shard_ids(paths) is None
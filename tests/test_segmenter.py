@@ -0,0 +1,232 @@
+import shutil
+import subprocess
+import sys
+from unittest import mock
+
+import pytest
+
+import config
+import manifest
+import segmenter
+import video
+
+
+@pytest.fixture(autouse=True)
+def no_hash_cache(monkeypatch):
+    monkeypatch.setattr(config, "HASH_CACHE_ENABLED", False)
+
+
+def test_segment_command_uses_one_segment_muxer_pass(tmp_path):
+    cmd = segmenter.segment_command("src.mp4", tmp_path, segment_seconds=2)
+    assert cmd[0] == "ffmpeg"
+    assert cmd[cmd.index("-f") + 1] == "segment"
+    assert cmd[cmd.index("-segment_time") + 1] == "2"
+    assert cmd[-1].endswith("shard_%04d.mp4")
+
+    cmd = segmenter.segment_command("src.mp4", tmp_path, segment_times=[1, 3])
+    assert cmd[cmd.index("-segment_times") + 1] == "1,3"
+
+
+def test_segment_command_without_cuts_asks_for_one_segment(tmp_path):
+    cmd = segmenter.segment_command("src.mp4", tmp_path, segment_times=[])
+    assert "-segment_times" not in cmd
+    assert float(cmd[cmd.index("-segment_time") + 1]) > 86400
+
+
+def test_segment_source_records_each_finished_segment(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(config, "MANIFEST_FLUSH_EVERY", 1)
+    out_dir = tmp_path / "video_shards"
+
+    class FakeProc:
+        def __init__(self, cmd, **kwargs):
+            self.stderr = mock.Mock(read=lambda: "")
+            self.stdout = self._segments()
+
+        def _segments(self):
+            for i, (start, end) in enumerate([(0.0, 2.0), (2.0, 4.1)]):
+                (out_dir / f"shard_{i:04d}.mp4").write_bytes(b"seg%d" % i)
+                yield f"shard_{i:04d}.mp4,{start},{end}\n"
+                # the manifest is updated before the next segment is cut
+                assert len(manifest.read_records(out_dir / "shards.json"))
+
+        def wait(self):
+            return 0
+
+    with mock.patch("subprocess.Popen", FakeProc):
+        records = segmenter.segment_source("src.mp4", out_dir, 2.0)
+
+    assert [r["id"] for r in records] == [0, 1]
+    assert records[1]["start"] == 2.0 and records[1]["end"] == 4.1
+    index = manifest.load_index(out_dir / "shards.json")
+    assert index.get(1).hash() == video.file_hash(out_dir / "shard_0001.mp4")
+
+
+def test_segment_source_flushes_manifest_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "MANIFEST_FLUSH_EVERY", 4)
+    flushes = []
+    real_flush = manifest.ManifestWriter.flush
+    monkeypatch.setattr(
+        manifest.ManifestWriter,
+        "flush",
+        lambda self: flushes.append(len(self.records())) or real_flush(self),
+    )
+
+    class FakeProc:
+        def __init__(self, cmd, **kwargs):
+            self.stderr = mock.Mock(read=lambda: "")
+            self.stdout = self._segments()
+
+        def _segments(self):
+            for i in range(10):
+                (tmp_path / f"shard_{i:04d}.mp4").write_bytes(b"seg%d" % i)
+                yield f"shard_{i:04d}.mp4,{i}.0,{i + 1}.0\n"
+
+        def wait(self):
+            return 0
+
+    with mock.patch("subprocess.Popen", FakeProc):
+        records = segmenter.segment_source("src.mp4", tmp_path, 1.0)
+
+    assert len(records) == 10
+    assert flushes == [4, 8, 10]
+    assert len(manifest.read_records(tmp_path / "shards.json")) == 10
+
+
+def test_segment_source_failure_returns_none(tmp_path):
+    class FailingProc:
+        def __init__(self, cmd, **kwargs):
+            self.stdout = iter(())
+            self.stderr = mock.Mock(read=lambda: "boom")
+
+        def wait(self):
+            return 1
+
+    with mock.patch("subprocess.Popen", FailingProc):
+        assert segmenter.segment_source("src.mp4", tmp_path, 2.0) is None
+
+
+def test_segment_source_requires_a_plan(tmp_path):
+    with pytest.raises(ValueError):
+        segmenter.segment_source("src.mp4", tmp_path)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_segment_real_source(tmp_path):
+    src = tmp_path / "src.mp4"
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=duration=6:size=160x120:rate=10",
+            "-g",
+            "10",
+            str(src),
+        ],
+        check=True,
+    )
+    out_dir = tmp_path / "video_shards"
+    records = segmenter.segment_source(src, out_dir, 2.0)
+
+    assert len(records) == 3
+    for r in records:
+        assert (out_dir / r["file_path"]).exists()
+    assert records[-1]["end"] == pytest.approx(6.0, abs=0.5)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_main_with_one_shard(tmp_path, monkeypatch):
+    src = tmp_path / "src.mp4"
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=duration=6:size=160x120:rate=10",
+            "-g",
+            "10",
+            str(src),
+        ],
+        check=True,
+    )
+    out_dir = tmp_path / "video_shards"
+    # plan_segment_times probes the source; with one shard it plans no cut
+    monkeypatch.setattr(video, "probe", lambda path: {"duration": "6.0"})
+    monkeypatch.setattr(
+        segmenter.keyframes,
+        "load",
+        lambda path: segmenter.keyframes.KeyframeIndex([0, 1, 2, 3, 4, 5]),
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["segmenter.py", "--source", str(src), "--out", str(out_dir)]
+        + ["--shards", "1"],
+    )
+    assert segmenter.main() == 0
+    index = manifest.load_index(out_dir / "shards.json")
+    assert len(index) == 1
+    assert index.get(0).end() == pytest.approx(6.0, abs=0.5)
+
+
+def test_half_frame_of_a_probed_stream():
+    ntsc = {"avg_frame_rate": "24000/1001"}
+    assert segmenter.half_frame(ntsc) == pytest.approx(1001 / 48000)
+    assert segmenter.half_frame({"r_frame_rate": "10/1"}) == 0.05
+    unknown = {"avg_frame_rate": "0/0"}
+    assert segmenter.half_frame(unknown) == segmenter._FALLBACK_HALF_FRAME
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_cut_lands_on_a_rounded_up_keyframe(tmp_path, monkeypatch):
+    # at 24000/1001 fps the keyframe at frame 20 is at 0.8341666..s;
+    # ffprobe reports it rounded up to 0.834167, which is past it
+    src = tmp_path / "src.mp4"
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=duration=4:size=64x48:rate=24000/1001",
+            "-c:v",
+            "libx264",
+            "-bf",
+            "0",
+            "-g",
+            "20",
+            "-keyint_min",
+            "20",
+            "-sc_threshold",
+            "0",
+            "-pix_fmt",
+            "yuv420p",
+            str(src),
+        ],
+        check=True,
+    )
+    info = {"duration": "4.004", "avg_frame_rate": "24000/1001"}
+    monkeypatch.setattr(video, "probe", lambda path: info)
+    index = segmenter.keyframes.KeyframeIndex([0.0, 0.834167, 1.668333])
+    monkeypatch.setattr(segmenter.keyframes, "load", lambda path: index)
+    times = segmenter.plan_segment_times(src, 4)
+    assert times[0] < 0.834166
+
+    records = segmenter.segment_source(
+        src, tmp_path / "video_shards", segment_times=times
+    )
+    assert records[0]["end"] == pytest.approx(0.834167, abs=1e-3)
+    assert records[1]["end"] == pytest.approx(1.668333, abs=1e-3)
@@ -0,0 +1,133 @@
+import multiprocessing
+import random
+
+import pytest
+
+import config
+import manifest
+import video
+import video_jockey as vj_mod
+from fan import Fan
+from shard import Shard
+from shard_coverage import CoverageMap
+from shared_buffer import SharedBuffer
+
+
+def test_bitmap_bookkeeping():
+    cov = CoverageMap(10)
+    assert cov.mark(3)
+    assert not cov.mark(3)
+    assert cov.mark(9)
+    assert cov.has(3) and cov.has(9) and not cov.has(4)
+    assert cov.count() == 2
+    assert cov.missing() == [0, 1, 2, 4, 5, 6, 7, 8]
+    with pytest.raises(IndexError):
+        cov.mark(10)
+
+
+def test_random_missing_only_returns_missing_ids():
+    cov = CoverageMap(50)
+    rng = random.Random(1)
+    for i in range(49):
+        cov.mark(i)
+    # the probes miss; the scan still finds the one left
+    assert cov.random_missing(rng) == 49
+    cov.mark(49)
+    assert cov.complete()
+    assert cov.random_missing(rng) is None
+
+
+def _mark(cov, ids):
+    for i in ids:
+        cov.mark(i)
+
+
+def test_marks_are_shared_across_processes():
+    cov = CoverageMap(64)
+    procs = [
+        multiprocessing.Process(target=_mark, args=(cov, range(k, 64, 4)))
+        for k in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=10)
+    assert cov.complete()
+    assert cov.count() == 64
+
+
+def test_map_is_sized_from_the_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "NUM_SHARDS", 1)
+    shards = [
+        Shard(i, i, i + 1, str(tmp_path / f"s{i}.mp4"), "h", lazy=True)
+        for i in (0, 3, 11)
+    ]
+    monkeypatch.setattr(manifest, "default_index", lambda: shards)
+    cov = CoverageMap()
+    assert cov.size() == 12
+    cov.mark(0)
+    assert not cov.complete()
+
+    monkeypatch.setattr(manifest, "default_index", lambda: None)
+    assert CoverageMap().size() == 1
+
+
+def test_fan_picks_a_missing_shard(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SHARDS_DIR", tmp_path)
+    monkeypatch.setattr(config, "NUM_SHARDS", 8)
+    monkeypatch.setattr(manifest, "default_index", lambda: None)
+    for i in range(8):
+        (tmp_path / f"shard_{i:04d}.mp4").write_bytes(b"shard %d" % i)
+
+    class _Buffer:
+        carries_payload = True
+        coverage = CoverageMap(8)
+        sent = []
+
+        def put_shard(self, sender_name, payload, timeout=5.0):
+            self.sent.append(payload)
+            return True
+
+    buf = _Buffer()
+    for i in range(8):
+        if i != 5:
+            buf.coverage.mark(i)
+    Fan(0, verbose=False).send_shard(buf)
+    assert buf.sent == [b"shard 5"]
+
+
+def test_vj_marks_coverage_and_has_all_shards(
+    tmp_path, monkeypatch, mp_manager
+):
+    paths = []
+    shards = []
+    for i in range(3):
+        path = tmp_path / f"shard_{i:04d}.mp4"
+        path.write_bytes(b"content %d" % i)
+        paths.append(str(path))
+        digest = video.shake256_hash("content %d" % i)
+        shards.append(Shard(i, i, i + 1, str(path), digest, lazy=True))
+    monkeypatch.setattr(manifest, "default_index", lambda: shards)
+
+    buf = SharedBuffer(mp_manager)
+    buf.coverage = CoverageMap(3)
+    for i in (2, 0):
+        assert buf.put_shard(f"fan {i}", paths[i], timeout=0.5)
+    vj = vj_mod.VideoJockey()
+    assert not vj.has_all_shards()
+    vj._VideoJockey__read_all_shards(buf, 2)
+    assert buf.coverage.missing() == [1]
+    assert not vj.has_all_shards()
+
+    assert buf.put_shard("fan 1", paths[1], timeout=0.5)
+    vj._VideoJockey__read_all_shards(buf, 1)
+    assert buf.coverage.complete()
+    assert vj.has_all_shards()
+
+
+def test_has_all_shards_without_coverage(mp_manager):
+    buf = SharedBuffer(mp_manager)
+    vj = vj_mod.VideoJockey()
+    assert buf.put_shard("fan", "/nonexistent/a.mp4", timeout=0.5)
+    vj._VideoJockey__read_all_shards(buf, 1)
+    assert vj.has_all_shards()
@@ -0,0 +1,224 @@
+import logging
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import config
+import fan as fan_mod
+import transport
+import video_jockey as vj_mod
+from fan import Fan
+from flow_control import CreditGate
+from ingest_server import IngestClient, IngestServer
+from shared_buffer import SharedBuffer
+from shm_buffer import ShmRingBuffer
+
+
+def _shard(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_vj_drops_duplicate_content_and_acks(tmp_path, mp_manager):
+    buf = SharedBuffer(mp_manager)
+    buf.acks = transport.AckChannels(3)
+    a = _shard(tmp_path, "a.mp4", b"same bytes \xe9")
+    a_copy = _shard(tmp_path, "a_copy.mp4", b"same bytes \xe9")
+    b = _shard(tmp_path, "b.mp4", b"other bytes")
+    tags = [transport.sender_tag(n, i, "t") for i, n in enumerate("abc")]
+    for tag, path in zip(tags, (a, a_copy, b)):
+        assert buf.put_shard(tag, path, timeout=0.5)
+
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(buf, 2)
+    assert vj.shards() == [a, b]
+    # the redundant temp file is freed on arrival
+    assert not Path(a_copy).exists()
+    assert vj.duplicates() == {
+        "duplicate_shards": 1,
+        "duplicate_bytes": len(b"same bytes \xe9"),
+    }
+    assert [buf.delivery_status(t, timeout=1.0) for t in tags] == [
+        transport.ACK_NEW,
+        transport.ACK_DUPLICATE,
+        transport.ACK_NEW,
+    ]
+    # each ack is handed out once
+    assert buf.delivery_status(tags[1], timeout=0.05) is None
+    assert buf.delivery_status("nobody", timeout=0.05) is None
+
+
+def test_late_ack_is_dropped_by_the_next_wait():
+    acks = transport.AckChannels(2)
+    first = transport.sender_tag("ann", 1, "first")
+    second = transport.sender_tag("ann", 1, "second")
+    # the fan gave up on its first delivery before the VJ acked it
+    assert acks.wait(first, timeout=0.01) is None
+    acks.send(first, transport.ACK_NEW)
+    acks.send(second, transport.ACK_DUPLICATE)
+    assert acks.wait(second, timeout=1.0) == transport.ACK_DUPLICATE
+    assert acks.wait(first, timeout=0.01) is None
+    # tags without a known fan id are not routed anywhere
+    acks.send("ann", transport.ACK_NEW)
+    acks.send(transport.sender_tag("bob", 7, "x"), transport.ACK_NEW)
+    assert transport.fan_id_of("ann #2.x") == 2
+    assert transport.fan_id_of("ann") is None
+
+
+def test_acks_reach_fans_that_share_a_name(
+    tmp_path, monkeypatch, mp_manager
+):
+    # forked fans inherit the same Faker state and draw the same name
+    monkeypatch.setattr(
+        fan_mod, "FAKE", SimpleNamespace(name=lambda: "Aaron Mcdaniel")
+    )
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path / "temp")
+    monkeypatch.setattr(config, "DELIVERY_ACK_TIMEOUT", 10.0)
+    buf = SharedBuffer(mp_manager)
+    buf.acks = transport.AckChannels(3)
+    a = _shard(tmp_path, "a.mp4", b"same bytes")
+    b = _shard(tmp_path, "b.mp4", b"other bytes")
+
+    vj = vj_mod.VideoJockey()
+    reader = threading.Thread(
+        target=vj._VideoJockey__read_all_shards, args=(buf, 2), daemon=True
+    )
+    reader.start()
+    fans = [
+        Fan(i, shard_path=p, verbose=False) for i, p in enumerate((a, a, b))
+    ]
+    assert len({f.name() for f in fans}) == 1
+    for f in fans:
+        f.send_shard(buf)
+    reader.join(timeout=20)
+    assert [f.delivery() for f in fans] == [
+        transport.ACK_NEW,
+        transport.ACK_DUPLICATE,
+        transport.ACK_NEW,
+    ]
+    # each ack is handed out once
+    for f in fans:
+        assert buf.delivery_status(f._Fan__sender, timeout=0.01) is None
+
+
+def test_collected_duplicates_are_not_listed(tmp_path):
+    a = _shard(tmp_path, "a.mp4", b"same bytes")
+    a_copy = _shard(tmp_path, "a_copy.mp4", b"same bytes")
+
+    class _Server(transport.Transport):
+        def collect(self, total_shards):
+            return [("ann", a), ("bob", a_copy)]
+
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(_Server(), 1)
+    assert vj.shards() == [a]
+    assert vj.duplicates()["duplicate_shards"] == 1
+
+
+def test_unreadable_paths_are_kept(mp_manager):
+    buf = SharedBuffer(mp_manager)
+    for name in ("x", "y"):
+        assert buf.put_shard(name, "/nonexistent/shard.mp4", timeout=0.5)
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(buf, 2)
+    assert vj.shards() == ["/nonexistent/shard.mp4"] * 2
+    assert vj.duplicates()["duplicate_shards"] == 0
+
+
+def test_duplicate_payloads_are_never_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path)
+    buf = ShmRingBuffer(slots=8, slot_size=1024)
+    try:
+        for name, payload in (("a", b"one"), ("b", b"one"), ("c", b"two")):
+            assert buf.put_shard(name, payload, timeout=1.0)
+        vj = vj_mod.VideoJockey()
+        vj._VideoJockey__read_all_shards(buf, 2)
+        assert [Path(p).read_bytes() for p in vj.shards()] == [
+            b"one",
+            b"two",
+        ]
+        assert len(list(tmp_path.iterdir())) == 2
+        assert vj.duplicates()["duplicate_bytes"] == 3
+    finally:
+        buf.unlink()
+
+
+def test_ingest_server_acks_duplicates(tmp_path):
+    srv = IngestServer(("127.0.0.1", 0), "tcp", tmp_dir=tmp_path / "in")
+    srv.start()
+    try:
+        shard = _shard(tmp_path, "shard_0001.mp4", b"\x00\xff" * 4000)
+        client = IngestClient(srv.address(), "tcp", connect_timeout=5)
+        fans = [Fan(i, shard_path=shard, verbose=False) for i in range(2)]
+        for f in fans:
+            f.send_shard(client)
+        assert [f.delivery() for f in fans] == [
+            transport.ACK_NEW,
+            transport.ACK_DUPLICATE,
+        ]
+        assert srv.qsize() == 1
+        stats = srv.stats()
+        assert stats["duplicate_shards"] == 1
+        assert stats["duplicate_bytes"] == 8000
+        assert len(list((tmp_path / "in").iterdir())) == 1
+        client.close()
+    finally:
+        srv.close()
+
+
+def test_ingest_server_returns_credit_of_duplicate(tmp_path):
+    srv = IngestServer(("127.0.0.1", 0), "tcp", tmp_dir=tmp_path / "in")
+    srv.credits = CreditGate(window=2)
+    srv.start()
+    try:
+        a = _shard(tmp_path, "shard_0000.mp4", b"\x00\x01" * 4000)
+        b = _shard(tmp_path, "shard_0001.mp4", b"\x00\x02" * 4000)
+        client = IngestClient(srv.address(), "tcp", connect_timeout=5)
+        client.credits = srv.credits
+        vj = vj_mod.VideoJockey()
+        threads = [
+            threading.Thread(
+                target=vj._VideoJockey__read_all_shards,
+                args=(srv, 2),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=lambda: [
+                    Fan(i, shard_path=p, verbose=False).send_shard(client)
+                    for i, p in enumerate((a, a, b))
+                ],
+                daemon=True,
+            ),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=20)
+            assert not t.is_alive(), "a leaked credit stalled the run"
+        assert sorted(Path(p).read_bytes()[:2] for p in vj.shards()) == [
+            b"\x00\x01",
+            b"\x00\x02",
+        ]
+        assert srv.credits.outstanding() == 0
+        client.close()
+    finally:
+        srv.close()
+
+
+def test_run_summary_reports_duplicates(tmp_path, mp_manager, caplog):
+    buf = SharedBuffer(mp_manager)
+    for i, name in enumerate(("a", "b", "c")):
+        data = b"dup" if i < 2 else b"unique"
+        buf.put_shard(name, _shard(tmp_path, f"{name}.mp4", data), 0.5)
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__write_video = lambda: None
+    with caplog.at_level(logging.INFO):
+        vj.start(buf, 2)
+    assert any(
+        "2 shards, 1 duplicates dropped, 3 duplicate bytes avoided"
+        in r.getMessage()
+        for r in caplog.records
+    )
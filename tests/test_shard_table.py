@@ -0,0 +1,74 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from shard import Shard  # noqa: E402
+from shard_table import ShardTable  # noqa: E402
+
+
+def _table():
+    # ids deliberately out of start order
+    return ShardTable(
+        ids=[2, 0, 1, 3, 4],
+        starts=[2.0, 0.0, 1.0, 3.5, 4.0],
+        ends=[3.0, 1.0, 2.0, 4.5, 5.0],
+        sizes=[300, 100, 200, 400, 500],
+        hashes=["c" * 16, "a" * 16, "b" * 16, "d" * 16, "e" * 16],
+    )
+
+
+def test_shard_uses_slots():
+    s = Shard(1, 0.0, 1.0, "x.mp4", "0" * 16, lazy=True)
+    assert not hasattr(s, "__dict__")
+    with pytest.raises(AttributeError):
+        s.extra = 1
+
+
+def test_columns_sorted_by_start():
+    t = _table()
+    assert len(t) == 5
+    assert t.ids().tolist() == [0, 1, 2, 3, 4]
+    assert t.hashes()[0] == b"a" * 16
+    assert t.nbytes() > 0
+
+
+def test_total_duration():
+    assert _table().total_duration() == pytest.approx(5.0)
+
+
+def test_gaps_and_overlaps():
+    t = _table()
+    prev_ids, next_ids, seconds = t.gaps()
+    assert prev_ids.tolist() == [2] and next_ids.tolist() == [3]
+    assert seconds.tolist() == pytest.approx([0.5])
+
+    prev_ids, next_ids, seconds = t.overlaps()
+    assert prev_ids.tolist() == [3] and next_ids.tolist() == [4]
+    assert seconds.tolist() == pytest.approx([0.5])
+
+
+def test_larger_than():
+    assert _table().larger_than(250).tolist() == [2, 3, 4]
+
+
+def test_coverage():
+    t = _table()
+    # [0, 3) fully covered, [3, 3.5) is a hole, [3.5, 5) covered once
+    assert t.covered_seconds(0.0, 5.0) == pytest.approx(4.5)
+    assert t.coverage(0.0, 5.0) == pytest.approx(0.9)
+    assert t.coverage(3.0, 3.5) == pytest.approx(0.0)
+    assert t.coverage(4.0, 4.5) == pytest.approx(1.0)
+    assert t.coverage(10.0, 20.0) == 0.0
+    assert t.coverage(2.0, 2.0) == 0.0
+
+
+def test_from_shards_does_not_verify(tmp_path):
+    p = tmp_path / "shard_0000.mp4"
+    p.write_bytes(b"12345")
+    shards = [
+        Shard(0, 0.0, 1.0, str(p), "f" * 16, lazy=True),
+        Shard(1, 1.0, 2.0, str(tmp_path / "missing.mp4"), "e" * 16, True),
+    ]
+    t = ShardTable.from_shards(shards)
+    assert t.sizes().tolist() == [5, -1]
+    assert not shards[0].is_verified()
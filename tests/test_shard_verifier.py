@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+import video
+import shard_verifier
+from shard import Shard
+
+
+def _make_shards(tmp_path, n):
+    shards = []
+    for i in range(n):
+        p = tmp_path / f"shard_{i:04d}.mp4"
+        p.write_bytes(f"shard-{i}".encode() * 100)
+        shards.append(
+            Shard(i, i, i + 1, str(p), video.file_hash(str(p)), lazy=True)
+        )
+    return shards
+
+
+def test_lazy_shard_defers_hashing(tmp_path, monkeypatch):
+    p = tmp_path / "s.mp4"
+    p.write_bytes(b"payload")
+    expected = video.file_hash(str(p))
+
+    calls = []
+    real_hash = video.file_hash
+    monkeypatch.setattr(
+        video,
+        "file_hash",
+        lambda fp, **kw: calls.append(fp) or real_hash(fp, **kw),
+    )
+
+    s = Shard(1, 0.0, 1.0, str(p), expected, lazy=True)
+    assert calls == []
+    assert not s.is_verified()
+    assert s.id() == 1 and s.start() == 0.0 and s.end() == 1.0
+    assert calls == []
+
+    # first use of the file verifies it, later uses do not rehash
+    assert s.file_path() == str(p)
+    assert s.hash() == expected
+    assert len(calls) == 1
+    assert s.is_verified()
+
+
+def test_lazy_shard_raises_on_first_access(tmp_path):
+    p = tmp_path / "s.mp4"
+    p.write_bytes(b"payload")
+    s = Shard(1, 0.0, 1.0, str(p), "deadbeef", lazy=True)
+    with pytest.raises(Exception):
+        s.file_path()
+
+
+def test_verify_shards_reports_each_result(tmp_path):
+    shards = _make_shards(tmp_path, 12)
+    # corrupt one shard and remove another
+    Path(shards[3]._Shard__file_path).write_bytes(b"corrupted")
+    Path(shards[7]._Shard__file_path).unlink()
+
+    seen = []
+    results = shard_verifier.verify_shards(
+        shards,
+        max_workers=4,
+        progress=lambda done, total, r: seen.append((done, total)),
+    )
+
+    assert [r.shard for r in results] == shards
+    bad = shard_verifier.failed(results)
+    assert sorted(r.shard.id() for r in bad) == [3, 7]
+    assert all(r.hash is None and r.error for r in bad)
+    assert sorted(done for done, _ in seen) == list(range(1, 13))
+    assert all(total == 12 for _, total in seen)
+
+
+def test_verify_shards_empty():
+    assert shard_verifier.verify_shards([]) == []
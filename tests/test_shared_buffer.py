@@ -4,30 +4,16 @@ Unit tests for SharedBuffer with new cleanup and capacity features.
 
 import pytest
 import os
-import sys
 import tempfile
-from pathlib import Path
-from multiprocessing import Manager
-
-# Add parent directory to path so we can import example modules
-sys.path.insert(0, str(Path(__file__).parent.parent / "example"))
 
 from shared_buffer import SharedBuffer
 import config
 
 
 @pytest.fixture
-def manager():
-    """Provide a multiprocessing Manager for tests."""
-    mgr = Manager()
-    yield mgr
-    mgr.shutdown()
-
-
-@pytest.fixture
-def shared_buffer(manager):
+def shared_buffer(mp_manager):
     """Provide a SharedBuffer instance for tests."""
-    return SharedBuffer(manager)
+    return SharedBuffer(mp_manager)
 
 
 @pytest.fixture
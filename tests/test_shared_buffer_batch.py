@@ -0,0 +1,76 @@
+import pytest
+
+import config
+import video_jockey as vj_mod
+from shared_buffer import SharedBuffer
+
+
+@pytest.fixture
+def sb(monkeypatch, mp_manager):
+    monkeypatch.setattr(config, "SHARED_BUFFER_SIZE", 4)
+    monkeypatch.setattr(config, "SHARED_BUFFER_BATCH_SIZE", 3)
+    return SharedBuffer(mp_manager)
+
+
+def _entries(n, start=0):
+    return [(f"fan{i}", f"/tmp/s{i}.mp4") for i in range(start, start + n)]
+
+
+def test_put_many_batches_and_applies_backpressure(sb):
+    # 4 entries fit, as a batch of 3 and a batch of 1
+    assert sb.put_many(_entries(7), timeout=0.1) == 4
+    assert sb._queue.qsize() == 2
+    assert sb.get_many(10, timeout=0.1) == _entries(4)
+    assert sb.get_many(10, timeout=0.05) == []
+
+
+def test_backpressure_counts_entries_not_batches(sb):
+    assert sb.put_many(_entries(3), timeout=0.1) == 3
+    assert sb.put_shard("solo", "/tmp/solo.mp4", timeout=0.1)
+    assert not sb.put_shard("late", "/tmp/late.mp4", timeout=0.05)
+    assert sb.put_many(_entries(1, 3), timeout=0.05) == 0
+    # entries handed to the consumer free their slots, held ones do not
+    assert sb.get_many(1, timeout=0.1) == _entries(1)
+    assert sb.put_many(_entries(2, 3), timeout=0.05) == 1
+    assert sb.get_shard(timeout=0.1) == _entries(1, 1)[0]
+    assert sb.put_shard("late", "/tmp/late.mp4", timeout=0.1)
+
+
+def test_get_many_respects_max_items_and_keeps_order(sb):
+    sb.put_many(_entries(5), timeout=0.1)
+    assert sb.get_many(2, timeout=0.1) == _entries(2)
+    # the rest of the first batch is held locally
+    assert sb.get_shard(timeout=0.1) == _entries(1, 2)[0]
+    assert sb.get_many(5, timeout=0.1) == _entries(1, 3)
+
+
+def test_single_and_batched_puts_mix(sb):
+    assert sb.put_shard("solo", "/tmp/solo.mp4", timeout=0.1)
+    assert sb.put_many(_entries(2), timeout=0.1) == 2
+    assert sb.get_many(10, timeout=0.1) == [
+        ("solo", "/tmp/solo.mp4")
+    ] + _entries(2)
+
+
+def test_pickled_copy_has_no_pending(sb):
+    sb._pending.append(("x", "/tmp/x.mp4"))
+    # the state sent to child processes starts with nothing pending
+    assert len(sb.__getstate__()["_pending"]) == 0
+
+
+def test_vj_drains_in_batches(sb, monkeypatch):
+    sb.put_many(_entries(4), timeout=0.1)
+    calls = []
+    real = sb.get_many
+
+    def counting(max_items, timeout=0.1):
+        calls.append(max_items)
+        return real(max_items, timeout)
+
+    monkeypatch.setattr(sb, "get_many", counting)
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__read_all_shards(sb, 4)
+    assert vj.shards() == [p for _, p in _entries(4)]
+    # both queued batches come back from a single call
+    assert calls == [4]
+    assert sb.vj_has_all_shards.value
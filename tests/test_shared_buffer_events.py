@@ -0,0 +1,68 @@
+import multiprocessing
+import time
+
+import pytest
+
+import config
+from fan import Fan
+from shared_buffer import SharedBuffer
+
+
+@pytest.fixture
+def sb(mp_manager):
+    return SharedBuffer(mp_manager)
+
+
+def _put_later(buf, delay):
+    time.sleep(delay)
+    buf.put_shard("late fan", "/tmp/late.mp4", timeout=1.0)
+
+
+def _wait_done(buf, result):
+    result.value = buf.wait_all_shards_collected(timeout=10.0)
+
+
+def test_get_wakes_on_put_from_other_process(sb):
+    p = multiprocessing.Process(target=_put_later, args=(sb, 0.3))
+    p.start()
+    t0 = time.monotonic()
+    item = sb.get_shard(timeout=10.0)
+    waited = time.monotonic() - t0
+    p.join()
+    assert item == ("late fan", "/tmp/late.mp4")
+    assert waited < 5.0
+
+
+def test_get_many_times_out_empty(sb):
+    t0 = time.monotonic()
+    assert sb.get_many(4, timeout=0.2) == []
+    assert time.monotonic() - t0 >= 0.2
+
+
+def test_completion_event_reaches_other_process(sb):
+    result = multiprocessing.Value("b", False)
+    p = multiprocessing.Process(target=_wait_done, args=(sb, result))
+    p.start()
+    assert not sb.all_shards_collected()
+    sb.set_all_shards_collected()
+    p.join(timeout=10)
+    assert result.value
+    assert sb.all_shards_collected()
+    # the legacy manager flag follows the event
+    assert sb.vj_has_all_shards.value
+
+
+def test_fan_backoff_stops_when_vj_finishes(sb, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path)
+    calls = []
+
+    def put_fails(name, path, timeout=None):
+        calls.append(path)
+        sb.set_all_shards_collected()
+        return False
+
+    monkeypatch.setattr(sb, "put_shard", put_fails)
+    Fan(0, verbose=False).send_shard(sb)
+    # one attempt, then the backoff wait returns as the VJ is done
+    assert len(calls) == 1
+    assert list(tmp_path.iterdir()) == []
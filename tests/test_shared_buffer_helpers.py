@@ -1,22 +1,6 @@
-import sys
-from pathlib import Path
-from multiprocessing import Manager
-
 import pytest
 
-# Add example/ to sys.path to import example modules
-example_dir = Path(__file__).resolve().parents[1] / "example"
-if str(example_dir) not in sys.path:
-    sys.path.insert(0, str(example_dir))
-
-from shared_buffer import SharedBuffer  # noqa: E402
-
-
-@pytest.fixture
-def mp_manager():
-    mgr = Manager()
-    yield mgr
-    mgr.shutdown()
+from shared_buffer import SharedBuffer
 
 
 def test_failed_temp_register_and_clear(mp_manager, tmp_path):
@@ -0,0 +1,105 @@
+import multiprocessing
+import time
+from pathlib import Path
+
+import pytest
+
+import config
+import video
+import video_jockey as vj_mod
+from fan import Fan
+from shm_buffer import ShmRingBuffer
+
+
+@pytest.fixture
+def ring():
+    buf = ShmRingBuffer(slots=4, slot_size=64)
+    yield buf
+    buf.unlink()
+
+
+def test_round_trip_bytes_and_paths(ring):
+    assert ring.put_shard("Fan A", b"\x00\x01shard", timeout=0.1)
+    assert ring.put_shard("Fan B", "/tmp/shard_0001.mp4", timeout=0.1)
+    assert ring.qsize() == 2
+    assert ring.get_shard(timeout=0.1) == ("Fan A", b"\x00\x01shard")
+    assert ring.get_shard(timeout=0.1) == ("Fan B", "/tmp/shard_0001.mp4")
+    assert ring.qsize() == 0
+    assert ring.get_shard(timeout=0.05) is None
+
+
+def test_multi_slot_entries_wrap_around(ring):
+    big = bytes(range(150))  # three of the four 64-byte slots
+    for i in range(5):
+        assert ring.put_shard(f"f{i}", big, timeout=0.1)
+        assert ring.get_shard(timeout=0.1) == (f"f{i}", big)
+
+
+def test_backpressure_and_oversized_entries(ring):
+    assert ring.put_shard("a", b"x" * 100, timeout=0.1)  # two slots
+    assert ring.put_shard("b", b"y" * 100, timeout=0.1)  # two more
+    assert not ring.put_shard("c", b"z", timeout=0.05)
+    assert ring.get_shard(timeout=0.1)[0] == "a"
+    assert ring.put_shard("c", b"z", timeout=0.1)
+    # larger than the whole ring: rejected without blocking
+    with pytest.raises(ValueError):
+        ring.put_shard("d", b"w" * 1000, timeout=5.0)
+
+
+def _produce(buf, n):
+    for i in range(n):
+        assert buf.put_shard(f"p{i}", bytes([i]) * (i * 20), timeout=5.0)
+
+
+def test_cross_process_producers(ring):
+    procs = [
+        multiprocessing.Process(target=_produce, args=(ring, 10))
+        for _ in range(3)
+    ]
+    for p in procs:
+        p.start()
+    got = [ring.get_shard(timeout=5.0) for _ in range(30)]
+    for p in procs:
+        p.join(timeout=10)
+        assert p.exitcode == 0
+    assert all(item is not None for item in got)
+    for name, payload in got:
+        i = int(name[1:])
+        assert payload == bytes([i]) * (i * 20)
+
+
+def test_fan_sends_bytes_and_vj_materializes(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path)
+    shard = tmp_path / "shard_0000.mp4"
+    shard.write_bytes(b"fake mp4 bytes")
+    buf = ShmRingBuffer(slots=4, slot_size=1024)
+    try:
+        Fan(0, shard_path=str(shard), verbose=False).send_shard(buf)
+        # no temp file was written by the fan
+        assert sorted(p.name for p in tmp_path.iterdir()) == [shard.name]
+
+        monkeypatch.setattr(video, "probe_many", lambda paths: {})
+        vj = vj_mod.VideoJockey()
+        vj._VideoJockey__read_all_shards(buf, 1)
+        (path,) = vj.shards()
+        assert Path(path).read_bytes() == b"fake mp4 bytes"
+        assert buf.vj_has_all_shards.value
+    finally:
+        buf.unlink()
+
+
+def test_fan_sends_oversized_shard_as_temp_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path)
+    shard = tmp_path / "shard_0000.mp4"
+    shard.write_bytes(b"x" * 4096)
+    buf = ShmRingBuffer(slots=4, slot_size=128)
+    try:
+        t0 = time.monotonic()
+        Fan(0, shard_path=str(shard), verbose=False).send_shard(buf)
+        # no put retries or backoff
+        assert time.monotonic() - t0 < 1.0
+        _, payload = buf.get_shard(timeout=0.1)
+        assert isinstance(payload, str)
+        assert Path(payload).read_bytes() == shard.read_bytes()
+    finally:
+        buf.unlink()
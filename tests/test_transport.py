@@ -0,0 +1,65 @@
+import multiprocessing
+
+import pytest
+
+import transport
+
+
+@pytest.fixture(params=transport.KINDS)
+def buf(request):
+    manager = multiprocessing.Manager() if request.param == "manager" else None
+    t = transport.make_transport(request.param, manager, num_fans=2)
+    yield t
+    getattr(t, "unlink", t.close)()
+    if manager is not None:
+        manager.shutdown()
+
+
+def test_implementations_share_the_contract(buf):
+    assert isinstance(buf, transport.Transport)
+    fan = buf.bind(0)
+    assert fan.put_shard("Fan A", "/tmp/a.mp4", timeout=0.5)
+    assert fan.put_many([("Fan A", "/tmp/b.mp4")], timeout=0.5) == 1
+    got = buf.get_many(5, timeout=1.0)
+    if len(got) < 2:
+        got.append(buf.get_shard(timeout=1.0))
+    assert got == [("Fan A", "/tmp/a.mp4"), ("Fan A", "/tmp/b.mp4")]
+    assert buf.qsize() == 0
+    assert buf.get_shard(timeout=0.05) is None
+
+
+def test_done_signal(buf):
+    assert not buf.all_shards_collected()
+    assert not buf.wait_all_shards_collected(timeout=0.01)
+    buf.set_all_shards_collected()
+    assert buf.all_shards_collected()
+    assert buf.wait_all_shards_collected(timeout=0.01)
+    assert buf.vj_has_all_shards.value
+
+
+def test_failed_temps_are_cleaned_up(buf, tmp_path):
+    temp = tmp_path / "orphan"
+    temp.write_bytes(b"x")
+    buf.register_failed_temp(str(temp))
+    # registries hand the path to the cleanup worker, others remove it
+    pending = []
+    for _ in range(50):
+        pending += buf.get_and_clear_failed_temps()
+        if pending or not temp.exists():
+            break
+        multiprocessing.Event().wait(0.01)
+    assert pending == [str(temp)] or not temp.exists()
+
+
+def test_base_class_requires_core_methods():
+    t = transport.Transport()
+    with pytest.raises(NotImplementedError):
+        t.put_shard("fan", "/tmp/x")
+    with pytest.raises(NotImplementedError):
+        t.get_shard()
+    assert t.bind(3) is t
+
+
+def test_unknown_transport():
+    with pytest.raises(ValueError):
+        transport.make_transport("carrier-pigeon")
@@ -0,0 +1,144 @@
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+import config
+import video
+import video_jockey as vj_mod
+
+
+@pytest.fixture
+def fake_concat(monkeypatch):
+    calls = []
+
+    def _concat(inputs, output):
+        calls.append((list(inputs), output))
+        data = b"".join(Path(p).read_bytes() for p in inputs)
+        Path(output).write_bytes(data)
+        return True
+
+    monkeypatch.setattr(video, "concat_copy", _concat)
+    return calls
+
+
+def _inputs(tmp_path, n):
+    paths = []
+    for i in range(n):
+        path = tmp_path / f"s{i:02d}.mp4"
+        path.write_bytes(b"%d," % i)
+        paths.append(str(path))
+    return paths
+
+
+def test_reduces_level_by_level(tmp_path, fake_concat):
+    paths = _inputs(tmp_path, 10)
+    work = tmp_path / "work"
+    work.mkdir()
+    reduced = video.tree_reduce(paths, str(work), fan_in=3, max_workers=2)
+    # 10 -> 4 (the lone last shard moves up as is) -> 2
+    assert [len(inputs) for inputs, _ in fake_concat] == [3, 3, 3, 3]
+    assert len(reduced) == 2 and reduced[1] == paths[9]
+    assert Path(reduced[0]).read_bytes() == b"0,1,2,3,4,5,6,7,8,"
+    # the first level's intermediates are gone, the shards are not
+    assert os.listdir(work) == [os.path.basename(reduced[0])]
+    assert all(os.path.exists(p) for p in paths)
+
+
+def test_failed_group_cleans_up(tmp_path, monkeypatch):
+    paths = _inputs(tmp_path, 6)
+    work = tmp_path / "work"
+    work.mkdir()
+
+    def _concat(inputs, output):
+        Path(output).write_bytes(b"partial")
+        return paths[4] not in inputs
+
+    monkeypatch.setattr(video, "concat_copy", _concat)
+    assert video.tree_reduce(paths, str(work), fan_in=2) is None
+    assert os.listdir(work) == []
+
+
+def test_tree_is_off_by_default(monkeypatch):
+    monkeypatch.delattr(config, "CONCAT_TREE_ENABLED")
+    monkeypatch.setattr(config, "CONCAT_WORKERS", 4)
+    assert not video.tree_concat_wanted(1000)
+
+
+def test_tree_only_with_workers_to_spare(monkeypatch):
+    monkeypatch.setattr(config, "CONCAT_TREE_ENABLED", True)
+    monkeypatch.setattr(config, "CONCAT_TREE_FAN_IN", 8)
+    monkeypatch.setattr(config, "CONCAT_WORKERS", 4)
+    assert video.tree_concat_wanted(9)
+    assert not video.tree_concat_wanted(8)
+    monkeypatch.setattr(config, "CONCAT_WORKERS", 1)
+    assert not video.tree_concat_wanted(9)
+    monkeypatch.setattr(config, "CONCAT_WORKERS", 4)
+    monkeypatch.setattr(config, "CONCAT_TREE_ENABLED", False)
+    assert not video.tree_concat_wanted(9)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="no ffmpeg")
+def test_tree_concat_matches_flat(tmp_path, make_shard):
+    src = make_shard(tmp_path / "src.mp4", duration=0.5)
+    paths = []
+    for i in range(12):
+        path = tmp_path / f"shard_{i:02d}.mp4"
+        os.link(src, path)
+        paths.append(str(path))
+    flat = tmp_path / "flat.mp4"
+    tree = tmp_path / "tree.mp4"
+    assert video.concat_copy(paths, flat)
+    assert video.tree_concat(paths, tree, fan_in=3, max_workers=2)
+    assert video.duration(tree) == pytest.approx(video.duration(flat))
+    assert video.duration(tree) == pytest.approx(6.0, abs=0.2)
+    # the tree's scratch directory is gone
+    assert not [p for p in tmp_path.iterdir() if p.is_dir()]
+
+
+def test_write_video_lists_the_reduced_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TEMP_DIR", tmp_path)
+    monkeypatch.setattr(config, "CONCAT_TREE_ENABLED", True)
+    monkeypatch.setattr(config, "CONCAT_TREE_FAN_IN", 2)
+    monkeypatch.setattr(config, "CONCAT_WORKERS", 2)
+    monkeypatch.setattr(config, "AUDIO_CACHE_ENABLED", False)
+    shards = _inputs(tmp_path, 5)
+    probed = {
+        p: video.ProbeResult({"streams": [{"codec_type": "video"}]}, None)
+        for p in shards
+    }
+    monkeypatch.setattr(video, "probe_many", lambda paths: probed)
+    tree_dirs = []
+
+    def _reduce(paths, work_dir):
+        tree_dirs.append(work_dir)
+        out = os.path.join(work_dir, "tree_0_00000.mp4")
+        Path(out).write_bytes(b"x")
+        return [out, paths[-1]]
+
+    monkeypatch.setattr(video, "tree_reduce", _reduce)
+    listed = {}
+
+    class FakeProc:
+        stderr = []
+
+        def wait(self):
+            return 0
+
+    def fake_popen(cmd, stdout=None, stderr=None, text=None):
+        list_path = cmd[cmd.index("concat") + 4]
+        listed["lines"] = Path(list_path).read_text().splitlines()
+        return FakeProc()
+
+    vj = vj_mod.VideoJockey()
+    vj._VideoJockey__shards = list(shards)
+    with mock.patch("subprocess.Popen", side_effect=fake_popen):
+        assert vj._VideoJockey__write_video() is not None
+    assert listed["lines"] == [
+        f"file '{tree_dirs[0]}/tree_0_00000.mp4'",
+        f"file '{shards[-1]}'",
+    ]
+    # the intermediates are removed with their directory
+    assert not os.path.exists(tree_dirs[0])
@@ -1,16 +1,10 @@
-import sys
 from pathlib import Path
 from types import SimpleNamespace
 
 import pytest
 
-# Ensure example/ is on sys.path
-example_dir = Path(__file__).resolve().parents[1] / "example"
-if str(example_dir) not in sys.path:
-    sys.path.insert(0, str(example_dir))
-
-import config  # noqa: E402
-from video_jockey import VideoJockey  # noqa: E402
+import config
+from video_jockey import VideoJockey
 
 
 class _DummyBuffer:
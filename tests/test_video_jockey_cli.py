@@ -1,5 +1,6 @@
 import os
 from unittest import mock
+import video
 import video_jockey as vj_mod
 import config
 
@@ -41,6 +42,13 @@ def test_ffmpeg_cmd_contains_offset_and_fades_and_cleans_list(
         captured["cmd"] = cmd
         return FakeProc()
 
+    # shards pass the ffprobe pre-validation
+    probed = {
+        str(p): video.ProbeResult({"streams": [{"codec_type": "video"}]}, None)
+        for p in (s1, s2)
+    }
+    monkeypatch.setattr(video, "probe_many", lambda paths: probed)
+
     with mock.patch("subprocess.Popen", side_effect=fake_popen):
         out = vj._VideoJockey__write_video()
 
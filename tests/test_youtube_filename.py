@@ -1,12 +1,4 @@
-from pathlib import Path
-import sys
-
-# Ensure example/ is on sys.path to import local module
-example_dir = Path(__file__).resolve().parents[1] / "example"
-if str(example_dir) not in sys.path:
-    sys.path.insert(0, str(example_dir))
-
-import youtube  # noqa: E402
+import youtube
 
 
 class _Dummy: